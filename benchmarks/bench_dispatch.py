@@ -0,0 +1,131 @@
+# Lines/sec of PrinterState.execute_command on box.gcode, table dispatch vs the old elif chain
+#
+#   python -m benchmarks.bench_dispatch [path/to/file.gcode]
+#
+# The table is not a general speed-up. Over every command of box.gcode it measured about 0.95x
+# the chain, since G1 is second in the chain and most lines are G1. Only the other commands,
+# further down the chain, gain: about 1.4-1.5x with G0/G1 excluded. What the table buys is
+# handlers registered at runtime (PrinterState.register_command).
+import sys
+import time
+
+from splic3r import PrinterState
+from splic3r.tokens import tokenize
+
+
+class ChainedPrinterState(PrinterState):
+    # The if/elif dispatch PrinterState used before the command table, kept for comparison
+    def execute(self, word, args):
+        self.extruding = False
+        if word == 'G0':
+            self.G1(args[1:])
+        elif word == 'G1':
+            self.G1(args[1:])
+        elif word == 'G2':
+            self.G2(args[1:])
+        elif word == 'G3':
+            self.G2(args[1:])
+        elif word == 'G4':
+            self.G4(args[1:])
+        elif word == 'G20':
+            self.G20(args[1:])
+        elif word == 'G21':
+            self.G21(args[1:])
+        elif word == 'G28':
+            self.G28(args[1:])
+        elif word == 'G29':
+            self.G29(args[1:])
+        elif word == 'G90':
+            self.G90(args[1:])
+        elif word == 'G92':
+            self.G92(args[1:])
+        elif word == 'M17':
+            self.M17(args[1:])
+        elif word == 'M73':
+            self.M73(args[1:])
+        elif word == 'M77':
+            self.M77(args[1:])
+        elif word == 'M83':
+            self.M83(args[1:])
+        elif word == 'M84':
+            self.M84(args[1:])
+        elif word == 'M104':
+            self.M104(args[1:])
+        elif word == 'M104.1':
+            self.M104(args[1:])
+        elif word == 'M106':
+            self.M106(args[1:])
+        elif word == 'M107':
+            self.M107(args[1:])
+        elif word == 'M109':
+            self.M109(args[1:])
+        elif word == 'M115':
+            self.M115(args[1:])
+        elif word == 'M140':
+            self.M140(args[1:])
+        elif word == 'M142':
+            self.M142(args[1:])
+        elif word == 'M190':
+            self.M190(args[1:])
+        elif word == 'M201':
+            self.M201(args[1:])
+        elif word == 'M203':
+            self.M203(args[1:])
+        elif word == 'M204':
+            self.M204(args[1:])
+        elif word == 'M205':
+            self.M205(args[1:])
+        elif word == 'M217':
+            self.M217(args[1:])
+        elif word == 'M220':
+            self.M220(args[1:])
+        elif word == 'M221':
+            self.M221(args[1:])
+        elif word == 'M302':
+            self.M302(args[1:])
+        elif word == 'M486':
+            self.M486(args[1:])
+        elif word == 'M555':
+            self.M555(args[1:])
+        elif word == 'M862.1':
+            self.M862_1(args[1:])
+        elif word == 'M862.3':
+            self.M862_3(args[1:])
+        elif word == 'M900':
+            self.M900(args[1:])
+        elif word.startswith('P'):
+            self.P(args)
+        elif word.startswith('T'):
+            self.T(args)
+        else:
+            raise NotImplementedError(f"Command {word} not implemented")
+        return self
+
+
+def load_commands(path):
+    with open(path) as file:
+        lines = file.read().splitlines()
+    return [command for command in tokenize(lines) if command is not None]
+
+
+def lines_per_second(state_class, commands, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        state = state_class()
+        start = time.perf_counter()
+        for command in commands:
+            state.execute(*command)
+        best = min(best, time.perf_counter() - start)
+    return len(commands) / best
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'tests/gcode/box.gcode'
+    commands = load_commands(path)
+    other = [command for command in commands if command[0] not in ('G0', 'G1')]
+    for name, selection in (('all commands', commands), ('excluding G0/G1', other)):
+        before = lines_per_second(ChainedPrinterState, selection)
+        after = lines_per_second(PrinterState, selection)
+        print(f"{name}: {len(selection)} commands from {path}")
+        print(f"  elif chain:     {before:12,.0f} lines/s")
+        print(f"  dispatch table: {after:12,.0f} lines/s ({after / before:.2f}x)")
@@ -0,0 +1,293 @@
+# Throughput and peak memory of the parser, time estimator, drill reader, injection planner and
+# router, drill registration, batch splicing and splice viewer on synthetic files, and the command
+# line's cold start.
+#
+#   python -m benchmarks.suite --output results.json
+#   python -m benchmarks.suite --gcode-lines 10000,1000000,5000000 --holes 100,100000
+#   python -m benchmarks.suite --compare baseline.json            # exit status 1 on a regression
+#   python -m benchmarks.suite --results results.json --compare baseline.json
+#
+# Times are the best of --repeat runs. Peak memory is measured in a separate run under tracemalloc,
+# so it counts Python and NumPy allocations but not memory-mapped files. Retained memory is what
+# the result still holds once the case returns, e.g. a parsed GCode's columns and line offsets.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from splic3r import GCode
+from splic3r.drl import DrillFile
+from splic3r.paths import split_paths
+
+from .synthetic import synthetic_drill, synthetic_gcode
+
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# (retained, peak) bytes allocated by function, retained counting what its result still holds
+def memory(function):
+    tracemalloc.start()
+    try:
+        result = function()
+        retained, peak = tracemalloc.get_traced_memory()
+        del result
+        return retained, peak
+    finally:
+        tracemalloc.stop()
+
+
+# Extruding paths of every printed layer, the input Splice.set_layers takes:
+# a list per layer of (N, 3) arrays, each starting at the point the extrusion starts from
+def layer_paths(gcode):
+    return [split_paths(gcode.extrusion_paths(layer.number)) for layer in gcode.layers if layer.number != 0]
+
+
+# (name, size, unit, setup) for every case; setup(directory) returns the function to time
+def cases(gcode_lines, holes, splice_lines):
+    def gcode_text(size):
+        def setup(directory):
+            text = synthetic_gcode(size)
+            return lambda: GCode(text)
+        return setup
+
+    def gcode_file(size):
+        def setup(directory):
+            path = os.path.join(directory, f'synthetic_{size}.gcode')
+            with open(path, 'w') as file:
+                file.write(synthetic_gcode(size))
+            return lambda: GCode.from_file(path)
+        return setup
+
+    def print_time(size):
+        def setup(directory):
+            from splic3r.timing import estimate_time
+            gcode = GCode(synthetic_gcode(size))
+            return lambda: estimate_time(gcode)
+        return setup
+
+    # Paths and layer bounds of the whole print, from a parsed file with nothing cached
+    def extrusion(size):
+        def setup(directory):
+            gcode = GCode(synthetic_gcode(size))
+            def paths():
+                gcode.path_cache.clear()
+                gcode.arc_cache.clear()
+                return gcode.layer_bounds()
+            return paths
+        return setup
+
+    # One print spliced with four drill revisions across the worker pool, the print parsed once
+    def batch(size):
+        def setup(directory):
+            from splic3r.batch import Job, run_batch
+            gcode_path = os.path.join(directory, f'batch_{size}.gcode')
+            with open(gcode_path, 'w') as file:
+                file.write(synthetic_gcode(size))
+            template_path = os.path.join(directory, 'toolchange.gcode')
+            with open(template_path, 'w') as file:
+                file.write('T[TO_TOOL] ; [FROM_TOOL] [TO_TOOL_TEMP] [LAYER_HEIGHT]\n')
+            jobs = []
+            for revision in range(4):
+                drill_path = os.path.join(directory, f'batch_{revision}.drl')
+                with open(drill_path, 'w') as file:
+                    file.write(synthetic_drill(100, seed=revision))
+                jobs.append(Job(gcode_path, (drill_path,), template_path,
+                                os.path.join(directory, f'batch_{size}_{revision}.gcode'), {}))
+            return lambda: run_batch(jobs)
+        return setup
+
+    def drill_file(size):
+        def setup(directory):
+            path = os.path.join(directory, f'synthetic_{size}.drl')
+            with open(path, 'w') as file:
+                file.write(synthetic_drill(size))
+            return lambda: DrillFile.from_file(path)
+        return setup
+
+    def injection_route(size):
+        def setup(directory):
+            from splic3r.route import route
+            points = np.random.default_rng(0).uniform(0, 100, (size, 2))
+            return lambda: route(points, (0, 0))
+        return setup
+
+    # Drill holes found again in openings turned and moved, with a tenth of them missing
+    def registration(size):
+        def setup(directory):
+            from splic3r.register import register, transform_points
+            holes = DrillFile(synthetic_drill(size)).hole_array()
+            rng = np.random.default_rng(0)
+            openings = transform_points(np.stack((holes['x'], holes['y']), axis=1), 0.5, (100, 50))
+            openings = openings[rng.random(len(openings)) < 0.9]
+            openings += rng.normal(0, 0.02, openings.shape)
+            return lambda: register(holes, openings)
+        return setup
+
+    # Drill holes planned against a print of a few hundred short layers, with the board over the
+    # print's square. The layers' segment grids are built again in every run.
+    def injection_plan(size):
+        def setup(directory):
+            from splic3r.planner import plan_injections
+            gcode = GCode(synthetic_gcode(100_000, layer_lines=250))
+            holes = DrillFile(synthetic_drill(size)).hole_array()
+
+            def plan():
+                gcode.segment_indexes.clear()
+                return plan_injections(gcode, holes, (95, 125))
+            return plan
+        return setup
+
+    def splice(size):
+        def setup(directory):
+            from splic3r.splice import Splice
+            layers = layer_paths(GCode(synthetic_gcode(size)))
+            return lambda: Splice().set_layers(layers)
+        return setup
+
+    # What moving the slider through every layer costs the viewer, without drawing
+    def splice_layers(size):
+        def setup(directory):
+            from splic3r.splice import Splice
+            viewer = Splice()
+            viewer.set_layers(layer_paths(GCode(synthetic_gcode(size))))
+            def show_every_layer():
+                viewer.clear_cache()
+                viewer.layer_paths = {}
+                for number in range(1, len(viewer.layers) + 1):
+                    viewer.layer_plot(number)
+            return show_every_layer
+        return setup
+
+    # A fresh interpreter running the command line up to where it would open the first file.
+    # size is how many times it is started per timing.
+    def cli_startup(size):
+        def setup(directory):
+            command = [sys.executable, '-m', 'splic3r', '--help']
+            return lambda: [subprocess.run(command, capture_output=True, check=True) for _ in range(size)]
+        return setup
+
+    yield 'cli_startup', 1, 'runs', cli_startup(1)
+    for size in gcode_lines:
+        yield 'GCode', size, 'lines', gcode_text(size)
+        yield 'GCode.from_file', size, 'lines', gcode_file(size)
+        yield 'estimate_time', size, 'lines', print_time(size)
+        yield 'extrusion_paths', size, 'lines', extrusion(size)
+        yield 'run_batch', size, 'lines', batch(size)
+    for size in holes:
+        yield 'DrillFile', size, 'holes', drill_file(size)
+        yield 'route', size, 'holes', injection_route(size)
+        yield 'register', size, 'holes', registration(size)
+        yield 'plan_injections', size, 'holes', injection_plan(size)
+    for size in splice_lines:
+        yield 'Splice.set_layers', size, 'lines', splice(size)
+        yield 'Splice.layer_plot', size, 'lines', splice_layers(size)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(gcode_lines, holes, splice_lines, repeat=3, only=None, log=print):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, size, unit, setup in cases(gcode_lines, holes, splice_lines):
+            if only and name not in only:
+                continue
+            function = setup(directory)
+            seconds = best_time(function, repeat)
+            retained, peak = memory(function)
+            result = {
+                'name': name, 'size': size, 'unit': unit, 'seconds': seconds,
+                'per_second': size / seconds, 'peak_bytes': peak, 'retained_bytes': retained,
+            }
+            log(f"{name:18} {size:>9,} {unit:5} {seconds:9.4f} s {result['per_second']:14,.0f} {unit}/s "
+                f"{peak / 2 ** 20:9.1f} MiB peak {retained / size:9.1f} B/{unit[:-1]} retained")
+            results.append(result)
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count(), 'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+# Cases slower or hungrier than the baseline by more than threshold (0.15 = 15%).
+# Returns (name, size, metric, baseline, current, ratio) for every regression.
+def compare(baseline, current, threshold=0.15, log=print):
+    before = {(result['name'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get((result['name'], result['size']))
+        if old is None:
+            log(f"{result['name']:18} {result['size']:>9,} no baseline")
+            continue
+        for metric in ('seconds', 'peak_bytes', 'retained_bytes'):
+            if metric not in old or metric not in result:
+                continue
+            ratio = result[metric] / old[metric] if old[metric] else 1.0
+            flag = 'REGRESSION' if ratio > 1 + threshold else ('improved' if ratio < 1 - threshold else '')
+            log(f"{result['name']:18} {result['size']:>9,} {metric:14} {ratio:7.2f}x {flag}")
+            if flag == 'REGRESSION':
+                regressions.append((result['name'], result['size'], metric, old[metric], result[metric], ratio))
+    return regressions
+
+
+def sizes(text):
+    return [int(size) for size in text.split(',') if size]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Throughput and peak memory of splic3r on synthetic files, with regression checks against a baseline')
+    parser.add_argument('--gcode-lines', type=sizes, default=sizes('10000,100000'),
+                        help='G-code sizes in lines, comma separated')
+    parser.add_argument('--holes', type=sizes, default=sizes('100,10000'), help='drill file sizes in holes')
+    parser.add_argument('--splice-lines', type=sizes, default=sizes('10000'),
+                        help='G-code sizes in lines for Splice.set_layers')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', type=lambda text: text.split(','), help='case names to run, comma separated')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--results', help='compare these saved results instead of running')
+    parser.add_argument('--compare', help='baseline results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed slowdown, 0.15 = 15%%')
+    args = parser.parse_args(argv)
+
+    if args.results:
+        with open(args.results) as file:
+            current = json.load(file)
+    else:
+        current = run(args.gcode_lines, args.holes, args.splice_lines, args.repeat, args.only)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.compare}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
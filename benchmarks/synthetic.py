@@ -0,0 +1,135 @@
+# Synthetic PrusaSlicer-style G-code and KiCad-style Excellon drill files of any size, for benchmarks.
+# python -m benchmarks.synthetic gcode 1000000 out.gcode  /  python -m benchmarks.synthetic drill 10000 out.drl
+import sys
+
+import numpy as np
+
+GCODE_HEADER = """; generated by benchmarks.synthetic
+; layer_height = {layer_height}
+; nozzle_diameter = 0.4
+; filament_diameter = 1.75
+; extruder_count = {tools}
+M201 X4000 Y4000 Z200 E2500
+M203 X400 Y400 Z12 E100
+M204 P4000 R1200 T4000
+M205 X8.00 Y8.00 Z2.00 E10.00
+G90
+M83
+G28
+T0 S1 L0 D0
+M104 T0 S215
+M109 T0 S215
+G92 E0
+G21
+G90
+M83"""
+
+GCODE_FOOTER = """M107
+G1 Z{z} F720
+M104 S0
+M140 S0
+G28 X
+M84"""
+
+DRILL_HEADER = """M48
+; DRILL file {{KiCad 8.0.0}} date 2024-08-05T12:03:36+0100
+; FORMAT={{-:-/ absolute / metric / decimal}}
+; #@! TF.GenerationSoftware,Kicad,Pcbnew,8.0.0
+; #@! TF.FileFunction,Plated,1,4,PTH
+FMAT,2
+METRIC
+{tools}
+%
+G90
+G05"""
+
+
+def format_coordinate(value):
+    text = f'{value:.3f}'.rstrip('0').rstrip('.')
+    return '0' if text in ('', '-0') else text
+
+
+def moves(xs, ys, es=None, feedrate=None):
+    x = [format_coordinate(v) for v in xs.tolist()]
+    y = [format_coordinate(v) for v in ys.tolist()]
+    if es is None:
+        lines = [f'G1 X{a} Y{b}' for a, b in zip(x, y)]
+    else:
+        lines = [f'G1 X{a} Y{b} E{format_coordinate(e)}' for a, b, e in zip(x, y, es.tolist())]
+    if feedrate is not None and lines:
+        lines[0] += f' F{feedrate}'
+    return lines
+
+
+# Perimeters and a zig-zag infill of a size x size square centred on the bed, layer after layer,
+# until about `lines` lines are written. Every toolchange_layers layers the next tool takes over.
+def synthetic_gcode(lines=100_000, layer_lines=2000, size=40.0, layer_height=0.2, tools=1,
+                    toolchange_layers=5, centre=(125.0, 105.0), seed=0):
+    rng = np.random.default_rng(seed)
+    out = GCODE_HEADER.format(layer_height=layer_height, tools=tools).splitlines()
+    x0, y0 = centre[0] - size / 2, centre[1] - size / 2
+
+    def square(inset):
+        return (np.array([x0 + size - inset, x0 + size - inset, x0 + inset, x0 + inset]),
+                np.array([y0 + inset, y0 + size - inset, y0 + size - inset, y0 + inset]))
+
+    layer = 0
+    z = 0.0
+    tool = 0
+    while len(out) < lines:
+        layer += 1
+        z = round(layer * layer_height, 3)
+        out += [';LAYER_CHANGE', f';Z:{z}', f';HEIGHT:{layer_height}', ';BEFORE_LAYER_CHANGE', 'G92 E0.0', f';{z}',
+                'G1 E-.8 F2100', f'G1 Z{format_coordinate(z + 0.6)} F720',
+                f'G1 X{format_coordinate(x0)} Y{format_coordinate(y0)} F24000', f'G1 Z{z}', 'G1 E.8 F1500']
+        if tools > 1 and layer % toolchange_layers == 0:
+            tool = (tool + 1) % tools
+            out += ['; CP TOOLCHANGE START', f'M104 T{tool} S215', 'G1 F24000', 'P0 S1 L2 D0; park the tool',
+                    f'M109 T{tool} S215', f'T{tool} S1 L0 D0; pick the tool', 'G92 E0', '; CP TOOLCHANGE END']
+        out += [';TYPE:Perimeter', ';WIDTH:0.45']
+        out += moves(*square(0.45), np.full(4, 1.17), 3500)
+        out += [';TYPE:External perimeter', ';WIDTH:0.45']
+        out += moves(*square(0), np.full(4, 1.2), 2000)
+
+        # Infill fills the rest of the layer's line budget
+        count = max(min(layer_lines, lines - len(out)) - 4, 2)
+        out += [';TYPE:Internal infill' if layer % 3 else ';TYPE:Solid infill', ';WIDTH:0.45', 'G1 F7200']
+        offsets = np.linspace(0.5, size - 0.5, count)
+        side = np.arange(count) % 2
+        if layer % 2:
+            xs, ys = x0 + offsets, y0 + np.where(side, size - 0.5, 0.5)
+        else:
+            xs, ys = x0 + np.where(side, size - 0.5, 0.5), y0 + offsets
+        es = np.round(rng.uniform(0.02, 1.2, count), 5)
+        out += moves(xs, ys, es)
+        out.append('G1 E-.8 F2100')
+    out += GCODE_FOOTER.format(z=format_coordinate(z + 10)).splitlines()
+    return '\n'.join(out) + '\n'
+
+
+# KiCad-style PTH drill file with `holes` holes spread over a width x height board,
+# shared out between the tool diameters, plus an oval (routed) slot per tool
+def synthetic_drill(holes=1000, diameters=(0.3, 0.4, 0.6, 1.0, 2.2), width=60.0, height=40.0, seed=0):
+    rng = np.random.default_rng(seed)
+    tools = []
+    for number, diameter in enumerate(diameters, 1):
+        tools += ['; #@! TA.AperFunction,Plated,PTH,ComponentDrill', f'T{number}C{diameter:.3f}']
+    out = DRILL_HEADER.format(tools='\n'.join(tools)).splitlines()
+    xs = np.round(rng.uniform(0, width, holes), 3)
+    ys = np.round(rng.uniform(-height, 0, holes), 3)
+    tool = np.sort(rng.integers(0, len(diameters), holes))
+    for number in range(len(diameters)):
+        out.append(f'T{number + 1}')
+        out += [f'X{format_coordinate(x)}Y{format_coordinate(y)}'
+                for x, y in zip(xs[tool == number].tolist(), ys[tool == number].tolist())]
+    for number in range(len(diameters)):
+        out += [f'T{number + 1}', 'G00X1Y-1.5', 'M15', 'G01X1Y-0.7', 'M16', 'G05']
+    out.append('M30')
+    return '\n'.join(out) + '\n'
+
+
+if __name__ == '__main__':
+    kind, size, path = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    text = synthetic_gcode(size) if kind == 'gcode' else synthetic_drill(size)
+    with open(path, 'w') as file:
+        file.write(text)
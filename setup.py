@@ -6,5 +6,15 @@ setup(
     packages=find_packages(),
     install_requires=[
         # List your dependencies here
+        'numpy',
     ],
+    extras_require={
+        # Only the slice viewer (splice.Splice) draws anything
+        'viewer': ['matplotlib'],
+    },
+    entry_points={
+        'console_scripts': [
+            'splic3r = splic3r.cli:main',
+        ],
+    },
 )
\ No newline at end of file
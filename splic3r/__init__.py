@@ -1 +1,10 @@
-from .gcode import GCode, PrinterState
\ No newline at end of file
+__all__ = ['GCode', 'PrinterState']
+
+
+# GCode and PrinterState are imported on first use, so the command line (see cli) starts
+# without loading NumPy
+def __getattr__(name):
+    if name in __all__:
+        from . import gcode
+        return getattr(gcode, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
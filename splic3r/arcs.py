@@ -0,0 +1,83 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .columns import MOTION_ARC_CCW
+from .spatial import expand_ranges
+
+# Arcs in the XY plane (G17), one entry per arc line. start and end are (N, 3) x, y, z;
+# sweep is in radians, positive counter-clockwise. The radius goes from start_radius to
+# end_radius along the arc, so arcs whose ends aren't quite the same distance from the
+# centre still finish on their end point.
+Arcs = namedtuple('Arcs', ['lines', 'start', 'end', 'centre', 'start_angle', 'sweep', 'start_radius', 'end_radius'])
+
+# Polylines of arcs: the points of arc k are points[offsets[k]:offsets[k + 1]], from its start to its end
+ArcPaths = namedtuple('ArcPaths', ['lines', 'points', 'offsets'])
+
+
+# Arc geometry for arc lines between first and last (inclusive), from the state columns and their arc log
+def arc_geometry(columns, first=0, last=None):
+    c = columns
+    last = len(c) - 1 if last is None else last
+    events = slice(np.searchsorted(c.arc_lines, first), np.searchsorted(c.arc_lines, last, side='right'))
+    lines = c.arc_lines[events]
+    i, j, r = c.arc_values[events].T
+    previous = np.maximum(lines - 1, 0)
+    start = np.stack([np.where(lines > 0, column[previous], 0) for column in (c.x, c.y, c.z)], axis=1)
+    end = np.stack((c.x[lines], c.y[lines], c.z[lines]), axis=1)
+    counter_clockwise = c.motion[lines] == MOTION_ARC_CCW
+
+    # Centre from I and J, offsets from the start point
+    centre = start[:, :2] + np.nan_to_num(np.stack((i, j), axis=1))
+    # or from R: on the bisector of the chord, left of it for a counter-clockwise arc and
+    # right for a clockwise one, swapped by a negative R (the long way round)
+    by_radius = np.isnan(i) & np.isnan(j) & ~np.isnan(r)
+    if by_radius.any():
+        a, b, radius = start[by_radius, :2], end[by_radius, :2], r[by_radius]
+        chord = b - a
+        length = np.hypot(*chord.T)
+        height = np.sqrt(np.maximum(radius ** 2 - (length / 2) ** 2, 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            left = np.nan_to_num(np.stack((-chord[:, 1], chord[:, 0]), axis=1) / length[:, None])
+        side = np.where(counter_clockwise[by_radius], 1, -1) * np.sign(radius)
+        centre[by_radius] = (a + b) / 2 + (side * height)[:, None] * left
+
+    start_offset, end_offset = start[:, :2] - centre, end[:, :2] - centre
+    start_angle = np.arctan2(start_offset[:, 1], start_offset[:, 0])
+    turn = np.mod(np.arctan2(end_offset[:, 1], end_offset[:, 0]) - start_angle, 2 * np.pi)
+    # Ending where it starts is a full circle, when the centre is given
+    full = (turn == 0) & ~by_radius
+    sweep = np.where(counter_clockwise, turn, np.where(turn > 0, turn - 2 * np.pi, 0))
+    sweep = np.where(full, np.where(counter_clockwise, 2 * np.pi, -2 * np.pi), sweep)
+    return Arcs(lines, start, end, centre, start_angle, sweep,
+                np.hypot(*start_offset.T), np.hypot(*end_offset.T))
+
+
+# Length along each arc, with any Z change as a helix
+def arc_lengths(arcs):
+    planar = np.abs(arcs.sweep) * (arcs.start_radius + arcs.end_radius) / 2
+    return np.hypot(planar, arcs.end[:, 2] - arcs.start[:, 2])
+
+
+# Every arc as a polyline whose chords stray at most `tolerance` mm from the arc, all arcs
+# in one batch: the points are laid out with one expand_ranges and worked out together.
+def linearize(arcs, tolerance=0.01):
+    radius = np.maximum(arcs.start_radius, arcs.end_radius)
+    # A chord over angle a is radius * (1 - cos(a / 2)) from the arc at its middle
+    with np.errstate(divide='ignore'):
+        step = 2 * np.arccos(np.clip(1 - tolerance / radius, -1, 1))
+    step = np.minimum(step, np.pi / 2)
+    counts = np.maximum(np.ceil(np.abs(arcs.sweep) / step), 1).astype(np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts + 1)))
+    arc = np.repeat(np.arange(len(counts)), counts + 1)
+    t = expand_ranges(np.zeros(len(counts)), counts + 1) / counts[arc]
+    angle = arcs.start_angle[arc] + arcs.sweep[arc] * t
+    radius = arcs.start_radius[arc] + (arcs.end_radius - arcs.start_radius)[arc] * t
+    points = np.empty((len(arc), 3))
+    points[:, 0] = arcs.centre[arc, 0] + radius * np.cos(angle)
+    points[:, 1] = arcs.centre[arc, 1] + radius * np.sin(angle)
+    points[:, 2] = arcs.start[arc, 2] + (arcs.end - arcs.start)[arc, 2] * t
+    # Exactly on the commanded ends, whatever the rounding
+    points[offsets[:-1]] = arcs.start
+    points[offsets[1:] - 1] = arcs.end
+    return ArcPaths(arcs.lines, points, offsets)
@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .cache import ParseCache, from_parse_arrays, parse_arrays
+from .drl import DrillFile, merge_holes
+from .gcode import GCode
+from .lines import LineStore
+from .planner import batch_injections, plan_injections, swap_report
+from .writer import Injector, SpliceWriter, Template, injection_blocks
+
+# Options a job can set for planning and writing, with their defaults. register finds where the
+# board sits in the print (see register.register) instead of using offset, and fails the job if
+# the fit is worse than max_residual (None for register's default) or min_matched.
+PLAN_OPTIONS = {'offset': (0, 0), 'clearance': 0.0, 'min_layers': 1, 'max_overfill': 0.0, 'ordered': True,
+                'register': False, 'max_residual': None, 'min_matched': 0.5}
+# Options passed on to writer.Injector, over what Injector.from_settings finds in the print
+INJECTOR_OPTIONS = ('print_tool', 'conductive_tool', 'print_temperature', 'conductive_temperature', 'wipe',
+                    'retract', 'lift', 'travel_feedrate', 'lift_feedrate', 'retract_feedrate', 'inject_feedrate',
+                    'dwell', 'filament_diameter', 'temperatures')
+# Arrays in shared memory start on cache line boundaries
+ALIGNMENT = 64
+
+# One print spliced with one set of drill files: gcode, template and output are paths, drills a
+# tuple of paths and options a dict of PLAN_OPTIONS and INJECTOR_OPTIONS
+Job = namedtuple('Job', ['gcode', 'drills', 'template', 'output', 'options'])
+# residual (mm) and matched (the fraction of holes that found an opening) are the registration's,
+# or None if the job was given an offset. timings are seconds by phase: load (the shared inputs),
+# plan, write and total. error is the message of whatever stopped the job, or None.
+JobResult = namedtuple('JobResult', ['job', 'holes', 'injections', 'toolchanges', 'residual', 'matched',
+                                     'timings', 'error'])
+# results are in manifest order, parse_times the seconds spent reading each shared input, by path
+BatchReport = namedtuple('BatchReport', ['results', 'parse_times', 'total'])
+
+
+# Jobs from a JSON manifest, either a list of jobs or
+#   {"defaults": {...}, "jobs": [{"gcode": ..., "drills": [...], "template": ..., "output": ..., "options": {...}}]}
+# where defaults holds anything a job may leave out, and a job's options are laid over the defaults'.
+# Relative paths are taken from the manifest's directory.
+def read_manifest(path):
+    with open(path, 'r') as file:
+        manifest = json.load(file)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    root = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get('defaults', {})
+    jobs = []
+    for number, entry in enumerate(manifest.get('jobs', [])):
+        entry = {**defaults, **entry, 'options': {**defaults.get('options', {}), **entry.get('options', {})}}
+        missing = [key for key in ('gcode', 'drills', 'template', 'output') if key not in entry]
+        if missing:
+            raise ValueError(f"Job {number} in {path} has no {', '.join(missing)}")
+        unknown = entry['options'].keys() - PLAN_OPTIONS.keys() - set(INJECTOR_OPTIONS)
+        if unknown:
+            raise ValueError(f"Job {number} in {path} has unknown options: {', '.join(sorted(unknown))}")
+        drills = [entry['drills']] if isinstance(entry['drills'], str) else entry['drills']
+        jobs.append(Job(os.path.join(root, entry['gcode']), tuple(os.path.join(root, drill) for drill in drills),
+                        os.path.join(root, entry['template']), os.path.join(root, entry['output']), entry['options']))
+    return jobs
+
+
+# Holes of all the drill files, with holes in more than one file kept once
+def load_holes(paths):
+    return merge_holes([DrillFile.from_file(path).hole_array() for path in paths])
+
+
+class SharedParse:
+    """A parsed GCode copied once into a block of shared memory.
+
+    The state columns, logs, layer index and line offsets (see cache.parse_arrays) are laid
+    out one after another, and handle says where each one is. A worker given the handle maps
+    the block and wraps the arrays as they are (see attach), so the parse is neither pickled
+    nor repeated. The text is memory-mapped from its file instead when it has one.
+    """
+
+    def __init__(self, gcode):
+        arrays = parse_arrays(gcode.source, gcode.columns, gcode.layers)
+        if gcode.source.path is None:
+            arrays['text'] = np.frombuffer(gcode.source.buffer, dtype=np.uint8)
+        layout, size = [], 0
+        for name, array in arrays.items():
+            layout.append((name, array.dtype.str, array.shape, size))
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (name, *_), array in zip(layout, shared_arrays(self.memory, layout)):
+            array[...] = arrays[name]
+        self.handle = (self.memory.name, layout, gcode.source.path, gcode.source.encoding)
+
+    # Free the block; workers that attached keep their mapping until they exit
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def shared_arrays(memory, layout):
+    return [np.ndarray(shape, dtype, memory.buf, offset) for _, dtype, shape, offset in layout]
+
+
+# Blocks this process has attached to, by name, with the GCode on each. They stay mapped for
+# the life of the worker, so later jobs on the same print find it ready.
+attached = {}
+
+
+# The GCode a SharedParse handle points to, read-only
+def attach(handle):
+    name, layout, path, encoding = handle
+    if name not in attached:
+        memory = shared_memory.SharedMemory(name)
+        arrays = {}
+        for (key, *_), array in zip(layout, shared_arrays(memory, layout)):
+            array.flags.writeable = False
+            arrays[key] = array
+        if path is None:
+            source = LineStore(arrays.pop('text').tobytes(), encoding=encoding)
+        else:
+            source = LineStore.from_file(path, encoding)
+        columns, layers, source.starts = from_parse_arrays(arrays)
+        attached[name] = (memory, GCode.from_parsed(source, columns, layers))
+    return attached[name][1]
+
+
+# Plan and write one job with its inputs already read. Errors are caught and reported in the
+# result, so one bad job doesn't stop a batch; a rejected registration fails the job before
+# anything is written.
+def run_job(job, gcode, holes, template, load_time=0.0):
+    timings = {'load': load_time}
+    start = time.perf_counter()
+    hole_count = injections = toolchanges = 0
+    residual = matched = None
+    try:
+        options = {**PLAN_OPTIONS, **job.options}
+        injector = Injector.from_settings(template, gcode.columns.var_dict,
+                                          **{key: options[key] for key in INJECTOR_OPTIONS if key in options})
+        hole_count = len(holes)
+        offset = options['offset']
+        if options['register']:
+            from .register import print_openings, register, transform_holes
+            fit = register(holes, print_openings(gcode), max_residual=options['max_residual'],
+                           min_matched=options['min_matched'])
+            residual, matched = fit.residual, fit.matched / len(holes)
+            holes = transform_holes(holes, fit)
+            offset = (0, 0)
+        schedule = plan_injections(gcode, holes, offset, options['clearance'], options['min_layers'])
+        schedule = batch_injections(gcode, schedule, options['max_overfill'])
+        injections, toolchanges = len(schedule), swap_report(schedule).toolchanges
+        timings['plan'] = time.perf_counter() - start
+        blocks = injection_blocks(schedule, holes, injector, offset, options['ordered'])
+        if isinstance(job.output, (str, os.PathLike)):
+            with SpliceWriter.open(job.output) as writer:
+                writer.splice(gcode.source, blocks)
+        else:
+            SpliceWriter(job.output).splice(gcode.source, blocks)
+        timings['write'] = time.perf_counter() - start - timings['plan']
+        error = None
+    except Exception as exception:
+        error = f'{type(exception).__name__}: {exception}'
+    timings['total'] = time.perf_counter() - start + load_time
+    return JobResult(job, hole_count, injections, toolchanges, residual, matched, timings, error)
+
+
+# Worker: run a job on a print handed over by a SharedParse
+def run_shared_job(job, handle, holes, template):
+    start = time.perf_counter()
+    gcode = attach(handle)
+    return run_job(job, gcode, holes, template, time.perf_counter() - start)
+
+
+# Read every distinct input once, by key. Returns the inputs, or the exception that reading one
+# raised, and the seconds each took.
+def load_once(keys, loader):
+    loaded, times = {}, {}
+    for key in dict.fromkeys(keys):
+        start = time.perf_counter()
+        try:
+            loaded[key] = loader(key)
+        except Exception as exception:
+            loaded[key] = exception
+        times[key] = time.perf_counter() - start
+    return loaded, times
+
+
+# Run jobs across a pool of worker processes (one per core by default).
+#
+# Each print, drill set and template is read once in this process however many jobs share it,
+# e.g. one sliced print spliced with several drill revisions. Parsed prints go to the workers in
+# shared memory (see SharedParse); holes and templates are small and are pickled. With one worker
+# the jobs run here, one after another. cache is a ParseCache for the prints.
+def run_batch(jobs, workers=None, cache=None):
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    gcodes, gcode_times = load_once((job.gcode for job in jobs), lambda path: GCode.from_file(path, cache=cache))
+    hole_sets, hole_times = load_once((job.drills for job in jobs), load_holes)
+    templates, template_times = load_once((job.template for job in jobs), Template.from_file)
+    parse_times = {**gcode_times, **{', '.join(drills): seconds for drills, seconds in hole_times.items()},
+                   **template_times}
+
+    results = [None] * len(jobs)
+    pending = []
+    for number, job in enumerate(jobs):
+        inputs = (gcodes[job.gcode], hole_sets[job.drills], templates[job.template])
+        failed = [value for value in inputs if isinstance(value, Exception)]
+        if failed:
+            error = f'{type(failed[0]).__name__}: {failed[0]}'
+            results[number] = JobResult(job, 0, 0, 0, None, None, {'total': 0.0}, error)
+        elif workers == 1:
+            results[number] = run_job(job, *inputs)
+        else:
+            pending.append(number)
+
+    if pending:
+        shared = {}
+        try:
+            for number in pending:
+                if jobs[number].gcode not in shared:
+                    shared[jobs[number].gcode] = SharedParse(gcodes[jobs[number].gcode])
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                futures = {number: pool.submit(run_shared_job, jobs[number], shared[jobs[number].gcode].handle,
+                                               hole_sets[jobs[number].drills], templates[jobs[number].template])
+                           for number in pending}
+                for number, future in futures.items():
+                    try:
+                        results[number] = future.result()
+                    except Exception as exception:
+                        # The worker itself died, e.g. killed for memory
+                        results[number] = JobResult(jobs[number], 0, 0, 0, None, None, {'total': 0.0},
+                                                    f'{type(exception).__name__}: {exception}')
+        finally:
+            for block in shared.values():
+                block.close()
+    return BatchReport(results, parse_times, time.perf_counter() - start)
+
+
+# Human readable table of a BatchReport, one row per job. resid and match are the registration's
+# residual and matched fraction, - where the job had an offset instead.
+def format_report(report):
+    out = ['inputs:']
+    out += [f'  {seconds:8.3f} s  {path}' for path, seconds in report.parse_times.items()]
+    out.append(f"{'job':>4} {'holes':>7} {'inject':>7} {'changes':>7} {'resid':>7} {'match':>6} "
+               f"{'load':>8} {'plan':>8} {'write':>8} {'total':>8}  output")
+    for number, result in enumerate(report.results):
+        residual = '-' if result.residual is None else f'{result.residual:.3f}'
+        matched = '-' if result.matched is None else f'{result.matched:.0%}'
+        times = ' '.join(f"{result.timings.get(phase, 0.0):8.3f}" for phase in ('load', 'plan', 'write', 'total'))
+        out.append(f'{number:4} {result.holes:7} {result.injections:7} {result.toolchanges:7} {residual:>7} '
+                   f'{matched:>6} {times}  {result.job.output}')
+        if result.error is not None:
+            out.append(f'     failed: {result.error}')
+    failed = sum(result.error is not None for result in report.results)
+    out.append(f'{len(report.results)} jobs, {failed} failed, in {report.total:.3f} s')
+    return '\n'.join(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Splice every job of a manifest, across worker processes')
+    parser.add_argument('manifest', help='JSON list of jobs, see read_manifest')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--cache', nargs='?', const='', default=None, metavar='DIRECTORY',
+                        help='keep parsed prints in a parse cache (default directory if none given)')
+    args = parser.parse_args(argv)
+    cache = None if args.cache is None else ParseCache(args.cache or None)
+    report = run_batch(read_manifest(args.manifest), args.workers, cache)
+    print(format_report(report))
+    return 1 if any(result.error is not None for result in report.results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .columns import COLUMNS, StateColumns
+from .layers import LayerIndex
+
+LAYER_ARRAYS = ('first_line', 'last_line', 'numbers', 'z', 'height')
+
+
+def default_directory():
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'splic3r')
+
+
+# Identifies the parser: PARSER_VERSION plus every registered command handler,
+# so registering a handler at runtime doesn't pick up results parsed without it
+def parser_fingerprint():
+    from .gcode import PARSER_VERSION, PrinterState
+    handlers = [
+        (table, word, handler.__module__, handler.__qualname__)
+        for table in ('commands', 'prefix_commands')
+        for word, handler in sorted(getattr(PrinterState, table).items())
+    ]
+    return json.dumps([PARSER_VERSION, PrinterState.strict, handlers]).encode()
+
+
+# Everything a parse produced as flat arrays by name: the state columns and logs, the layer index,
+# the line offsets and a JSON 'meta' blob with the move type names and var_dict
+def parse_arrays(source, columns, layers):
+    meta = json.dumps({'move_types': columns.move_types, 'var_dict': columns.var_dict}).encode()
+    arrays = {name: getattr(columns, name) for name in COLUMNS}
+    arrays.update({'layers_' + name: getattr(layers, name) for name in LAYER_ARRAYS})
+    arrays.update(offset_lines=columns.offset_lines, offset_values=columns.offset_values,
+                  arc_lines=columns.arc_lines, arc_values=columns.arc_values,
+                  starts=source.starts, meta=np.frombuffer(meta, dtype=np.uint8))
+    return arrays
+
+
+# (columns, layers, starts) back from parse_arrays; the arrays are used as they are, not copied
+def from_parse_arrays(arrays):
+    meta = json.loads(arrays['meta'].tobytes())
+    columns = StateColumns()
+    for name in COLUMNS:
+        setattr(columns, name, arrays[name])
+    columns.offset_lines, columns.offset_values = arrays['offset_lines'], arrays['offset_values']
+    columns.arc_lines, columns.arc_values = arrays['arc_lines'], arrays['arc_values']
+    columns.move_types = meta['move_types']
+    columns.move_type_codes = {move_type: code for code, move_type in enumerate(columns.move_types)}
+    columns.var_dict = meta['var_dict']
+    columns.finalized = True
+    layers = LayerIndex.from_arrays(*(arrays['layers_' + name] for name in LAYER_ARRAYS))
+    return columns, layers, arrays['starts']
+
+
+class ParseCache:
+    """Parsed GCode results saved on disk, keyed by a hash of the file content and the parser.
+
+    Each entry is an uncompressed .npz holding the state columns and logs, the layer index, the line
+    offsets and a JSON blob with the move type names and var_dict, so a warm load is a hash
+    of the file plus a few array reads. Entries older than max_age seconds are removed, then
+    the least recently used ones until the cache fits in max_bytes.
+    """
+
+    def __init__(self, directory=None, max_bytes=1 << 30, max_age=30 * 24 * 3600):
+        self.directory = default_directory() if directory is None else os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def key(self, source):
+        digest = hashlib.blake2b(parser_fingerprint(), digest_size=16)
+        digest.update(source.buffer)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    # (columns, layers) for source, or None on a miss. Sets source.starts from the cache too.
+    def load(self, source, key=None):
+        path = self.path(key or self.key(source))
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError, KeyError):
+            return None
+        columns, layers, source.starts = from_parse_arrays(arrays)
+        # Mark as recently used
+        os.utime(path)
+        return columns, layers
+
+    def store(self, source, columns, layers, key=None):
+        os.makedirs(self.directory, exist_ok=True)
+        arrays = parse_arrays(source, columns, layers)
+        # Write to a temporary file first so readers never see a partial entry
+        handle, temporary = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(handle, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(temporary, self.path(key or self.key(source)))
+        self.evict()
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    # Remove entries past max_age, then the least recently used until under max_bytes
+    def evict(self):
+        entries = self.entries()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for used, size, path in entries:
+            if now - used <= self.max_age and total <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
@@ -0,0 +1,174 @@
+# splic3r command line, for use as a slicer post-processing script.
+#
+#   splic3r --drills board-PTH.drl --template toolchange.gcode print.gcode
+#   splic3r --drills board-PTH.drl --template toolchange.gcode - < print.gcode > spliced.gcode
+#   splic3r --batch jobs.json
+#
+# PrusaSlicer runs post-processing scripts with the path of the G-code it just wrote as the last
+# argument and waits for them, so the file is rewritten in place unless --output is given: the
+# spliced G-code goes to a temporary file beside it, which then replaces it. A path of - reads
+# stdin and writes stdout.
+#
+# Only argparse is imported until the arguments are checked; NumPy and the parser come in with
+# the first file, so --help and mistakes in the arguments cost no more than starting Python.
+import argparse
+import os
+import sys
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='splic3r', description='Inject conductive filament into the drill holes of a sliced print')
+    parser.add_argument('gcode', nargs='?', help='G-code to splice, rewritten in place; - for stdin to stdout')
+    parser.add_argument('-d', '--drills', action='append', default=[], metavar='DRL',
+                        help='Excellon drill file, may be given more than once')
+    parser.add_argument('-t', '--template', help='toolchange template, e.g. gcode_samples/toolchange.gcode')
+    parser.add_argument('-o', '--output', help='write the spliced G-code here instead (- for stdout)')
+    parser.add_argument('--offset', type=float, nargs=2, metavar=('X', 'Y'),
+                        help='where the drill origin is on the bed, in mm')
+    parser.add_argument('--register', action='store_true',
+                        help='find where the board sits in the print from the holes in it, instead of --offset')
+    parser.add_argument('--max-residual', type=float, metavar='MM',
+                        help='reject a --register fit further off than this (default: 1/128 of the board)')
+    parser.add_argument('--min-matched', type=float, metavar='FRACTION',
+                        help='reject a --register fit matching fewer of the holes (default: 0.5)')
+    parser.add_argument('--clearance', type=float, help='extra mm around a hole that must be clear')
+    parser.add_argument('--min-layers', type=int, help='fewest open layers worth filling')
+    parser.add_argument('--max-overfill', type=float, help='mm an injection may stand proud to share a toolchange')
+    parser.add_argument('--print-tool', type=int)
+    parser.add_argument('--conductive-tool', type=int)
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='any other planner or injector option, the value as JSON (e.g. --set "wipe=[0,0,10,0]")')
+    parser.add_argument('--batch', metavar='MANIFEST', help='run every job of a JSON manifest instead (see batch)')
+    parser.add_argument('--workers', type=int, help='processes for --batch (default: one per core)')
+    parser.add_argument('--cache', nargs='?', const='', metavar='DIRECTORY',
+                        help='keep parsed prints in a parse cache (default directory if none given)')
+    parser.add_argument('--timings', action='store_true', help='print the time each step took to stderr')
+    args = parser.parse_args(argv)
+    if args.batch is None:
+        if args.gcode is None:
+            parser.error('a G-code file (or -) is needed, or --batch')
+        if not args.drills or args.template is None:
+            parser.error('--drills and --template are needed')
+    elif args.gcode is not None:
+        parser.error('--batch takes its files from the manifest')
+    try:
+        args.options = options(args)
+    except ValueError as error:
+        parser.error(str(error))
+    return args
+
+
+# Planner and injector options from the arguments that were given
+def options(args):
+    import json
+    chosen = {}
+    for name in ('offset', 'clearance', 'min_layers', 'max_overfill', 'print_tool', 'conductive_tool',
+                 'max_residual', 'min_matched'):
+        if getattr(args, name) is not None:
+            chosen[name] = getattr(args, name)
+    if args.register:
+        chosen['register'] = True
+    for setting in args.set:
+        name, _, value = setting.partition('=')
+        try:
+            chosen[name.strip().replace('-', '_')] = json.loads(value)
+        except json.JSONDecodeError:
+            raise ValueError(f'--set {setting}: the value is not JSON')
+    return chosen
+
+
+# The job's G-code from a path, or from stdin. Slicer output has to be read to the end before
+# the first injection can be planned, so stdin is read whole; the output is still written as it goes.
+def load_gcode(path, cache=None):
+    from .gcode import GCode
+    from .lines import LineStore
+    if path == '-':
+        return GCode(source=LineStore(sys.stdin.buffer.read()), cache=cache)
+    return GCode.from_file(path, cache=cache)
+
+
+def splice_file(args, cache):
+    from .batch import INJECTOR_OPTIONS, PLAN_OPTIONS, Job, load_holes, run_job
+    from .writer import Template
+    unknown = args.options.keys() - PLAN_OPTIONS.keys() - set(INJECTOR_OPTIONS)
+    if unknown:
+        print(f"splic3r: unknown options: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    gcode = load_gcode(args.gcode, cache)
+    holes = load_holes(args.drills)
+    template = Template.from_file(args.template)
+    load_time = time.perf_counter() - start
+
+    output = args.output or args.gcode
+    if output == '-':
+        result = run_job(Job(args.gcode, tuple(args.drills), args.template, sys.stdout, args.options),
+                         gcode, holes, template, load_time)
+        sys.stdout.flush()
+    else:
+        # Written beside the target and moved over it only once complete, so a failed run
+        # leaves the slicer's file as it was
+        import shutil
+        import tempfile
+        handle, temporary = tempfile.mkstemp(prefix='.splic3r-', suffix='.gcode',
+                                             dir=os.path.dirname(os.path.abspath(output)))
+        os.close(handle)
+        try:
+            result = run_job(Job(args.gcode, tuple(args.drills), args.template, temporary, args.options),
+                             gcode, holes, template, load_time)
+            if result.error is None:
+                if os.path.exists(output):
+                    shutil.copymode(output, temporary)
+                # Some systems won't replace a file that is still memory-mapped
+                gcode.source.close()
+                os.replace(temporary, output)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    if result.error is not None:
+        print(f'splic3r: {result.error}', file=sys.stderr)
+        return 1
+    if result.residual is not None:
+        print(f'splic3r: registered with a residual of {result.residual:.3f} mm, '
+              f'{result.matched:.0%} of holes matched', file=sys.stderr)
+    if args.timings:
+        times = ', '.join(f'{phase} {seconds:.3f} s' for phase, seconds in result.timings.items())
+        print(f'splic3r: {result.holes} holes, {result.injections} injections, '
+              f'{result.toolchanges} toolchanges; {times}', file=sys.stderr)
+    return 0
+
+
+def run_manifest(args, cache):
+    from .batch import format_report, read_manifest, run_batch
+    try:
+        jobs = read_manifest(args.batch)
+    except (OSError, ValueError) as error:
+        print(f'splic3r: {error}', file=sys.stderr)
+        return 2
+    for job in jobs:
+        job.options.update(args.options)
+    report = run_batch(jobs, args.workers, cache)
+    print(format_report(report))
+    return 1 if any(result.error is not None for result in report.results) else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = None
+    if args.cache is not None:
+        from .cache import ParseCache
+        cache = ParseCache(args.cache or None)
+    if args.batch is not None:
+        return run_manifest(args, cache)
+    try:
+        return splice_file(args, cache)
+    except OSError as error:
+        print(f'splic3r: {error}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
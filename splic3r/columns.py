@@ -0,0 +1,263 @@
+from array import array
+
+import numpy as np
+
+MODES = [None, 'tool_change', 'tool_unload', 'tool_wipe']
+MODE_CODES = {mode: code for code, mode in enumerate(MODES)}
+
+# Motion codes, taken from the command word of each line
+MOTION_NONE = 0
+MOTION_LINEAR = 1
+MOTION_ARC_CW = 2
+MOTION_ARC_CCW = 3
+MOTION_CODES = {'G0': MOTION_LINEAR, 'G1': MOTION_LINEAR, 'G2': MOTION_ARC_CW, 'G3': MOTION_ARC_CCW}
+
+FLAG_RELATIVE = 1
+FLAG_EXTRUDING = 2
+
+# Column name -> (array.array typecode used while building, numpy dtype once finalized)
+COLUMNS = {
+    'x': ('d', np.float64),
+    'y': ('d', np.float64),
+    'z': ('d', np.float64),
+    'e': ('d', np.float64),
+    'feedrate': ('d', np.float64),
+    'layer_height': ('d', np.float64),
+    'layer': ('i', np.int32),
+    'tool': ('h', np.int16),
+    'flags': ('B', np.uint8),
+    'mode': ('b', np.int8),
+    'move_type': ('h', np.int16),
+    'motion': ('b', np.int8),
+}
+
+
+class StateColumns:
+    """Printer state for every line of a GCode file, stored column-wise.
+
+    Columns are appended to compact ``array.array`` buffers while parsing and
+    exposed as NumPy arrays indexed by line number once ``finalize`` is called.
+    G92 offsets change rarely, so they are kept as a sparse log of the lines
+    where they were set. Arcs keep their I, J and R words (NaN when not given)
+    in a log of the same kind, for the geometry in ``arcs``.
+    """
+
+    def __init__(self):
+        for name, (typecode, _) in COLUMNS.items():
+            setattr(self, name, array(typecode))
+        self.move_types = [None]
+        self.move_type_codes = {None: 0}
+        self.offset_lines = array('q')
+        self.offset_values = array('d')
+        self.arc_lines = array('q')
+        self.arc_values = array('d')
+        self.var_dict = {}
+        self.finalized = False
+
+    def __len__(self):
+        return len(self.x)
+
+    def append(self, state, command=None):
+        x, y, z = state.current_position
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self.e.append(state.amount_extruded)
+        self.feedrate.append(state.feedrate)
+        self.layer_height.append(state.layer_height)
+        self.layer.append(state.layer)
+        self.tool.append(-1 if state.selected_tool is None else state.selected_tool)
+        self.flags.append((FLAG_RELATIVE if state.relative else 0) | (FLAG_EXTRUDING if state.extruding else 0))
+        self.mode.append(MODE_CODES[state.mode])
+        move_type = self.move_type_codes.get(state.print_move_type)
+        if move_type is None:
+            move_type = self.move_type_codes[state.print_move_type] = len(self.move_types)
+            self.move_types.append(state.print_move_type)
+        self.move_type.append(move_type)
+        word = command[0] if command else None
+        self.motion.append(MOTION_CODES.get(word, MOTION_NONE))
+        if word == 'G92':
+            self.offset_lines.append(len(self.x) - 1)
+            self.offset_values.extend(state.origin_offset)
+            self.offset_values.append(state.extrude_offset)
+        elif word == 'G2' or word == 'G3':
+            self.arc_lines.append(len(self.x) - 1)
+            values = dict.fromkeys('IJR', float('nan'))
+            for letter, value in command[1][1:]:
+                if letter in values and value is not None:
+                    values[letter] = value
+            self.arc_values.extend(values.values())
+
+    def finalize(self, var_dict=None):
+        for name, (_, dtype) in COLUMNS.items():
+            setattr(self, name, np.frombuffer(getattr(self, name), dtype=dtype))
+        self.offset_lines = np.frombuffer(self.offset_lines, dtype=np.int64)
+        self.offset_values = np.frombuffer(self.offset_values, dtype=np.float64).reshape(-1, 4)
+        self.arc_lines = np.frombuffer(self.arc_lines, dtype=np.int64)
+        self.arc_values = np.frombuffer(self.arc_values, dtype=np.float64).reshape(-1, 3)
+        if var_dict is not None:
+            self.var_dict = var_dict
+        self.finalized = True
+        return self
+
+    # Rows [start, stop) as a new finalized StateColumns, with the G92 and arc logs rebased to start
+    def slice(self, start, stop):
+        part = StateColumns()
+        for name in COLUMNS:
+            setattr(part, name, getattr(self, name)[start:stop])
+        part.move_types, part.move_type_codes = self.move_types, self.move_type_codes
+        keep = (self.offset_lines >= start) & (self.offset_lines < stop)
+        part.offset_lines = self.offset_lines[keep] - start
+        part.offset_values = self.offset_values[keep]
+        keep = (self.arc_lines >= start) & (self.arc_lines < stop)
+        part.arc_lines = self.arc_lines[keep] - start
+        part.arc_values = self.arc_values[keep]
+        part.var_dict = self.var_dict
+        part.finalized = True
+        return part
+
+    # Join finalized parts end to end. Move types are renumbered in order of first use,
+    # the same numbering a single pass over all the rows would give.
+    @classmethod
+    def concatenate(cls, parts):
+        merged = cls()
+        codes = []
+        for part in parts:
+            used, first = np.unique(part.move_type, return_index=True)
+            lookup = np.zeros(len(part.move_types), dtype=np.int16)
+            for code in used[np.argsort(first)].tolist():
+                move_type = part.move_types[code]
+                if move_type not in merged.move_type_codes:
+                    merged.move_type_codes[move_type] = len(merged.move_types)
+                    merged.move_types.append(move_type)
+                lookup[code] = merged.move_type_codes[move_type]
+            codes.append(lookup[part.move_type])
+            merged.var_dict.update(part.var_dict)
+        for name, (_, dtype) in COLUMNS.items():
+            setattr(merged, name, np.concatenate([getattr(part, name) for part in parts]).astype(dtype, copy=False))
+        merged.move_type = np.concatenate(codes).astype(np.int16, copy=False)
+        rows = np.cumsum([0] + [len(part) for part in parts[:-1]])
+        merged.offset_lines = np.concatenate([part.offset_lines + row for part, row in zip(parts, rows)]).astype(np.int64)
+        merged.offset_values = np.concatenate([part.offset_values for part in parts]).reshape(-1, 4)
+        merged.arc_lines = np.concatenate([part.arc_lines + row for part, row in zip(parts, rows)]).astype(np.int64)
+        merged.arc_values = np.concatenate([part.arc_values for part in parts]).reshape(-1, 3)
+        merged.finalized = True
+        return merged
+
+    # Index of the first of `count` rows where the state matches other's state at the same offset,
+    # or None. Both must share move type codes; motion is ignored as it comes from the line itself.
+    def first_match(self, start, other, other_start, count):
+        same = np.ones(count, dtype=bool)
+        for name in COLUMNS:
+            if name != 'motion':
+                same &= getattr(self, name)[start:start + count] == getattr(other, name)[other_start:other_start + count]
+        match = np.flatnonzero(same)
+        return int(match[0]) if len(match) else None
+
+    # Origin and extrude offsets in effect after line `index`
+    def offsets(self, index):
+        event = np.searchsorted(self.offset_lines, index, side='right') - 1
+        if event < 0:
+            return [0, 0, 0], 0
+        ox, oy, oz, eo = self.offset_values[event].tolist()
+        return [ox, oy, oz], eo
+
+    def nbytes(self):
+        logs = (self.offset_lines, self.offset_values, self.arc_lines, self.arc_values)
+        return sum(getattr(self, name).nbytes for name in COLUMNS) + sum(log.nbytes for log in logs)
+
+
+# PrinterState attributes a StateView has
+VIEW_FIELDS = ('current_position', 'amount_extruded', 'feedrate', 'layer_height', 'layer', 'selected_tool',
+               'relative', 'extruding', 'mode', 'print_move_type', 'origin_offset', 'extrude_offset', 'var_dict')
+
+
+class StateView:
+    """Read-only view of the printer state after one line, backed by ``StateColumns``."""
+
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def current_position(self):
+        c, i = self._columns, self._index
+        return [float(c.x[i]), float(c.y[i]), float(c.z[i])]
+
+    @property
+    def amount_extruded(self):
+        return float(self._columns.e[self._index])
+
+    @property
+    def feedrate(self):
+        return float(self._columns.feedrate[self._index])
+
+    @property
+    def layer_height(self):
+        return float(self._columns.layer_height[self._index])
+
+    @property
+    def layer(self):
+        return int(self._columns.layer[self._index])
+
+    @property
+    def selected_tool(self):
+        tool = int(self._columns.tool[self._index])
+        return None if tool < 0 else tool
+
+    @property
+    def relative(self):
+        return bool(self._columns.flags[self._index] & FLAG_RELATIVE)
+
+    @property
+    def extruding(self):
+        return bool(self._columns.flags[self._index] & FLAG_EXTRUDING)
+
+    @property
+    def mode(self):
+        return MODES[self._columns.mode[self._index]]
+
+    @property
+    def print_move_type(self):
+        return self._columns.move_types[self._columns.move_type[self._index]]
+
+    @property
+    def origin_offset(self):
+        return self._columns.offsets(self._index)[0]
+
+    @property
+    def extrude_offset(self):
+        return self._columns.offsets(self._index)[1]
+
+    # var_dict is shared by every line: it holds the slicer settings of the whole file
+    @property
+    def var_dict(self):
+        return self._columns.var_dict
+
+    # Materialise a full, mutable PrinterState for this line
+    def to_state(self):
+        from .gcode import PrinterState
+        state = PrinterState()
+        state.current_position = self.current_position
+        state.amount_extruded = self.amount_extruded
+        state.feedrate = self.feedrate
+        state.layer_height = self.layer_height
+        state.layer = self.layer
+        state.selected_tool = self.selected_tool
+        state.relative = self.relative
+        state.extruding = self.extruding
+        state.mode = self.mode
+        state.print_move_type = self.print_move_type
+        state.origin_offset, state.extrude_offset = self._columns.offsets(self._index)
+        state.var_dict = dict(self.var_dict)
+        return state
+
+    # Compares what the columns hold, with a PrinterState or another view. Motion limits
+    # and other state kept only while parsing don't count.
+    def __eq__(self, other):
+        try:
+            return all(getattr(self, name) == getattr(other, name) for name in VIEW_FIELDS)
+        except AttributeError:
+            return False
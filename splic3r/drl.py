@@ -1,40 +1,277 @@
 import re
 
+import numpy as np
+
+from .lines import LineStore
+from .spatial import expand_ranges
+
+# Holes and slots, in mm. function is the tool's TA.AperFunction (e.g. 'ViaDrill' or 'ComponentDrill'),
+# plated whether the tool is plated, from its TA.AperFunction or else the file's TF.FileFunction.
+HOLE_DTYPE = [('x', 'f8'), ('y', 'f8'), ('diameter', 'f8'), ('tool', 'U8'), ('function', 'U24'), ('plated', '?')]
+# Slots run from x, y to x2, y2: G85 slots, and G01 moves routed between M15 and M16
+SLOT_DTYPE = [('x', 'f8'), ('y', 'f8'), ('x2', 'f8'), ('y2', 'f8'), ('diameter', 'f8'), ('tool', 'U8'),
+              ('function', 'U24'), ('plated', '?')]
+
+MM_PER_INCH = 25.4
+# Digits before and after the decimal point of numbers with no point in them, by units
+DEFAULT_DIGITS = {'METRIC': (3, 3), 'INCH': (2, 4)}
+
+TOOL_PATTERN = re.compile(r'T(\d+)(?:[^C]*C([\d.]+))?')
+UNITS_PATTERN = re.compile(r'(METRIC|INCH)(?:,(LZ|TZ))?(?:,(0*)\.?(0*))?')
+FORMAT_PATTERN = re.compile(r';\s*FORMAT=\{([\d-]+):([\d-]+)/[^}]*?(suppress trailing zeros|suppress leading zeros|decimal|keep zeros)?\s*\}')
+ATTRIBUTE_PATTERN = re.compile(r';\s*#@!\s*(TA\.AperFunction|TF\.FileFunction),(.*)')
+# Commands switching the body to coordinates relative to the point before, and back
+INCREMENTAL = (b'G91', b'ICI,ON')
+ABSOLUTE = (b'G90', b'ICI,OFF')
+
+
+# Numbers from an array of byte strings such as b'-12.5' or, with no decimal point, b'0125' in the
+# file's format: with leading zeros kept ('LZ') the number is read from the left, integer_digits
+# before the point; with trailing zeros kept ('TZ') it is read from the right, decimal_digits after it.
+def parse_numbers(text, integer_digits, decimal_digits, zeros='TZ'):
+    values = text.astype(np.float64)
+    implicit = np.char.find(text, b'.') < 0
+    if implicit.any():
+        if zeros == 'LZ':
+            signed = np.char.startswith(text, b'-') | np.char.startswith(text, b'+')
+            digits = np.char.str_len(text) - signed
+            values[implicit] /= 10.0 ** (digits[implicit] - integer_digits)
+        else:
+            values[implicit] /= 10.0 ** decimal_digits
+    return values
+
+
+# Fill the gaps (where present is False) with the value before them, or `first` at the start
+def forward_fill(values, present, first=0.0):
+    last = np.maximum.accumulate(np.where(present, np.arange(len(values)), -1))
+    return np.where(last >= 0, values[np.maximum(last, 0)], first)
+
+
+# Holes from several files (e.g. a PTH and NPTH pair) in one array, leaving out any hole within
+# tolerance mm of an earlier one. Close holes are found with a spatial hash of tolerance mm cells,
+# looking in each hole's cell and its eight neighbours.
+def merge_holes(hole_arrays, tolerance=0.005):
+    holes = np.concatenate([np.asarray(holes, dtype=HOLE_DTYPE) for holes in hole_arrays])
+    if len(holes) < 2:
+        return holes
+    cell = np.floor(np.stack((holes['x'], holes['y']), axis=1) / tolerance).astype(np.int64)
+    key = cell[:, 0] * (1 << 32) + cell[:, 1]
+    order = np.argsort(key, kind='stable')
+    sorted_keys = key[order]
+    duplicate = np.zeros(len(holes), dtype=bool)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour = key + dx * (1 << 32) + dy
+            lo = np.searchsorted(sorted_keys, neighbour, side='left')
+            counts = np.searchsorted(sorted_keys, neighbour, side='right') - lo
+            hole = np.repeat(np.arange(len(holes)), counts)
+            other = order[expand_ranges(lo, counts)]
+            close = (other < hole) & (np.hypot(holes['x'][hole] - holes['x'][other],
+                                               holes['y'][hole] - holes['y'][other]) <= tolerance)
+            duplicate[hole[close]] = True
+    return holes[~duplicate]
+
+
 class DrillFile:
-    
-    def __init__(self, raw_file):
-        self.raw_file = raw_file
+    """An Excellon drill file, read into arrays of holes and slots in mm.
+
+    The header sets the units (METRIC/INCH), the number format (LZ/TZ, the digits
+    after METRIC or INCH or in KiCad's ;FORMAT= comment), absolute or incremental
+    (ICI) coordinates and the tools, with their TA.AperFunction attributes. The body
+    is split into an array of lines and read with NumPy string operations: its
+    coordinates are converted, carried forward where they are left out (modal) or
+    added up where incremental (G91), and sorted into holes and slots as arrays.
+    """
+
+    def __init__(self, raw_file="", source=None):
+        self.source = LineStore.from_text(raw_file) if source is None else source
         self.tools = []
+        self.tool_table = {}
         self.selected_tool = None
-        self.drills = {}
+        self.units = 'METRIC'
+        self.zeros = 'TZ'
+        self.digits = None
+        self.incremental = False
+        self.file_function = None
+        self.holes = np.zeros(0, dtype=HOLE_DTYPE)
+        self.slots = np.zeros(0, dtype=SLOT_DTYPE)
         self.parse()
 
     @classmethod
     def from_file(cls, filename):
-        with open(filename, 'r') as f:
-            return cls(f.read())
-        
+        return cls(source=LineStore.from_file(filename))
+
+    @property
+    def raw_file(self):
+        return self.source.text()
+
+    # Drill positions by tool, as lists of (x, y)
+    @property
+    def drills(self):
+        drills = {tool: [] for tool, _ in self.tools}
+        for tool in drills:
+            rows = self.holes[self.holes['tool'] == tool]
+            drills[tool] = list(zip(rows['x'].tolist(), rows['y'].tolist()))
+        return drills
+
     def parse(self):
-        for line in self.raw_file.split('\n'):
-            if line.startswith('T'):
-                self.parse_tool(line)
-            elif line.startswith('X'):
-                self.parse_drill(line)
-    
-    def parse_tool(self, line):
-        pattern = re.compile(r'(T\d+)C(\d+.?\d*)')
-        if match := pattern.match(line):
-            tool = match.group(1)
-            tool_size = float(match.group(2))
-            self.tools.append((tool, tool_size))
-            self.drills[tool] = []
-            self.selected_tool = tool
-        if match := re.match(r'(T\d+)', line):
-            self.selected_tool = match.group(1)
-
-
-    def parse_drill(self, line):
-        x, y = line[1:].split('Y')
-        self.drills[self.selected_tool].append((float(x), float(y)))
-        
-    
\ No newline at end of file
+        body_start = self.parse_header()
+        if self.digits is None:
+            self.digits = DEFAULT_DIGITS[self.units]
+        self.parse_body(body_start)
+
+    # Read the header, from M48 to % or M95. Returns the line the body starts on: 0 if there is no
+    # M48, so a file of bare coordinates is read as all body.
+    def parse_header(self):
+        start = next((number for number, line in enumerate(self.source) if line.strip() == 'M48'), None)
+        if start is None:
+            return 0
+        pending = None
+        for number, line in enumerate(self.source.iter_lines(start + 1), start + 1):
+            line = line.strip()
+            if line in ('%', 'M95'):
+                return number + 1
+            if match := ATTRIBUTE_PATTERN.match(line):
+                if match.group(1) == 'TF.FileFunction':
+                    self.file_function = match.group(2).split(',')
+                else:
+                    pending = match.group(2).split(',')
+            elif match := FORMAT_PATTERN.match(line):
+                integer, decimal, zeros = match.groups()
+                if integer.isdigit() and decimal.isdigit():
+                    self.digits = (int(integer), int(decimal))
+                if zeros == 'suppress trailing zeros':
+                    self.zeros = 'LZ'
+                elif zeros == 'suppress leading zeros':
+                    self.zeros = 'TZ'
+            elif match := UNITS_PATTERN.match(line):
+                self.units, zeros, integer, decimal = match.groups()
+                self.zeros = zeros or self.zeros
+                if integer is not None and (integer or decimal):
+                    self.digits = (len(integer), len(decimal))
+            elif line.startswith('ICI'):
+                self.incremental = line.endswith('ON')
+            elif match := TOOL_PATTERN.match(line):
+                if match.group(2) is not None:
+                    self.define_tool(int(match.group(1)), float(match.group(2)), pending)
+                pending = None
+        return len(self.source)
+
+    # Add tool T<number> of the given diameter, in the current units, with its TA.AperFunction fields
+    def define_tool(self, number, diameter, attribute=None):
+        tool = f'T{number}'
+        if self.units == 'INCH':
+            diameter *= MM_PER_INCH
+        function = attribute[-1] if attribute else ''
+        if attribute:
+            plated = attribute[0] == 'Plated'
+        else:
+            plated = self.file_function is None or self.file_function[0] == 'Plated'
+        if tool not in self.tool_table:
+            self.tools.append((tool, diameter))
+        else:
+            self.tools = [(name, diameter if name == tool else size) for name, size in self.tools]
+        self.tool_table[tool] = (diameter, function, plated)
+
+    # Read the body as an array of lines: tool selections and changes of units are picked out
+    # by their first letters, and coordinates split up with array string operations, so there
+    # is no Python work per hole.
+    def parse_body(self, first_line):
+        start, stop = self.source.byte_range(first_line, len(self.source))
+        lines = np.char.strip(np.array(self.source.buffer[start:stop].split(b'\n')))
+        first = lines.astype('S1')
+
+        # Tools selected (and sometimes defined) in the body
+        is_tool = first == b'T'
+        numbers = np.full(len(lines), -1, dtype=np.int64)
+        for row in np.flatnonzero(is_tool).tolist():
+            match = TOOL_PATTERN.match(lines[row].decode())
+            if match is None:
+                is_tool[row] = False
+                continue
+            numbers[row] = int(match.group(1))
+            if match.group(2) is not None:
+                self.define_tool(numbers[row], float(match.group(2)))
+        row_tool = forward_fill(numbers, is_tool, -1).astype(np.int64)
+        if is_tool.any():
+            self.selected_tool = f'T{int(numbers[is_tool][-1])}'
+        # Units changed by M71 (metric) or M72 (inch)
+        inch = np.char.startswith(lines, b'M72') | np.char.startswith(lines, b'INCH')
+        is_units = inch | np.char.startswith(lines, b'M71') | np.char.startswith(lines, b'METRIC')
+        row_inch = forward_fill(inch, is_units, self.units == 'INCH').astype(bool)
+        # Incremental coordinates from G91 (or ICI,ON in the header) until G90
+        incremental = np.zeros(len(lines), dtype=bool)
+        is_mode = np.zeros(len(lines), dtype=bool)
+        for commands, value in ((INCREMENTAL, True), (ABSOLUTE, False)):
+            for command in commands:
+                rows = np.char.startswith(lines, command)
+                incremental[rows], is_mode[rows] = value, True
+        row_incremental = forward_fill(incremental, is_mode, self.incremental).astype(bool)
+
+        # Coordinates, perhaps after G00 or G01, and perhaps followed by G85 and a slot end
+        moves = np.isin(lines.astype('S4'), (b'G00X', b'G00Y', b'G01X', b'G01Y'))
+        rows = np.flatnonzero((first == b'X') | (first == b'Y') | moves)
+        if len(rows) == 0:
+            return
+        start_text, g85, end_text = np.moveaxis(np.char.partition(lines[rows], b'G85'), -1, 0)
+        before_y, _, y = np.moveaxis(np.char.partition(start_text, b'Y'), -1, 0)
+        prefix, _, x = np.moveaxis(np.char.partition(before_y, b'X'), -1, 0)
+        before_y, _, y2 = np.moveaxis(np.char.partition(end_text, b'Y'), -1, 0)
+        x2 = np.char.partition(before_y, b'X')[..., 2]
+
+        # Each coordinate line gives a point, and a G85 slot a second one for its end
+        slot = g85 != b''
+        position = np.arange(len(rows)) + np.cumsum(slot) - slot
+        count = len(rows) + int(slot.sum())
+        point_row = np.empty(count, dtype=np.int64)
+        point_row[position] = rows
+        point_row[position[slot] + 1] = rows[slot]
+        points = []
+        for start_column, end_column in ((x, x2), (y, y2)):
+            text = np.empty(count, dtype=np.result_type(start_column, end_column))
+            text[position] = start_column
+            text[position[slot] + 1] = end_column[slot]
+            present = text != b''
+            values = np.zeros(count)
+            values[present] = parse_numbers(text[present], *self.digits, self.zeros)
+            values[row_inch[point_row]] *= MM_PER_INCH
+            # Coordinates left out keep their last value, and incremental ones add to it: each
+            # point is the last absolute one plus the increments since
+            relative = row_incremental[point_row]
+            steps = np.cumsum(np.where(relative, values, 0.0))
+            points.append(forward_fill(values - steps, present & ~relative) + steps)
+        points = np.stack(points, axis=1)
+
+        drill = (prefix == b'') & ~slot
+        routed = prefix == b'G01'
+        self.holes = self.table(HOLE_DTYPE, row_tool[rows[drill]], points[position[drill]])
+        # G01 routes from the point before; G85 slots from their own start to their end
+        route_end = position[routed]
+        route_start = np.maximum(route_end - 1, 0)
+        slot_start = np.concatenate((route_start, position[slot]))
+        slot_end = np.concatenate((route_end, position[slot] + 1))
+        order = np.argsort(slot_start, kind='stable')
+        slot_tool = np.concatenate((row_tool[rows[routed]], row_tool[rows[slot]]))[order]
+        self.slots = self.table(SLOT_DTYPE, slot_tool, points[slot_start[order]], points[slot_end[order]])
+
+    # Structured array of holes or slots with the tool's diameter, function and plating. Rows with
+    # no tool, or an undefined one, are left out.
+    def table(self, dtype, tool_numbers, start, end=None):
+        known = np.zeros(len(tool_numbers), dtype=bool)
+        out = np.zeros(len(tool_numbers), dtype=dtype)
+        for number in np.unique(tool_numbers).tolist():
+            name = f'T{number}'
+            if name not in self.tool_table:
+                continue
+            rows = tool_numbers == number
+            known |= rows
+            out['diameter'][rows], out['function'][rows], out['plated'][rows] = self.tool_table[name]
+            out['tool'][rows] = name
+        out['x'], out['y'] = start[:, 0], start[:, 1]
+        if end is not None:
+            out['x2'], out['y2'] = end[:, 0], end[:, 1]
+        return out[known]
+
+    # Every hole as a structured array of x, y, diameter, tool, function and plated
+    def hole_array(self):
+        return self.holes
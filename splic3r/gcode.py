@@ -1,48 +1,432 @@
 import re
-from copy import deepcopy
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+from .arcs import arc_geometry, linearize
+from .columns import StateColumns, StateView
+from .layers import LayerIndex
+from .lines import LineStore
+from .paths import extruding_moves, extrusion_paths, total_bounds, type_bounds
+from .spatial import SegmentGrid, expand_ranges
+from .tokens import parse_words, tokenize_line
+
+# Bump when a change to the parser changes the columns it produces, to invalidate cached parses
+PARSER_VERSION = 2
+
+# Slicer settings comments such as '; nozzle_diameter = 0.4'
+VAR_PATTERN = re.compile(r'\s*;\s*([\w\s]+)\s*=\s*(.*)')
+# Lines parsed at a time while looking for the state to settle after an edit
+EDIT_BLOCK_LINES = 64
+
+SPLIT_PATTERN = re.compile(r'([GMTDP]\d+\.?\d*|T\d+|[XYZABCEFHIJRS]-?\d*\.?\d*)')
 
 class GCode:
-    def __init__(self, raw_data=""):
-        self.raw_data = raw_data
-        self.lines = []
+    # Largest distance in mm between an arc and the chords it is drawn with, see arc_paths
+    arc_tolerance = 0.01
+
+    # source is a LineStore holding the text; it is built from raw_data when not given.
+    # workers > 1 parses in that many processes (None for one per core), see parallel.parse_parallel.
+    # cache is a ParseCache to load the parse from, or save it to.
+    # stats is a ParseStats to count commands and time the parse with (nothing is counted on a cache hit).
+    def __init__(self, raw_data="", source=None, workers=1, cache=None, stats=None):
+        self.source = LineStore.from_text(raw_data) if source is None else source
+        self.workers = workers
+        self.cache = cache
+        self.stats = stats
+        self.columns = StateColumns()
+        self.segment_indexes = {}
+        self.arc_cache = {}
+        self.path_cache = {}
         self.deconstruct()
 
+    # Memory-maps the file: lines stay as bytes until they are asked for
     @classmethod
-    def from_file(cls, file_path):
+    def from_file(cls, file_path, workers=1, cache=None, stats=None):
+        return cls(source=LineStore.from_file(file_path), workers=workers, cache=cache, stats=stats)
+
+    # A GCode for a file parsed elsewhere, from its LineStore, StateColumns and LayerIndex,
+    # e.g. handed to a worker in shared memory (see batch.SharedParse)
+    @classmethod
+    def from_parsed(cls, source, columns, layers):
+        gcode = cls.__new__(cls)
+        gcode.source, gcode.workers, gcode.cache, gcode.stats = source, 1, None, None
+        gcode.columns, gcode.layers = columns, layers
+        gcode.segment_indexes, gcode.arc_cache, gcode.path_cache = {}, {}, {}
+        gcode.lines = GcodeLines(gcode)
+        gcode.line_count = len(source)
+        return gcode
+
+    @property
+    def raw_data(self):
+        return self.source.text()
+
+    # Parse a file one line at a time, yielding (line, state) pairs.
+    # The same PrinterState is updated and yielded for every line, so copy it if you need to keep it.
+    @classmethod
+    def iter_file(cls, file_path, chunk_size=1 << 20):
         with open(file_path, 'r') as file:
-            raw_data = file.read()
-        return cls(raw_data)
-    
+            yield from cls.iter_lines(cls.read_lines(file, chunk_size))
 
-    def deconstruct(self):
-        lines = self.raw_data.splitlines()
-        current_state = PrinterState()
+    @classmethod
+    def iter_lines(cls, lines, state=None):
+        parser = cls()
+        current_state = PrinterState() if state is None else state
         for line in lines:
-            self.lines.append(self.parse_line(line, current_state))
-        self.line_count = len(self.lines)
+            parser.parse_line(line, current_state)
+            yield line, current_state
+
+    # Read a text file in chunks of chunk_size characters, yielding one line at a time
+    @staticmethod
+    def read_lines(file, chunk_size=1 << 20):
+        pending = ''
+        while chunk := file.read(chunk_size):
+            lines = (pending + chunk).split('\n')
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
 
-    def parse_line(self, line, current_state):
-        if line.lstrip().startswith(';'):
-            return GcodeLine(line, deepcopy(current_state.interpret_comment(line)))
-        elif line.lstrip() == '':
-            return GcodeLine(line, current_state)
+    def deconstruct(self):
+        key = self.cache.key(self.source) if self.cache is not None else None
+        cached = self.cache.load(self.source, key) if key is not None else None
+        if cached is not None:
+            self.columns, self.layers = cached
         else:
-            parts = self.split_command(line)
-            return GcodeLine(line, deepcopy(current_state.execute_command(parts)))
+            if self.workers == 1:
+                current_state = self.parse_lines(self.source, PrinterState(), self.columns)
+                self.columns.finalize(current_state.var_dict)
+            else:
+                from .parallel import parse_parallel
+                self.columns = parse_parallel(self.source, self.workers, stats=self.stats)
+            self.layers = LayerIndex(self.columns.layer, self.columns.layer_height)
+            if key is not None:
+                self.cache.store(self.source, self.columns, self.layers, key)
+        self.lines = GcodeLines(self)
+        self.line_count = len(self.source)
+
+    # Replace lines [first, last) with new_lines (a list of lines or a block of text) and
+    # re-derive the state from `first` on. Parsing stops as soon as the state after a line
+    # matches what it was after the same line before the edit, e.g. after the next G92 E0
+    # and absolute move, so an edit costs about as much as the lines it touches.
+    # G92 offsets further on are brought up to date by re-running just the G92 lines.
+    # Returns the number of lines parsed.
+    def replace_lines(self, first, last, new_lines):
+        if isinstance(new_lines, str):
+            new_lines = new_lines.splitlines()
+        else:
+            # An item holding newlines is that many lines, so the columns keep one row per line
+            new_lines = [part for line in new_lines for part in (line.splitlines() or [''])]
+        old_count = len(self.source)
+        if not 0 <= first <= last <= old_count:
+            raise IndexError(f"Line range {first}:{last} not in file")
+        old = self.columns
+        settings_changed = any(self.is_setting(line) for line in new_lines)
+        settings_changed |= any(self.is_setting(line) for line in self.source.iter_lines(first, last))
+        shift = len(new_lines) - (last - first)
+
+        # Every part shares the old move type codes, so rows can be compared directly
+        def new_part():
+            part = StateColumns()
+            part.move_types, part.move_type_codes = old.move_types, old.move_type_codes
+            return part
+
+        def state_row(state):
+            part = new_part()
+            part.append(state)
+            return part.finalize()
+
+        # The new lines are parsed before the text changes, so a line that fails leaves the file as it was
+        state = self.state_before(first)
+        edited = new_part()
+        self.parse_lines(new_lines, state, edited)
+        self.source.replace_lines(first, last, new_lines)
+        parts = [old.slice(0, first), edited.finalize()]
+        parsed = len(new_lines)
+
+        # Old line `resume` is now line resume + shift: parse on until a state matches the old one
+        resume = last
+        reference = old.slice(last - 1, last) if last else state_row(PrinterState())
+        matched = state_row(state).first_match(0, reference, 0, 1) is not None
+        while not matched and resume < old_count:
+            stop = min(resume + EDIT_BLOCK_LINES, old_count)
+            block = new_part()
+            self.parse_lines(self.source.iter_lines(resume + shift, stop + shift), state, block)
+            block.finalize()
+            match = block.first_match(0, old, resume, stop - resume)
+            matched = match is not None
+            count = stop - resume if match is None else match + 1
+            parts.append(block.slice(0, count))
+            parsed += count
+            resume += count
+        parts.append(old.slice(resume, old_count))
+        columns = StateColumns.concatenate(parts)
+
+        # Offsets from the unparsed rest of the file are stale if the edit changed the running total
+        if columns.offsets(resume + shift - 1) != old.offsets(resume - 1):
+            self.replay_offsets(columns, resume + shift)
+        columns.var_dict = self.read_settings() if settings_changed else old.var_dict
+        self.columns = columns
+        self.line_count = len(self.source)
+        self.layers = LayerIndex(columns.layer, columns.layer_height)
+        self.segment_indexes = {}
+        self.arc_cache = {}
+        self.path_cache = {}
+        return parsed
+
+    # Bytes held for the file, by what holds them. Lines themselves cost nothing until asked for.
+    def memory_usage(self):
+        usage = {
+            'text': len(self.source.buffer),
+            'line_starts': self.source.starts.nbytes,
+            'columns': self.columns.nbytes(),
+            'layers': sum(array.nbytes for array in vars(self.layers).values() if isinstance(array, np.ndarray)),
+        }
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def insert_lines(self, index, new_lines):
+        return self.replace_lines(index, index, new_lines)
+
+    def delete_lines(self, first, last):
+        return self.replace_lines(first, last, [])
+
+    # Full PrinterState before line `index`, i.e. after the line before it
+    def state_before(self, index):
+        if index == 0:
+            return PrinterState()
+        state = StateView(self.columns, index - 1).to_state()
+        state.var_dict = {}
+        return state
+
+    # Re-run the G92 lines from line `first` on, carrying on from the offsets before it
+    def replay_offsets(self, columns, first):
+        origin_offset, extrude_offset = columns.offsets(first - 1)
+        for event in np.flatnonzero(columns.offset_lines >= first).tolist():
+            line = int(columns.offset_lines[event])
+            g92 = StateView(columns, line - 1).to_state() if line else PrinterState()
+            g92.origin_offset, g92.extrude_offset = list(origin_offset), extrude_offset
+            self.parse_line(self.source[line], g92)
+            origin_offset, extrude_offset = g92.origin_offset, g92.extrude_offset
+            columns.offset_values[event] = origin_offset + [extrude_offset]
+
+    @staticmethod
+    def is_setting(line):
+        return line.lstrip().startswith(';') and VAR_PATTERN.match(line) is not None
+
+    # var_dict read from the whole file again
+    def read_settings(self):
+        state = PrinterState()
+        for line in self.source:
+            if self.is_setting(line):
+                state.interpret_comment(line)
+        return state.var_dict
+
+    # Layer by number: (number, first_line, last_line, z, height)
+    def layer(self, number):
+        return self.layers.layer(number)
+
+    # Layer being printed at height z, or None above the top of the print
+    def layer_at_z(self, z):
+        return self.layers.layer_at_z(z)
+
+    # First and last line of a layer, or of the whole file, leaving out line 0 which has no move into it
+    def line_range(self, layer_number=None):
+        if layer_number is None:
+            return 1, self.line_count - 1
+        layer = self.layer(layer_number)
+        return max(layer.first_line, 1), layer.last_line
+
+    # G2/G3 arcs of a layer (or of the whole file) as polylines no further than tolerance
+    # (arc_tolerance by default) from the true arcs, an arcs.ArcPaths. Worked out for all the
+    # layer's arcs at once and cached, so repeated queries don't redo the trigonometry.
+    def arc_paths(self, layer_number=None, tolerance=None):
+        tolerance = self.arc_tolerance if tolerance is None else tolerance
+        key = (layer_number, tolerance)
+        if key not in self.arc_cache:
+            self.arc_cache[key] = linearize(arc_geometry(self.columns, *self.line_range(layer_number)), tolerance)
+        return self.arc_cache[key]
+
+    # Extruding XY moves of a layer (or of the whole file) as an (N, 4) array of x0, y0, x1, y1,
+    # and the line number of each move. Arcs are cut into chords, see arc_paths.
+    def extrusion_segments(self, layer_number=None):
+        first_line, last_line = self.line_range(layer_number)
+        c = self.columns
+        lines, arc, extruding = extruding_moves(c, first_line, last_line)
+        lines, arc = lines[extruding], arc[extruding]
+        previous = lines - 1
+        segments = np.stack((c.x[previous], c.y[previous], c.x[lines], c.y[lines]), axis=1)
+        if not arc.any():
+            return segments, lines
+
+        paths = self.arc_paths(layer_number)
+        which = np.searchsorted(paths.lines, lines[arc])
+        counts = np.diff(paths.offsets)[which] - 1
+        first = expand_ranges(paths.offsets[which], counts)
+        chords = np.hstack((paths.points[first, :2], paths.points[first + 1, :2]))
+        segments = np.concatenate((segments[~arc], chords))
+        lines = np.concatenate((lines[~arc], np.repeat(lines[arc], counts)))
+        order = np.argsort(lines, kind='stable')
+        return segments[order], lines[order]
+
+    # Extruding moves of a layer (or of the whole file) joined into polylines split at travels and
+    # ;TYPE: changes, a paths.ExtrusionPaths. types is a list of ;TYPE: names to keep, or None for
+    # all. Worked out in one pass over the layer's columns and cached, with each path's bounding box.
+    def extrusion_paths(self, layer_number=None, types=None):
+        types = None if types is None else tuple(types)
+        key = (layer_number, types)
+        if key not in self.path_cache:
+            codes = None
+            if types is not None:
+                codes = [self.columns.move_type_codes[name] for name in types if name in self.columns.move_type_codes]
+            self.path_cache[key] = extrusion_paths(self.columns, *self.line_range(layer_number),
+                                                   self.arc_paths(layer_number), codes)
+        return self.path_cache[key]
+
+    # (2, 3) min and max x, y, z of the extrusion in a layer or the whole file, NaN if there is none
+    def extrusion_bounds(self, layer_number=None, types=None):
+        return total_bounds(self.extrusion_paths(layer_number, types))
+
+    # Extrusion bounds of every row of the LayerIndex, (layers, 2, 3), NaN for layers that print nothing
+    def layer_bounds(self, types=None):
+        paths = self.extrusion_paths(None, types)
+        bounds = np.full((len(self.layers), 2, 3), np.nan)
+        if len(paths.lines):
+            row = np.searchsorted(self.layers.first_line, paths.lines, side='right') - 1
+            rows, first = np.unique(row, return_index=True)
+            bounds[rows, 0] = np.minimum.reduceat(paths.bounds[:, 0], first)
+            bounds[rows, 1] = np.maximum.reduceat(paths.bounds[:, 1], first)
+        return bounds
+
+    # Extrusion bounds of a layer or the whole file for each ;TYPE: name
+    def type_bounds(self, layer_number=None):
+        return type_bounds(self.extrusion_paths(layer_number), self.columns.move_types)
+
+    # SegmentGrid over a layer's extrusion segments with cells of cell_size mm, built on first use
+    # and kept. There is no index of the whole print: its queries would gather candidates from
+    # every layer at once, so look layers up one at a time (see planner.coverage).
+    def segment_index(self, layer_number, cell_size=1.0):
+        if layer_number is None:
+            raise ValueError("segment_index is per layer, give a layer number")
+        key = (layer_number, cell_size)
+        if key not in self.segment_indexes:
+            segments, _ = self.extrusion_segments(layer_number)
+            self.segment_indexes[key] = SegmentGrid(segments, cell_size)
+        return self.segment_indexes[key]
+
+    # Parse lines into columns, one row per line, returning the state after the last line
+    def parse_lines(self, lines, current_state, columns):
+        if self.stats is not None:
+            return self.parse_lines_timed(lines, current_state, columns, self.stats)
+        for line in lines:
+            command = self.parse_line(line, current_state)
+            columns.append(current_state, command)
+        return current_state
+
+    # parse_lines with every phase and handler timed. Kept apart so the usual loop pays nothing for it.
+    def parse_lines_timed(self, lines, current_state, columns, stats):
+        clock = time.perf_counter
+        phases = stats.phases
+        current_state.stats = stats
+        lines = iter(lines)
+        while True:
+            start = clock()
+            line = next(lines, None)
+            if line is None:
+                phases['read'] += clock() - start
+                break
+            read = clock()
+            command = None
+            stripped = line.lstrip()
+            if stripped.startswith(';'):
+                current_state.interpret_comment(line)
+                tokenized = read
+            elif stripped != '':
+                command = tokenize_line(stripped)
+                tokenized = clock()
+                if command is not None:
+                    current_state.execute(*command)
+            else:
+                tokenized = read
+            executed = clock()
+            columns.append(current_state, command)
+            copied = clock()
+            if command is not None:
+                stats.commands[command[0]] += 1
+                stats.command_time[command[0]] += executed - tokenized
+            stats.lines += 1
+            phases['read'] += read - start
+            phases['tokenize'] += tokenized - read
+            phases['execute'] += executed - tokenized
+            phases['copy'] += copied - executed
+        return current_state
+
+    # Update current_state in place, returning the (word, args) command that was executed
+    # (None for comments, blanks and lines without a command)
+    def parse_line(self, line, current_state):
+        stripped = line.lstrip()
+        if stripped.startswith(';'):
+            current_state.interpret_comment(line)
+        elif stripped != '':
+            command = tokenize_line(stripped)
+            if command is not None:
+                current_state.execute(*command)
+            return command
+        return None
 
     def split_command(self, line):
         line = line.split(';')[0] # Remove comments	
-        pattern = r'([GMTDP]\d+\.?\d*|T\d+|[XYZABCEFHIJRS]-?\d*\.?\d*)'
-        matches = re.findall(pattern, line)
+        matches = SPLIT_PATTERN.findall(line)
 
         return matches
 
+class GcodeLines(Sequence):
+    # Read-only list of GcodeLine, created on access
+    def __init__(self, gcode):
+        self.gcode = gcode
+
+    def __len__(self):
+        return len(self.gcode.source)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        return GcodeLine(self.gcode, index)
+
+# One per line asked for, so it only holds where the line is: the text stays in the
+# source buffer and the state in the columns
 class GcodeLine():
-    def __init__(self, line, state):
-        self.line = line
-        self.state = state
+    __slots__ = ('gcode', 'index')
+
+    def __init__(self, gcode, index):
+        self.gcode = gcode
+        self.index = index
+
+    # Text of the line, decoded from the source buffer
+    @property
+    def line(self):
+        return self.gcode.source[self.index]
+
+    # State after this line, as a view into the parsed state columns
+    @property
+    def state(self):
+        return StateView(self.gcode.columns, self.index)
 
 class PrinterState:
+    # Command word -> handler(state, args), filled in below the class
+    commands = {}
+    # Command letter -> handler(state, command), for words that carry a number such as T3 or P0
+    prefix_commands = {}
+    # Raise NotImplementedError for unknown commands instead of ignoring them
+    strict = False
+    # ParseStats counting unknown commands and arguments, set by GCode(..., stats=...)
+    stats = None
+
     def __init__(self):
         self.current_position = [0,0,0]
         self.hotend_temperature = []
@@ -61,11 +445,19 @@ class PrinterState:
         self.print_move_type = None
         self.mode = None
         self.var_dict = {}
+        # Motion limits from M201-M205, starting from Marlin's defaults. X, Y, Z, E; mm/s and mm/s^2.
+        self.max_acceleration = [3000, 3000, 100, 10000]
+        self.max_feedrate = [300, 300, 5, 25]
+        self.acceleration = 3000
+        self.retract_acceleration = 3000
+        self.travel_acceleration = 3000
+        self.jerk = [10, 10, 0.3, 5]
+        # Seconds of the last G4
+        self.dwell = 0
 
     def interpret_comment(self, comment):
         self.extruding = False
-        pattern = r'\s*;\s*([\w\s]+)\s*=\s*(.*)'
-        match = re.match(pattern, comment)
+        match = VAR_PATTERN.match(comment)
         if match:
             self.var_dict[match.group(1).strip()] = match.group(2).strip()
         elif comment.startswith(';LAYER_CHANGE'):
@@ -86,136 +478,100 @@ class PrinterState:
         return self                              
         
 
+    # Execute a command given as strings, e.g. ['G1', 'X135.599', 'Y58.092', 'E.0677']
     def execute_command(self, command):
+        return self.execute(*parse_words(command))
+
+    # Execute a tokenized command: args is a list of (letter, value) pairs starting with the command word
+    def execute(self, word, args):
         self.extruding = False
-        if command[0] == 'G0':
-            self.G1(command[1:])
-        elif command[0] == 'G1':
-            self.G1(command[1:])
-        elif command[0] == 'G2':
-            self.G2(command[1:])
-        elif command[0] == 'G3':
-            self.G2(command[1:])
-        elif command[0] == 'G4':
-            self.G4(command[1:])
-        elif command[0] == 'G20':
-            self.G20(command[1:])
-        elif command[0] == 'G21':
-            self.G21(command[1:])
-        elif command[0] == 'G28':
-            self.G28(command[1:])
-        elif command[0] == 'G29':
-            self.G29(command[1:])
-        elif command[0] == 'G90':
-            self.G90(command[1:])
-        elif command[0] == 'G92':
-            self.G92(command[1:])
-        elif command[0] == 'M17':
-            self.M17(command[1:])
-        elif command[0] == 'M73':
-            self.M73(command[1:])
-        elif command[0] == 'M77':
-            self.M77(command[1:])
-        elif command[0] == 'M83':
-            self.M83(command[1:])
-        elif command[0] == 'M84':
-            self.M84(command[1:])
-        elif command[0] == 'M104':
-            self.M104(command[1:])
-        elif command[0] == 'M104.1':
-            self.M104(command[1:])
-        elif command[0] == 'M106':
-            self.M106(command[1:])
-        elif command[0] == 'M107':
-            self.M107(command[1:])
-        elif command[0] == 'M109':
-            self.M109(command[1:])
-        elif command[0] == 'M115':
-            self.M115(command[1:])
-        elif command[0] == 'M140':
-            self.M140(command[1:])
-        elif command[0] == 'M142':
-            self.M142(command[1:])
-        elif command[0] == 'M190':
-            self.M190(command[1:])
-        elif command[0] == 'M201':
-            self.M201(command[1:])
-        elif command[0] == 'M203':
-            self.M203(command[1:])
-        elif command[0] == 'M204':
-            self.M204(command[1:])
-        elif command[0] == 'M205':
-            self.M205(command[1:])
-        elif command[0] == 'M217':
-            self.M217(command[1:])
-        elif command[0] == 'M220':
-            self.M220(command[1:])
-        elif command[0] == 'M221':
-            self.M221(command[1:])
-        elif command[0] == 'M302':
-            self.M302(command[1:])
-        elif command[0] == 'M486':
-            self.M486(command[1:])
-        elif command[0] == 'M555':
-            self.M555(command[1:])
-        elif command[0] == 'M862.1':
-            self.M862_1(command[1:])
-        elif command[0] == 'M862.3':
-            self.M862_3(command[1:])
-        elif command[0] == 'M900':
-            self.M900(command[1:])
-        elif command[0].startswith('P'):
-            self.P(command)
-        elif command[0].startswith('T'):
-            self.T(command)
-        else:
-            raise NotImplementedError(f"Command {command[0]} not implemented")
+        try:
+            handler = self.commands[word]
+        except KeyError:
+            handler = self.prefix_commands.get(word[:1])
+            if handler is None:
+                self.unknown_command(word, args)
+            else:
+                handler(self, args)
+            return self
+        handler(self, args[1:])
         return self
 
+    # Called for commands with no registered handler: ignored unless strict is set
+    def unknown_command(self, word, args):
+        if self.strict:
+            raise NotImplementedError(f"Command {word} not implemented")
+        if self.stats is not None:
+            self.stats.unknown_command(word)
+
+    # Called by handlers for arguments they don't recognise or that have no value
+    def unknown_argument(self, word, letter, value):
+        if self.stats is not None:
+            self.stats.unknown_argument(word, letter, value)
+
+    # Register handler(state, args) for a command word, e.g. 'M600'. args are the (letter, value) pairs after the word.
+    # With prefix=True the handler is used for every word starting with that letter and also gets the word itself.
+    # Can be used as a decorator: @PrinterState.register_command('M600')
+    @classmethod
+    def register_command(cls, word, handler=None, prefix=False):
+        if handler is None:
+            def decorator(handler):
+                cls.register_command(word, handler, prefix)
+                return handler
+            return decorator
+        table = 'prefix_commands' if prefix else 'commands'
+        if table not in cls.__dict__:
+            # Copy the inherited table so subclasses don't change their parent's dispatch
+            setattr(cls, table, dict(getattr(cls, table)))
+        getattr(cls, table)[word] = handler
+
     # G1: Linear move
     def G1(self, args):
-        for arg in args:
-            if arg.startswith('X'):
+        for letter, value in args:
+            if value is None:
+                self.unknown_argument('G1', letter, value)
+            elif letter == 'X':
                 if self.relative:
-                    self.current_position[0] += float(arg[1:])
+                    self.current_position[0] += value
                 else: 
-                    self.current_position[0] = float(arg[1:])
-            elif arg.startswith('Y'):
+                    self.current_position[0] = value
+            elif letter == 'Y':
                 if self.relative:
-                    self.current_position[1] += float(arg[1:])
+                    self.current_position[1] += value
                 else: 
-                    self.current_position[1] = float(arg[1:])
-            elif arg.startswith('Z'):
+                    self.current_position[1] = value
+            elif letter == 'Z':
                 if self.relative:
-                    self.current_position[2] += float(arg[1:])
+                    self.current_position[2] += value
                 else: 
-                    self.current_position[2] = float(arg[1:])
-            elif arg.startswith('E'):
+                    self.current_position[2] = value
+            elif letter == 'E':
                 self.extruding = True
-                self.amount_extruded += float(arg[1:])
-            elif arg.startswith('F'):
-                self.feedrate = float(arg[1:])
+                self.amount_extruded += value
+            elif letter == 'F':
+                self.feedrate = value
             else:
-                print(f"G1 Argument {arg} not recognized")   
+                self.unknown_argument('G1', letter, value)
     
-    # G2: Clockwise arc
+    # G2: Clockwise arc, G3: counter-clockwise arc
     def G2(self, args):
-        # Since we aren't keeping track of intermediary points, we only need to know about start and end points
-        # We can treat this the same as G0 and G1
-        args = [arg for arg in args if not arg.startswith('I') and not arg.startswith('J') and not arg.startswith('R')]
-        ## Confirm that both X and Y coordinates are supplied
-        assert any(arg.startswith('X') for arg in args) and any(arg.startswith('Y') for arg in args), "Both X and Y coordinates must be supplied"
-        self.G1(args)
-
-    ## G4: Dwell - Nothing to do, we're not counting time or anything yet
+        # The state only follows the end point. StateColumns logs I, J and R for the arc
+        # geometry in arcs.py; with I and J but no X or Y the arc is a full circle.
+        assert any(letter in ('X', 'Y', 'I', 'J') for letter, _ in args), "An arc needs an end point or a centre"
+        self.G1([arg for arg in args if arg[0] not in ('I', 'J', 'R')])
+
+    # G4: Dwell, P in milliseconds or S in seconds
     def G4(self, args):
-        for arg in args:
-            if arg.startswith('P'):
-                pass
-            elif arg.startswith('S'):
-                pass
+        self.dwell = 0
+        for letter, value in args:
+            if value is None:
+                self.unknown_argument('G4', letter, value)
+            elif letter == 'P':
+                self.dwell += value / 1000
+            elif letter == 'S':
+                self.dwell += value
             else:
-                print(f"G4 Argument {arg} not recognized")
+                self.unknown_argument('G4', letter, value)
 
     def G20(self, args):
         raise NotImplementedError("G20 'Set units to inches' not implemented")
@@ -225,25 +581,25 @@ class PrinterState:
 
     # G28: Home
     def G28(self, args):
-        for arg in args:
-            if arg.startswith('X'):
+        for letter, value in args:
+            if letter == 'X':
                 self.current_position[0] = 0
-            elif arg.startswith('Y'):
+            elif letter == 'Y':
                 self.current_position[1] = 0
-            elif arg.startswith('Z'):
+            elif letter == 'Z':
                 self.current_position[2] = 0
-            elif arg.startswith('W'):
+            elif letter == 'W':
                 pass
-            elif arg.startswith('C'):
+            elif letter == 'C':
                 pass
-            elif arg.startswith('P'):
+            elif letter == 'P':
                 pass
-            elif arg.startswith('I'):
+            elif letter == 'I':
                 pass
             else:
-                print(f"G28 Argument {arg} not recognized")
-        ## if none start with x, y, or z, then home all axes
-        if not any(arg.startswith('X') or arg.startswith('Y') or arg.startswith('Z') for arg in args):
+                self.unknown_argument('G28', letter, value)
+        ## if none are x, y, or z, then home all axes
+        if not any(letter in ('X', 'Y', 'Z') for letter, _ in args):
             self.current_position = [0,0,0]
 
     # G29: Auto bed leveling
@@ -260,18 +616,18 @@ class PrinterState:
 
     # G92: Set position
     def G92(self, args):
-        for arg in args:
-            val =  0 if arg[1:] == "" else float(arg[1:])
-            if arg.startswith('X'):
+        for letter, value in args:
+            val =  0 if value is None else value
+            if letter == 'X':
                 self.origin_offset[0] += self.current_position[0] - val
                 self.current_position[0] = val
-            elif arg.startswith('Y'):
+            elif letter == 'Y':
                 self.origin_offset[1] += self.current_position[1] - val
                 self.current_position[1] = val
-            elif arg.startswith('Z'):
+            elif letter == 'Z':
                 self.origin_offset[2] += self.current_position[2] - val
                 self.current_position[2] = val
-            elif arg.startswith('E'):
+            elif letter == 'E':
                 self.extrude_offset += self.amount_extruded - val
                 self.amount_extruded = val
         if len(args) == 0:
@@ -332,21 +688,44 @@ class PrinterState:
     def M190(self, args):
         pass  # TODO: Implement M190 command
 
+    # Set the X, Y, Z and E entries of a per-axis limit from a command's arguments
+    def set_axes(self, word, limits, args, ignored=()):
+        for letter, value in args:
+            if letter in 'XYZE' and value is not None:
+                limits['XYZE'.index(letter)] = value
+            elif letter not in ignored:
+                self.unknown_argument(word, letter, value)
+
     # M201: Set maximum acceleration
     def M201(self, args):
-        pass  # TODO: Implement M201 command
+        # T picks the extruder the E limit is for; there is only one set of limits here
+        self.set_axes('M201', self.max_acceleration, args, ignored='T')
 
     # M203: Set maximum feedrate
     def M203(self, args):
-        pass  # TODO: Implement M203 command
+        self.set_axes('M203', self.max_feedrate, args, ignored='T')
 
     # M204: Set default acceleration
     def M204(self, args):
-        pass  # TODO: Implement M204 command
+        for letter, value in args:
+            if value is None:
+                self.unknown_argument('M204', letter, value)
+            elif letter == 'P':
+                self.acceleration = value
+            elif letter == 'R':
+                self.retract_acceleration = value
+            elif letter == 'T':
+                self.travel_acceleration = value
+            elif letter == 'S':
+                # Legacy: printing and travel moves alike
+                self.acceleration = self.travel_acceleration = value
+            else:
+                self.unknown_argument('M204', letter, value)
 
-    # M205: Set advanced settings
+    # M205: Set advanced settings. Only the jerk limits are kept; minimum feedrates (S, T),
+    # minimum segment time (B) and junction deviation (J) don't change the estimate much.
     def M205(self, args):
-        pass  # TODO: Implement M205 command
+        self.set_axes('M205', self.jerk, args, ignored='STBJ')
 
     # M217: Set filament diameter
     def M217(self, args):
@@ -386,56 +765,103 @@ class PrinterState:
 
     # T: Select tool
     def P(self, args):
-        assert int(args[0][1:]) == 0 or int(args[0][1:]) == self.selected_tool or self.selected_tool == None , "Tool change must be to the same tool"
+        assert int(args[0][1]) == 0 or int(args[0][1]) == self.selected_tool or self.selected_tool == None , "Tool change must be to the same tool"
         self.selected_tool = None
-        for arg in args[1:]:
-            if arg.startswith('F'):
+        for letter, value in args[1:]:
+            if letter == 'F':
                 pass
-            elif arg.startswith('S1'):
+            elif letter == 'S' and value == 1:
                 # S1: Don't move the tool in XY after change
                 # TODO: Understand behaviour
                 pass
-            elif arg.startswith('M'):
+            elif letter == 'M':
                 # M0/1: Use tool mapping or not (default is yes)
                 pass
-            elif arg.startswith('L'):
+            elif letter == 'L':
                 # Lx: Z Lift settings 0 =- no lift, 1 = lift by max MBL diff, 2 = full lift(default)
                 pass
-            elif arg.startswith('D'):
+            elif letter == 'D':
                 # Dx 0 = do not return in Z after lift, 1 = normal return
                 pass
             else:
-                print(f"T Argument {arg} not recognized")
+                self.unknown_argument(args[0][0], letter, value)
 
     # T: Select tool
     def T(self, args):
-        self.selected_tool = int(args[0][1:])
-        for arg in args[1:]:
-            if arg.startswith('F'):
+        self.selected_tool = int(args[0][1])
+        for letter, value in args[1:]:
+            if letter == 'F':
                 pass
-            elif arg.startswith('S1'):
+            elif letter == 'S' and value == 1:
                 # S1: Don't move the tool in XY after change
                 # TODO: Understand behaviour
                 pass
-            elif arg.startswith('M'):
+            elif letter == 'M':
                 # M0/1: Use tool mapping or not (default is yes)
                 pass
-            elif arg.startswith('L'):
+            elif letter == 'L':
                 # Lx: Z Lift settings 0 =- no lift, 1 = lift by max MBL diff, 2 = full lift(default)
                 pass
-            elif arg.startswith('D'):
+            elif letter == 'D':
                 # Dx 0 = do not return in Z after lift, 1 = normal return
                 pass
             else:
-                print(f"T Argument {arg} not recognized")
+                self.unknown_argument(args[0][0], letter, value)
 
     
         
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            # stats is where the state reports to, not part of it
+            return ({key: value for key, value in self.__dict__.items() if key != 'stats'} ==
+                    {key: value for key, value in other.__dict__.items() if key != 'stats'})
         else:
             return False
-        
-    
\ No newline at end of file
+
+
+PrinterState.commands.update({
+    'G0': PrinterState.G1,
+    'G1': PrinterState.G1,
+    'G2': PrinterState.G2,
+    'G3': PrinterState.G2,
+    'G4': PrinterState.G4,
+    'G20': PrinterState.G20,
+    'G21': PrinterState.G21,
+    'G28': PrinterState.G28,
+    'G29': PrinterState.G29,
+    'G90': PrinterState.G90,
+    'G91': PrinterState.G91,
+    'G92': PrinterState.G92,
+    'M17': PrinterState.M17,
+    'M73': PrinterState.M73,
+    'M77': PrinterState.M77,
+    'M83': PrinterState.M83,
+    'M84': PrinterState.M84,
+    'M104': PrinterState.M104,
+    'M104.1': PrinterState.M104,
+    'M106': PrinterState.M106,
+    'M107': PrinterState.M107,
+    'M109': PrinterState.M109,
+    'M115': PrinterState.M115,
+    'M140': PrinterState.M140,
+    'M142': PrinterState.M142,
+    'M190': PrinterState.M190,
+    'M201': PrinterState.M201,
+    'M203': PrinterState.M203,
+    'M204': PrinterState.M204,
+    'M205': PrinterState.M205,
+    'M217': PrinterState.M217,
+    'M220': PrinterState.M220,
+    'M221': PrinterState.M221,
+    'M302': PrinterState.M302,
+    'M486': PrinterState.M486,
+    'M555': PrinterState.M555,
+    'M862.1': PrinterState.M862_1,
+    'M862.3': PrinterState.M862_3,
+    'M900': PrinterState.M900,
+})
+PrinterState.prefix_commands.update({
+    'P': PrinterState.P,
+    'T': PrinterState.T,
+})
@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+import numpy as np
+
+# first_line and last_line are inclusive line numbers, z is the ;Z: height of the layer
+Layer = namedtuple('Layer', ['number', 'first_line', 'last_line', 'z', 'height'])
+
+
+class LayerIndex:
+    """Where each layer starts and ends, built from the layer and ;Z: state columns.
+
+    The layer counter only ever increments, so layer numbers are consecutive and
+    layer(n) is a plain array lookup. layer_at_z bisects the layer heights, which
+    assumes Z does not go down between layers.
+    """
+
+    def __init__(self, layer_column, z_column):
+        count = len(layer_column)
+        starts = np.flatnonzero(np.diff(layer_column)) + 1
+        self.first_line = np.concatenate(([0], starts)) if count else np.zeros(0, dtype=np.int64)
+        self.last_line = np.append(starts - 1, count - 1) if count else np.zeros(0, dtype=np.int64)
+        self.numbers = np.asarray(layer_column)[self.first_line]
+        # ;Z: follows ;LAYER_CHANGE, so the value in effect at the end of a layer is that layer's Z
+        self.z = np.asarray(z_column)[self.last_line]
+        self.height = np.diff(self.z, prepend=0)
+
+    # Rebuild an index from its saved arrays, e.g. from a ParseCache
+    @classmethod
+    def from_arrays(cls, first_line, last_line, numbers, z, height):
+        index = cls.__new__(cls)
+        index.first_line, index.last_line, index.numbers, index.z, index.height = first_line, last_line, numbers, z, height
+        return index
+
+    def __len__(self):
+        return len(self.first_line)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i):
+        return Layer(int(self.numbers[i]), int(self.first_line[i]), int(self.last_line[i]),
+                     float(self.z[i]), float(self.height[i]))
+
+    def layer(self, number):
+        i = number - self.numbers[0] if len(self) else -1
+        if not 0 <= i < len(self):
+            raise IndexError(f"Layer {number} not in file")
+        return self[i]
+
+    # The layer printing at height z, i.e. the first layer whose Z is at or above z
+    def layer_at_z(self, z):
+        i = np.searchsorted(self.z, z, side='left')
+        if i == len(self):
+            return None
+        return self[i]
+
+    # Layer number for each line number, vectorized
+    def layer_of_lines(self, lines):
+        return self.numbers[np.searchsorted(self.first_line, lines, side='right') - 1]
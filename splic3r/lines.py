@@ -0,0 +1,119 @@
+import mmap
+
+import numpy as np
+
+NEWLINE = ord('\n')
+# Line offsets are stored in 4 bytes each for buffers up to this size, rather than 8
+SMALL_OFFSETS = 1 << 32
+
+
+# Offsets of the start of every line in a bytes-like buffer, plus one past the end of the last line.
+# The newline scan runs in chunks so the temporary mask stays small for large files.
+def line_starts(buffer, chunk_size=1 << 26):
+    view = np.frombuffer(buffer, dtype=np.uint8)
+    parts = [np.zeros(1, dtype=np.int64)]
+    for offset in range(0, len(view), chunk_size):
+        parts.append(np.flatnonzero(view[offset:offset + chunk_size] == NEWLINE).astype(np.int64) + offset + 1)
+    starts = np.concatenate(parts)
+    if len(view) and view[-1] != NEWLINE:
+        # Treat the last line as if it ended in a newline
+        starts = np.append(starts, len(view) + 1)
+    return starts.astype(np.uint32) if len(view) + 1 < SMALL_OFFSETS else starts
+
+
+class LineStore:
+    """Lines of a text file kept as one bytes buffer plus an array of line offsets.
+
+    Files are memory-mapped rather than read, and a line is only decoded when it
+    is asked for. Iterating decodes large runs of lines at a time.
+    """
+
+    def __init__(self, buffer, starts=None, encoding='utf-8'):
+        self.buffer = buffer
+        self._starts = starts
+        self.encoding = encoding
+        self.path = None
+        self._text = None
+
+    @classmethod
+    def from_text(cls, text, encoding='utf-8'):
+        store = cls(text.encode(encoding), encoding=encoding)
+        store._text = text
+        return store
+
+    @classmethod
+    def from_file(cls, file_path, encoding='utf-8'):
+        with open(file_path, 'rb') as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                buffer = b''
+        store = cls(buffer, encoding=encoding)
+        store.path = file_path
+        return store
+
+    # Line offsets are found on first use, so a cached copy can be dropped in first (see cache.ParseCache)
+    @property
+    def starts(self):
+        if self._starts is None:
+            self._starts = line_starts(self.buffer)
+        return self._starts
+
+    @starts.setter
+    def starts(self, starts):
+        self._starts = starts
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        line = self.buffer[self.starts[index]:self.starts[index + 1] - 1].decode(self.encoding)
+        return line[:-1] if line.endswith('\r') else line
+
+    def __iter__(self):
+        return self.iter_lines()
+
+    def iter_lines(self, first=0, last=None, chunk_lines=1 << 16):
+        last = len(self) if last is None else last
+        for start in range(first, last, chunk_lines):
+            stop = min(start + chunk_lines, last)
+            text = self.buffer[self.starts[start]:self.starts[stop] - 1].decode(self.encoding)
+            lines = text.split('\n')
+            if '\r' in text:
+                lines = [line[:-1] if line.endswith('\r') else line for line in lines]
+            yield from lines
+
+    # Byte range of lines [first, last), including the last newline
+    def byte_range(self, first, last):
+        return min(int(self.starts[first]), len(self.buffer)), min(int(self.starts[last]), len(self.buffer))
+
+    # Replace lines [first, last) with new_lines, in memory. The store no longer follows its file.
+    def replace_lines(self, first, last, new_lines):
+        start, stop = self.byte_range(first, last)
+        insert = ''.join(line + '\n' for line in new_lines).encode(self.encoding)
+        if insert and start == len(self.buffer) and start and self.buffer[start - 1:start] != b'\n':
+            # Appending after a last line with no newline
+            insert = b'\n' + insert
+        self.buffer = self.buffer[:start] + insert + self.buffer[stop:]
+        self._starts = None
+        self._text = None
+        self.path = None
+
+    # Unmap the file, if the store maps one. Its lines can't be read afterwards.
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    # The whole file as a string
+    def text(self):
+        if self._text is None:
+            return self.buffer[:].decode(self.encoding)
+        return self._text
+
+    def nbytes(self):
+        return len(self.buffer) + self.starts.nbytes
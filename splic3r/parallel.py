@@ -0,0 +1,169 @@
+import copy
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .columns import StateColumns
+from .gcode import GCode, PrinterState
+from .lines import LineStore
+from .stats import ParseStats
+
+# Lines whose effect lasts until the next line of the same kind. The group that matched is the kind.
+STICKY_PATTERN = re.compile(
+    rb'^(?:(;LAYER_CHANGE)|(;Z:)|(;TYPE:)|(; CP TOOLCHANGE)|[ \t]*([TP])\d|[ \t]*(G9)[01](?![\d.]))', re.M)
+LAYER_CHANGE = 1
+
+# State that is not compared when checking two parses have caught up with each other.
+# Motion limits and dwell aren't stored in the columns, timing reads them from the lines themselves.
+UNCOMPARED = ('var_dict', 'origin_offset', 'extrude_offset', 'stats', 'max_acceleration', 'max_feedrate',
+              'acceleration', 'retract_acceleration', 'travel_acceleration', 'jerk', 'dwell')
+
+
+class ChunkState(PrinterState):
+    # The running G92 offsets depend on every G92 before the chunk, so each G92 records
+    # only its own change here and parse_parallel adds them up in file order afterwards.
+    def execute(self, word, args):
+        if word == 'G92':
+            self.origin_offset, self.extrude_offset = [0, 0, 0], 0
+        return super().execute(word, args)
+
+
+# Everything the parser tracks for a line, apart from UNCOMPARED
+def snapshot(state):
+    return {key: copy.copy(value) for key, value in vars(state).items() if key not in UNCOMPARED}
+
+
+def restore(snapshot):
+    state = ChunkState()
+    state.__dict__.update(copy.deepcopy(snapshot))
+    return state
+
+
+# Split lines [0, len(source)) into about `chunks` runs starting at ;LAYER_CHANGE lines,
+# and guess the state each run starts in from the last tool, G90/G91, ;TYPE:, ;Z: and
+# toolchange marker lines before it. Returns (first_line, last_line, state) for every run.
+def prescan(source, chunks):
+    offsets, kinds = [], []
+    for match in STICKY_PATTERN.finditer(source.buffer):
+        offsets.append(match.start())
+        kinds.append(match.lastindex)
+    lines = np.searchsorted(source.starts, np.array(offsets, dtype=np.int64), side='right') - 1
+    kinds = np.array(kinds, dtype=np.int8)
+
+    layer_lines = lines[kinds == LAYER_CHANGE]
+    targets = np.linspace(0, len(source), chunks + 1)[1:-1]
+    nearest = np.clip(np.searchsorted(layer_lines, targets), 0, max(len(layer_lines) - 1, 0))
+    splits = np.unique(layer_lines[nearest]) if len(layer_lines) else np.zeros(0, dtype=np.int64)
+    splits = splits[(splits > 0) & (splits < len(source))].tolist()
+    bounds = [0] + splits + [len(source)]
+
+    parser = GCode()
+    runs = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        state = ChunkState()
+        before = lines < first
+        state.layer = int(np.count_nonzero(before & (kinds == LAYER_CHANGE)))
+        latest = [np.flatnonzero(before & (kinds == kind))[-1:] for kind in range(2, STICKY_PATTERN.groups + 1)]
+        try:
+            for line in sorted(lines[np.concatenate(latest)].tolist()):
+                parser.parse_line(source[line], state)
+        except Exception:
+            # Only a guess: a bad one costs time, not correctness
+            pass
+        state.var_dict = {}
+        runs.append((first, last, state))
+    return runs
+
+
+def read_chunk(path, start, stop):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        return file.read(stop - start)
+
+
+# Worker: parse one run of lines from the given state, keeping a snapshot of the state
+# after every checkpoint_lines lines. chunk is the run's bytes, or (path, start, stop).
+# With timed set the worker also returns its own ParseStats.
+def parse_chunk(chunk, state, checkpoint_lines, timed=False):
+    if isinstance(chunk, tuple):
+        chunk = read_chunk(*chunk)
+    lines = LineStore(chunk)
+    parser = GCode()
+    parser.stats = ParseStats() if timed else None
+    columns = StateColumns()
+    snapshots = []
+    for first in range(0, len(lines), checkpoint_lines):
+        parser.parse_lines(lines.iter_lines(first, min(first + checkpoint_lines, len(lines))), state, columns)
+        snapshots.append(snapshot(state))
+    return columns.finalize(state.var_dict), snapshots, parser.stats
+
+
+# Parse source in worker processes, giving the same StateColumns as a serial parse.
+#
+# The file is cut at ;LAYER_CHANGE lines and each run is parsed from a guessed starting state
+# (see prescan). Runs are then joined in order. Where the guess was wrong, the start of the run
+# is parsed again here from the true state, until that catches up with a worker snapshot; from
+# there on the worker's rows are exact. Slicer output resets E with G92 E0 and sets X, Y and Z
+# within a few lines of a layer change, so only the first block of each run is parsed twice.
+# Files that never reset E fall back to what amounts to a serial parse.
+#
+# Command handlers registered at runtime only reach the workers with the 'fork' start method.
+# stats, if given, gets the sum of the workers' ParseStats; lines parsed twice are counted once.
+def parse_parallel(source, workers=None, chunks=None, checkpoint_lines=256, stats=None):
+    workers = workers or os.cpu_count()
+    runs = prescan(source, chunks or 4 * workers)
+    parser = GCode()
+    if len(runs) == 1:
+        # No layer changes to split at
+        parser.stats = stats
+        columns = StateColumns()
+        return columns.finalize(parser.parse_lines(source, PrinterState(), columns).var_dict)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for first, last, state in runs:
+            start, stop = source.byte_range(first, last)
+            chunk = (source.path, start, stop) if source.path is not None else bytes(source.buffer[start:stop])
+            futures.append(pool.submit(parse_chunk, chunk, state, checkpoint_lines, stats is not None))
+
+        parts = []
+        carry = restore(snapshot(runs[0][2]))
+        for (first, last, guess), future in zip(runs, futures):
+            try:
+                columns, snapshots, worker_stats = future.result()
+            except Exception:
+                # Usually an assert tripped by a bad guess; the serial parse below raises real errors
+                columns, snapshots, worker_stats = None, [], None
+            if worker_stats is not None:
+                stats.merge(worker_stats)
+            if columns is not None and snapshot(carry) == snapshot(guess):
+                parts.append(columns)
+                carry = restore(snapshots[-1])
+                continue
+
+            # Parse from the true state until it matches one of the worker's snapshots
+            fixed = StateColumns()
+            carry.var_dict = {}
+            # Lines a worker parsed are already counted, unless the worker failed
+            parser.stats = stats if columns is None else None
+            caught_up = None
+            for block, block_first in enumerate(range(first, last, checkpoint_lines)):
+                block_last = min(block_first + checkpoint_lines, last)
+                parser.parse_lines(source.iter_lines(block_first, block_last), carry, fixed)
+                if block < len(snapshots) and snapshot(carry) == snapshots[block]:
+                    caught_up = block_last - first
+                    break
+            carry.stats = None
+            parts.append(fixed.finalize({}))
+            if caught_up is None:
+                parts[-1].var_dict = carry.var_dict
+            else:
+                parts.append(columns.slice(caught_up, len(columns)))
+                carry = restore(snapshots[-1])
+
+    merged = StateColumns.concatenate(parts)
+    # Running G92 offsets, summed in file order just as PrinterState.G92 does
+    merged.offset_values = np.cumsum(np.vstack((np.zeros((1, 4)), merged.offset_values)), axis=0)[1:]
+    return merged
@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .columns import MOTION_ARC_CW
+from .spatial import expand_ranges
+
+# Runs of extruding moves as polylines: path k is points[offsets[k]:offsets[k + 1]], (N, 3) x, y, z
+# from the point its first move starts at. lines is the line of each path's first move, types its
+# move type code (see StateColumns.move_types) and bounds its (2, 3) box of min and max x, y, z.
+ExtrusionPaths = namedtuple('ExtrusionPaths', ['points', 'offsets', 'lines', 'types', 'bounds'])
+
+
+# The moves among lines first..last (inclusive), whether each is an arc, and whether it extrudes
+# in XY: E goes up and the head moves, or goes round a full circle that ends where it started
+def extruding_moves(columns, first, last):
+    c = columns
+    lines = np.arange(first, last + 1)
+    lines = lines[c.motion[lines] != 0]
+    previous = lines - 1
+    arc = c.motion[lines] >= MOTION_ARC_CW
+    extruding = c.e[lines] > c.e[previous]
+    extruding &= (c.x[lines] != c.x[previous]) | (c.y[lines] != c.y[previous]) | arc
+    return lines, arc, extruding
+
+
+# Extruding moves of lines first..last (inclusive, first > 0) joined into polylines. A path ends at
+# any move that doesn't extrude, such as a travel or a retract, and where the ;TYPE: changes.
+# arc_paths is an arcs.ArcPaths holding every arc of the range, whose points stand in for the arcs.
+# type_codes, if given, keeps only the moves of those move types.
+def extrusion_paths(columns, first, last, arc_paths, type_codes=None):
+    c = columns
+    lines, arc, extruding = extruding_moves(c, first, last)
+    types = c.move_type[lines]
+    if type_codes is not None:
+        extruding &= np.isin(types, list(type_codes))
+    # Every move that is kept starts a path, unless the move before it was kept with the same type
+    run_start = extruding.copy()
+    run_start[1:] &= ~extruding[:-1] | (types[1:] != types[:-1])
+    lines, arc, types, run_start = lines[extruding], arc[extruding], types[extruding], run_start[extruding]
+
+    # Points each move adds: its end, or for an arc every point of its polyline after the first
+    which = np.searchsorted(arc_paths.lines, lines[arc])
+    counts = np.ones(len(lines), dtype=np.int64)
+    counts[arc] = np.diff(arc_paths.offsets)[which] - 1
+    # Where each move's points go, leaving room for a start point before every path
+    position = np.cumsum(counts) - counts + np.cumsum(run_start)
+    points = np.empty((int(counts.sum() + run_start.sum()), 3))
+    ends = np.stack((c.x[lines], c.y[lines], c.z[lines]), axis=1)
+    points[position[~arc]] = ends[~arc]
+    points[expand_ranges(position[arc], counts[arc])] = arc_paths.points[expand_ranges(arc_paths.offsets[which] + 1, counts[arc])]
+    starts = lines[run_start] - 1
+    points[position[run_start] - 1] = np.stack((c.x[starts], c.y[starts], c.z[starts]), axis=1)
+
+    offsets = np.append(position[run_start] - 1, len(points))
+    return ExtrusionPaths(points, offsets, lines[run_start], types[run_start], path_bounds(points, offsets))
+
+
+# (P, 2, 3) min and max x, y, z of every path
+def path_bounds(points, offsets):
+    if len(offsets) < 2:
+        return np.zeros((0, 2, 3))
+    return np.stack((np.minimum.reduceat(points, offsets[:-1]), np.maximum.reduceat(points, offsets[:-1])), axis=1)
+
+
+# (2, 3) box around the paths picked by `which` (a mask or indices, all paths by default), NaN if none
+def total_bounds(paths, which=slice(None)):
+    bounds = paths.bounds[which]
+    if len(bounds) == 0:
+        return np.full((2, 3), np.nan)
+    return np.stack((bounds[:, 0].min(axis=0), bounds[:, 1].max(axis=0)))
+
+
+# Box around the paths of each move type, by type name
+def type_bounds(paths, move_types):
+    return {move_types[code]: total_bounds(paths, paths.types == code) for code in np.unique(paths.types).tolist()}
+
+
+# The paths as a list of (N, 3) arrays, views into points
+def split_paths(paths):
+    return np.split(paths.points, paths.offsets[1:-1]) if len(paths.lines) else []
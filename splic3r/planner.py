@@ -0,0 +1,137 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+INJECTION_DTYPE = [
+    ('hole', 'i8'),       # index into the hole array
+    ('layer', 'i4'),      # last open layer: inject after it, before the layer that closes the hole
+    ('line', 'i8'),       # last line of that layer
+    ('tool', 'i2'),       # tool active after that line, to go back to after injecting; -1 if none yet
+    ('z', 'f8'),          # top of the open column, or of the layer batch_injections moved it to
+    ('depth', 'f8'),      # height of the open column
+    ('volume', 'f8'),     # mm^3 of conductive filament needed to fill it
+]
+
+
+# Holes as an (N, 3) array of x, y, diameter, from a DrillFile.hole_array() or anything array-like
+def hole_columns(holes):
+    holes = np.asarray(holes)
+    if holes.dtype.names:
+        return np.stack((holes['x'], holes['y'], holes['diameter']), axis=1).astype(np.float64)
+    return holes.astype(np.float64).reshape(-1, 3)
+
+
+# (holes x layers) boolean matrix: True where some extrusion on that layer comes within
+# radius + clearance of the hole centre. layers are the LayerIndex rows to check.
+def coverage(gcode, holes, offset=(0, 0), clearance=0.0, layers=None):
+    holes = hole_columns(holes)
+    if layers is None:
+        layers = np.arange(len(gcode.layers))
+    coverage = np.zeros((len(holes), len(layers)), dtype=bool)
+    if len(holes) == 0:
+        return coverage
+    points = holes[:, :2] + offset
+    radius = holes[:, 2] / 2 + clearance
+    # Cells as wide as the largest hole, so a query looks in at most 2x2 of them, rounded up to
+    # half a millimetre so hole sets of about the same size share grids
+    cell_size = max(np.ceil(4 * radius.max()) / 2, 0.5)
+    # Every hole against one layer's grid at a time, so a query only sees that layer's segments
+    # and no more than one layer's candidates are held at once. The grids are kept on the GCode,
+    # so planning more hole sets against the same print doesn't build them again.
+    for column, number in enumerate(gcode.layers.numbers[layers].tolist()):
+        grid = gcode.segment_index(number, cell_size)
+        if len(grid):
+            hole, _ = grid.query_radius(points, radius, unique=False)
+            coverage[hole, column] = True
+    return coverage
+
+
+# Injection schedule for every hole at once.
+# A hole needs filling wherever a run of open layers is closed off by a covered layer above it:
+# the conductive filament goes in after the last open layer, before the roof is printed.
+# Runs shorter than min_layers (e.g. gaps in sparse infill) are ignored, as are runs still open at the top.
+def plan_injections(gcode, holes, offset=(0, 0), clearance=0.0, min_layers=1):
+    holes = hole_columns(holes)
+    # Skip the preamble before the first ;LAYER_CHANGE
+    layers = np.flatnonzero(gcode.layers.numbers > 0)
+    covered = coverage(gcode, holes, offset, clearance, layers)
+    if covered.size == 0:
+        return np.zeros(0, dtype=INJECTION_DTYPE)
+    is_open = ~covered
+    index = np.arange(len(layers))
+
+    # Open runs end where the next layer is covered
+    ends = np.zeros_like(is_open)
+    ends[:, :-1] = is_open[:, :-1] & covered[:, 1:]
+    starts = is_open.copy()
+    starts[:, 1:] &= ~is_open[:, :-1]
+    run_start = np.maximum.accumulate(np.where(starts, index, 0), axis=1)
+
+    hole, end = np.nonzero(ends)
+    start = run_start[hole, end]
+    keep = end - start + 1 >= min_layers
+    hole, start, end = hole[keep], start[keep], end[keep]
+
+    z = gcode.layers.z[layers]
+    top = z[end]
+    bottom = np.where(start > 0, z[np.maximum(start - 1, 0)], 0.0)
+    schedule = np.zeros(len(hole), dtype=INJECTION_DTYPE)
+    schedule['hole'] = hole
+    schedule['layer'] = gcode.layers.numbers[layers[end]]
+    schedule['line'] = gcode.layers.last_line[layers[end]]
+    schedule['tool'] = gcode.columns.tool[schedule['line']]
+    schedule['z'] = top
+    schedule['depth'] = top - bottom
+    schedule['volume'] = np.pi * (holes[hole, 2] / 2) ** 2 * schedule['depth']
+    return schedule[np.lexsort((schedule['hole'], schedule['layer']))]
+
+
+# How a batched schedule compares with one swap per injection. A swap is a toolchange to
+# the conductive tool and one back; time_saved is the swaps saved times swap_time seconds.
+SwapReport = namedtuple('SwapReport', ['injections', 'toolchanges', 'naive_toolchanges', 'time_saved'])
+
+
+# Move injections onto as few swap layers as possible. An injection can go in after any layer
+# of its open column whose top is at most max_overfill below the top of the column: the filament
+# then stands proud of the print until the open layers around it catch up. With max_overfill=0
+# only injections already due on the same layer share a swap.
+# It can't wait past its own layer, which the next layer roofs over, so choosing the swap layers
+# is an interval point cover: the lowest deadline not yet met is a swap layer, and that swap
+# takes every injection whose window reaches down to it.
+def batch_injections(gcode, schedule, max_overfill=0.0, tolerance=1e-6):
+    batched = schedule.copy()
+    if len(schedule) == 0:
+        return batched
+    layers = np.flatnonzero(gcode.layers.numbers > 0)
+    z = gcode.layers.z[layers]
+    latest = np.searchsorted(gcode.layers.numbers[layers], schedule['layer'])
+    bottom = schedule['z'] - schedule['depth']
+    earliest = np.maximum(np.searchsorted(z, schedule['z'] - max_overfill - tolerance),
+                          np.searchsorted(z, bottom + tolerance))
+    earliest = np.minimum(earliest, latest)
+
+    chosen = np.empty(len(schedule), dtype=np.int64)
+    remaining = np.argsort(latest, kind='stable')
+    while len(remaining):
+        swap = latest[remaining[0]]
+        taken = earliest[remaining] <= swap
+        chosen[remaining[taken]] = swap
+        remaining = remaining[~taken]
+    batched['layer'] = gcode.layers.numbers[layers[chosen]]
+    batched['line'] = gcode.layers.last_line[layers[chosen]]
+    batched['tool'] = gcode.columns.tool[batched['line']]
+    batched['z'] = z[chosen]
+    return batched[np.lexsort((batched['hole'], batched['layer']))]
+
+
+# Toolchanges a schedule needs, against one swap per injection, e.g. with swap_time from
+# timing.swap_time
+def swap_report(schedule, swap_time=0.0):
+    swaps = len(np.unique(schedule['line']))
+    return SwapReport(len(schedule), 2 * swaps, 2 * len(schedule), (len(schedule) - swaps) * swap_time)
+
+
+# Length of filament of the given diameter holding volume mm^3
+def filament_length(volume, diameter=1.75):
+    return np.asarray(volume) / (np.pi * (diameter / 2) ** 2)
@@ -0,0 +1,179 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from .planner import hole_columns
+from .spatial import SegmentGrid
+
+# Rigid transform taking drill coordinates to print coordinates, p' = R(angle) p + translation,
+# with angle in radians. pairs are the (hole, opening) index pairs matched by the last ICP step,
+# residual their RMS distance in mm and matched their number.
+Registration = namedtuple('Registration', ['angle', 'translation', 'residual', 'matched', 'pairs'])
+
+
+def rotation(angle):
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[c, -s], [s, c]])
+
+
+def transform_points(points, angle, translation):
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2) @ rotation(angle).T + translation
+
+
+# Holes (see planner.hole_columns) moved into print coordinates by a Registration, for
+# plan_injections, injection_blocks or Splice.set_holes with no further offset
+def transform_holes(holes, registration):
+    holes = hole_columns(holes).copy()
+    holes[:, :2] = transform_points(holes[:, :2], registration.angle, registration.translation)
+    return holes
+
+
+# Openings in the print's layers as an (N, 3) array of x, y, diameter: closed extrusion loops no
+# wider than max_diameter whose ends meet within `closure` mm. Slicers print the perimeters of holes
+# clockwise and of outer contours counter-clockwise, so only clockwise loops count unless
+# clockwise is False. The same opening on several layers is merged on a grid of `merge` mm.
+# layers are the layer numbers to look in, all by default.
+def print_openings(gcode, layers=None, max_diameter=6.0, closure=0.3, clockwise=True, merge=0.2):
+    paths = gcode.extrusion_paths()
+    if len(paths.lines) == 0:
+        return np.zeros((0, 3))
+    first, last = paths.offsets[:-1], paths.offsets[1:] - 1
+    points = paths.points[:, :2]
+    # Shoelace area and centroid of every path at once, closing each path back to its start
+    following = np.arange(1, len(points) + 1)
+    following[last] = first
+    x0, y0 = points.T
+    x1, y1 = points[following].T
+    cross = x0 * y1 - x1 * y0
+    area = np.add.reduceat(cross, first) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cx = np.add.reduceat((x0 + x1) * cross, first) / (6 * area)
+        cy = np.add.reduceat((y0 + y1) * cross, first) / (6 * area)
+    size = (paths.bounds[:, 1, :2] - paths.bounds[:, 0, :2]).max(axis=1)
+    keep = (np.hypot(*(points[first] - points[last]).T) <= closure) & (size <= max_diameter) & (area != 0)
+    keep &= (area < 0) if clockwise else True
+    if layers is not None:
+        keep &= np.isin(gcode.layers.layer_of_lines(paths.lines), list(layers))
+    openings = np.stack((cx[keep], cy[keep], 2 * np.sqrt(np.abs(area[keep]) / np.pi)), axis=1)
+    if len(openings) == 0:
+        return openings
+    # One opening per grid cell, averaged over the layers it is on
+    _, group = np.unique(np.round(openings[:, :2] / merge).astype(np.int64), axis=0, return_inverse=True)
+    group = group.reshape(-1)
+    counts = np.bincount(group)
+    return np.stack([np.bincount(group, weights=column) / counts for column in openings.T], axis=1)
+
+
+# Points (N, 2) counted into a (shape) grid of `cell` mm cells from origin
+def rasterize(points, origin, cell, shape):
+    index = np.floor((points - origin) / cell).astype(np.int64)
+    index = np.clip(index, 0, np.array(shape) - 1)
+    return np.bincount(index[:, 0] * shape[1] + index[:, 1], minlength=shape[0] * shape[1]).reshape(shape).astype(np.float64)
+
+
+# Best translations of source (N, 2) onto target (M, 2) for each angle, by FFT cross-correlation
+# of the two patterns rasterized into `cell` mm cells and blurred by a cell. Source is turned about
+# its centroid. Returns (angles, translations, scores), each translation taking the source turned by
+# its angle about the origin onto the target.
+def coarse_alignment(source, target, cell, angles):
+    centre = source.mean(axis=0)
+    extent = np.ptp(source - centre, axis=0).max() * np.ones(2) * math.sqrt(2) + np.ptp(target, axis=0)
+    # Big enough for any shift between the two not to wrap round
+    shape = tuple(int(n) for n in np.ceil(extent / cell / 2) * 2 + 8)
+    target_origin = target.min(axis=0)
+    spectrum = np.fft.rfft2(rasterize(target, target_origin, cell, shape))
+    # Blurring both patterns by a Gaussian of one cell lets near misses score, and costs one product here
+    fx = np.fft.fftfreq(shape[0])[:, None]
+    fy = np.fft.rfftfreq(shape[1])[None, :]
+    spectrum *= np.exp(-4 * np.pi ** 2 * (fx ** 2 + fy ** 2))
+    translations, scores = np.empty((len(angles), 2)), np.empty(len(angles))
+    for k, angle in enumerate(angles):
+        turned = (source - centre) @ rotation(angle).T
+        origin = turned.min(axis=0)
+        correlation = np.fft.irfft2(np.conj(np.fft.rfft2(rasterize(turned, origin, cell, shape))) * spectrum, s=shape)
+        peak = np.unravel_index(np.argmax(correlation), shape)
+        # Shifts past the middle wrap round to negative ones
+        shift = np.where(np.array(peak) > np.array(shape) // 2, np.array(peak) - shape, peak)
+        # Cell centres, so the error is at most half a cell either way
+        translations[k] = shift * cell + target_origin - origin - rotation(angle) @ centre
+        scores[k] = correlation[peak]
+    return np.asarray(angles, dtype=np.float64), translations, scores
+
+
+# Rotation and translation best taking points a onto points b in the least squares sense (Kabsch)
+def rigid_fit(a, b):
+    a_mean, b_mean = a.mean(axis=0), b.mean(axis=0)
+    h = (a - a_mean).T @ (b - b_mean)
+    angle = math.atan2(h[0, 1] - h[1, 0], h[0, 0] + h[1, 1])
+    return angle, b_mean - rotation(angle) @ a_mean
+
+
+# Iterative closest point from a first guess: each source point is paired with the nearest target
+# point within a radius, and the transform refitted to the pairs, until it stops changing. The
+# radius starts at max_distance and closes in to three robust standard deviations (from the median)
+# of the last pairs' distances, but no less than min_distance, so points with no partner stop
+# pulling on the fit.
+# Returns a Registration.
+def icp(source, target, angle, translation, max_distance, min_distance=None, iterations=50, tolerance=1e-6):
+    min_distance = max_distance / 12 if min_distance is None else min_distance
+    grid = SegmentGrid(np.hstack((target, target)), cell_size=min_distance)
+    translation = np.asarray(translation, dtype=np.float64)
+    radius = max_distance
+    for _ in range(iterations):
+        distance, nearest = grid.nearest(transform_points(source, angle, translation), radius)
+        paired = np.flatnonzero(nearest >= 0)
+        if len(paired) < 2:
+            break
+        new_angle, new_translation = rigid_fit(source[paired], target[nearest[paired]])
+        change = abs(new_angle - angle) + np.abs(new_translation - translation).max()
+        angle, translation = new_angle, new_translation
+        new_radius = min(max(3 * 1.4826 * np.median(distance[paired]), min_distance), max_distance)
+        if change < tolerance and new_radius >= radius:
+            break
+        radius = new_radius
+    distance, nearest = grid.nearest(transform_points(source, angle, translation), radius)
+    paired = np.flatnonzero(nearest >= 0)
+    residual = float(np.sqrt(np.mean(distance[paired] ** 2))) if len(paired) else math.inf
+    return Registration(angle, translation, residual, len(paired), np.stack((paired, nearest[paired]), axis=1))
+
+
+# Where the drill holes are in the print: the rotation and translation taking holes (see
+# planner.hole_columns) onto openings (from print_openings, or any (N, 2+) points).
+#
+# Every angle_step degrees a coarse FFT cross-correlation finds the best translation, to within
+# a cell of `cell` mm (1/128 of the larger pattern by default), and the `candidates` best angles
+# are searched again an eighth of a step apart. A few ICP steps refine each of those, pairing
+# points up to three cells apart, and ICP carries on from the one matching most points (then with
+# the smaller residual) until it settles.
+#
+# Raises ValueError if the residual is over max_residual mm (by default one cell, no better than the
+# coarse pass) or fewer than min_matched of the holes found an opening, so a bad fit is caught
+# before it is printed. Pass max_residual=math.inf and min_matched=0 to get whatever fits best.
+def register(holes, openings, angle_step=2.0, cell=None, candidates=3, max_residual=None, min_matched=0.5):
+    source = hole_columns(holes)[:, :2]
+    target = np.asarray(openings, dtype=np.float64)[:, :2]
+    if len(source) < 2 or len(target) < 2:
+        raise ValueError("Registration needs at least two holes and two openings")
+    if cell is None:
+        cell = max(np.ptp(source, axis=0).max(), np.ptp(target, axis=0).max()) / 128
+    if max_residual is None:
+        max_residual = cell
+    angles, translations, scores = coarse_alignment(source, target, cell, np.radians(np.arange(0, 360, angle_step)))
+    fits = []
+    for k in np.argsort(-scores, kind='stable')[:candidates]:
+        finer = angles[k] + np.radians(np.linspace(-angle_step / 2, angle_step / 2, 9))
+        fine_angles, fine_translations, fine_scores = coarse_alignment(source, target, cell, finer)
+        best = np.argmax(fine_scores)
+        # A few ICP steps tell the candidates apart; only the best is followed through
+        fits.append(icp(source, target, fine_angles[best], fine_translations[best], 3 * cell, iterations=5))
+    best = min(fits, key=lambda fit: (-fit.matched, fit.residual))
+    best = icp(source, target, best.angle, best.translation, 3 * cell)
+    best = best._replace(angle=math.remainder(best.angle, 2 * math.pi))
+    if best.matched < min_matched * len(source):
+        raise ValueError(f"Only {best.matched} of {len(source)} holes matched an opening "
+                         f"(at least {min_matched:.0%} needed), residual {best.residual:.3f} mm")
+    if best.residual > max_residual:
+        raise ValueError(f"Registration residual {best.residual:.3f} mm is over {max_residual:.3f} mm "
+                         f"({best.matched} of {len(source)} holes matched)")
+    return best
@@ -0,0 +1,185 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# Smallest improvement, in mm, worth changing the route for
+EPSILON = 1e-9
+
+
+# Visit order for points (N, 2): greedily the closest point not visited yet, from start
+def nearest_neighbour(points, start):
+    points = np.asarray(points, dtype=np.float64)
+    left = points.copy()
+    index = np.arange(len(points))
+    order = np.empty(len(points), dtype=np.int64)
+    here = np.asarray(start, dtype=np.float64)
+    # Visited points are swapped to the end, so the points left are always left[:remaining]
+    for remaining in range(len(points), 0, -1):
+        delta = left[:remaining] - here
+        i = np.argmin(np.einsum('ij,ij->i', delta, delta))
+        order[len(points) - remaining] = index[i]
+        here = left[i].copy()
+        left[i], index[i] = left[remaining - 1], index[remaining - 1]
+    return order
+
+
+# The k nearest other points of every point, closest first, worked out block_rows rows at a time
+def nearest_points(points, k, block_rows=512):
+    k = min(k, len(points) - 1)
+    near = np.empty((len(points), k), dtype=np.int64)
+    squared = np.einsum('ij,ij->i', points, points)
+    for first in range(0, len(points), block_rows):
+        block = points[first:first + block_rows]
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, so the bulk of the work is one matrix product
+        distance = squared[first:first + block_rows, None] + squared[None, :] - 2 * block @ points.T
+        rows = np.arange(len(block))
+        distance[rows, first + rows] = np.inf
+        nearest = np.argpartition(distance, k - 1, axis=1)[:, :k]
+        by_distance = np.argsort(np.take_along_axis(distance, nearest, axis=1), axis=1)
+        near[first:first + len(block)] = np.take_along_axis(nearest, by_distance, axis=1)
+    return near
+
+
+class Tour:
+    """A path through points with both ends fixed, improved by 2-opt and Or-opt moves.
+
+    Nodes 0 and n + 1 are the start and end; path lists the nodes in visiting order and
+    position is its inverse. Moves only consider joining a node to one of its k nearest
+    neighbours, so each try is a few small vectorized operations however many points there
+    are, and nodes are only looked at again once a move has changed one of their edges.
+    """
+
+    def __init__(self, points, start, end, order, k=10):
+        self.xy = np.vstack((start, points, end))
+        # For distances between single nodes, which math.dist does faster than NumPy
+        self.points = self.xy.tolist()
+        self.path = np.concatenate(([0], np.asarray(order) + 1, [len(points) + 1]))
+        self.position = np.empty_like(self.path)
+        self.position[self.path] = np.arange(len(self.path))
+        self.near = nearest_points(self.xy, k)
+        self.last = len(self.path) - 1
+
+    def distance(self, a, b):
+        return np.hypot(*(self.xy[a] - self.xy[b]).T)
+
+    def length(self, a, b):
+        return math.dist(self.points[a], self.points[b])
+
+    # Rows lo < hi of the path's edges lo -> lo + 1 and hi -> hi + 1 replaced by lo -> hi and
+    # lo + 1 -> hi + 1, i.e. the stretch lo + 1..hi reversed: the shortening for each pair
+    def two_opt_gain(self, lo, hi):
+        path = self.path
+        valid = (lo >= 0) & (hi - lo >= 2) & (hi < self.last)
+        lo, hi = np.where(valid, lo, 0), np.where(valid, hi, 2)
+        a, b, c, d = path[lo], path[lo + 1], path[hi], path[np.minimum(hi + 1, self.last)]
+        gain = self.distance(a, b) + self.distance(c, d) - self.distance(a, c) - self.distance(b, d)
+        return np.where(valid, gain, -np.inf)
+
+    # Best 2-opt move giving node the edge to one of its neighbours. Returns the nodes whose
+    # edges changed, or None.
+    def two_opt(self, node):
+        here, there = self.position[node], self.position[self.near[node]]
+        lo, hi = np.minimum(here, there), np.maximum(here, there)
+        # The new edge either joins node and its neighbour, or their predecessors after them
+        lo = np.concatenate((lo, lo - 1))
+        hi = np.concatenate((hi, hi - 1))
+        gain = self.two_opt_gain(lo, hi)
+        best = int(np.argmax(gain))
+        if gain[best] <= EPSILON:
+            return None
+        lo, hi = lo[best], hi[best]
+        self.path[lo + 1:hi + 1] = self.path[lo + 1:hi + 1][::-1]
+        self.position[self.path[lo + 1:hi + 1]] = np.arange(lo + 1, hi + 1)
+        return self.path[[lo, lo + 1, hi, hi + 1]]
+
+    # Best Or-opt move of the run of 1 to `longest` nodes starting at node, either way round,
+    # to an edge next to a neighbour of either end of the run. Returns the changed nodes, or None.
+    def or_opt(self, node, longest=3):
+        path, i = self.path, int(self.position[node])
+        best = (EPSILON, None)
+        for length in range(1, longest + 1):
+            j = i + length - 1
+            if i < 1 or j > self.last - 1:
+                break
+            first, last, before, after = path[i - 1:j + 2][[1, -2, 0, -1]].tolist()
+            removed = self.length(before, first) + self.length(last, after) - self.length(before, after)
+            if removed <= best[0]:
+                continue
+            # Edges e -> e + 1 on either side of the neighbours, away from the run
+            near = self.position[np.concatenate((self.near[first], self.near[last]))]
+            edge = np.concatenate((near, near - 1))
+            edge = edge[(edge >= 0) & (edge < self.last) & ((edge < i - 1) | (edge > j))]
+            if len(edge) == 0:
+                continue
+            p, q = path[edge], path[edge + 1]
+            joined = self.distance(p, q)
+            forward = self.distance(p, first) + self.distance(last, q) - joined
+            backward = self.distance(p, last) + self.distance(first, q) - joined
+            added = np.minimum(forward, backward)
+            k = int(np.argmin(added))
+            if removed - added[k] > best[0]:
+                best = (removed - added[k], (i, j, int(edge[k]), backward[k] < forward[k]))
+        if best[1] is None:
+            return None
+        i, j, edge, reverse = best[1]
+        run = path[i:j + 1][::-1] if reverse else path[i:j + 1]
+        if edge < i:
+            moved = np.concatenate((run, path[edge + 1:i]))
+            start = edge + 1
+        else:
+            moved = np.concatenate((path[j + 1:edge + 1], run))
+            start = i
+        changed = path[[i - 1, i, j, j + 1, edge, edge + 1]]
+        path[start:start + len(moved)] = moved
+        self.position[moved] = np.arange(start, start + len(moved))
+        return changed
+
+    # Apply improving moves until none is left, or max_tries nodes have been looked at
+    def improve(self, max_tries):
+        queue = deque(self.path[1:-1].tolist())
+        queued = np.zeros(len(self.path), dtype=bool)
+        queued[self.path[1:-1]] = True
+        tries = 0
+        while queue and tries < max_tries:
+            node = queue.popleft()
+            queued[node] = False
+            tries += 1
+            changed = self.two_opt(node)
+            if changed is None:
+                changed = self.or_opt(node)
+            if changed is None:
+                continue
+            for other in changed.tolist():
+                if 0 < other < self.last and not queued[other]:
+                    queued[other] = True
+                    queue.append(other)
+            if not queued[node]:
+                queued[node] = True
+                queue.append(node)
+
+    def order(self):
+        return self.path[1:-1] - 1
+
+
+# Order to visit points (N, 2) in, starting at start and finishing at end (start if not given):
+# a nearest neighbour tour improved by 2-opt and Or-opt moves between each point and its
+# `neighbours` nearest others, until no move helps or every point has been tried max_passes
+# times on average. Returns indices into points.
+def route(points, start, end=None, neighbours=10, max_passes=20):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    start = np.asarray(start, dtype=np.float64)
+    end = start if end is None else np.asarray(end, dtype=np.float64)
+    order = nearest_neighbour(points, start)
+    if len(points) < 2:
+        return order
+    tour = Tour(points, start, end, order, neighbours)
+    tour.improve(max_passes * len(points))
+    return tour.order()
+
+
+# Length of the path from start through points in the given order to end (start if not given)
+def route_length(points, order, start, end=None):
+    end = start if end is None else end
+    path = np.vstack((start, np.asarray(points, dtype=np.float64).reshape(-1, 2)[order], end))
+    return float(np.hypot(*np.diff(path, axis=0).T).sum())
@@ -0,0 +1,159 @@
+import numpy as np
+
+
+# Squared distance from each point (px, py) to the segment (x0, y0)-(x1, y1), all arrays of the same shape
+def point_segment_distance_squared(px, py, x0, y0, x1, y1):
+    px, py, x0, y0, x1, y1 = (np.asarray(v, dtype=np.float64) for v in (px, py, x0, y0, x1, y1))
+    dx = x1 - x0
+    dy = y1 - y0
+    length_sq = dx * dx + dy * dy
+    # Zero length segments are points: t is 0 for them
+    t = np.clip(((px - x0) * dx + (py - y0) * dy) / np.where(length_sq > 0, length_sq, 1.0), 0, 1)
+    ex = px - (x0 + t * dx)
+    ey = py - (y0 + t * dy)
+    return ex * ex + ey * ey
+
+
+# Distance from each point (px, py) to the segment (x0, y0)-(x1, y1), all arrays of the same shape
+def point_segment_distance(px, py, x0, y0, x1, y1):
+    return np.sqrt(point_segment_distance_squared(px, py, x0, y0, x1, y1))
+
+
+# Concatenate arange(start, start + count) for every start/count pair
+def expand_ranges(starts, counts):
+    counts = np.asarray(counts, dtype=np.int64)
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, counts) + np.arange(total)
+
+
+class SegmentGrid:
+    """Uniform grid over 2D line segments for batched radius and nearest-segment queries.
+
+    Segments are an (N, 4) array of x0, y0, x1, y1. Each segment is listed once in
+    every cell it passes through, not in every cell of its bounding box, which keeps
+    diagonal infill lines from filling their whole box. Only segment indices are
+    stored per cell, so the grid grows with the number of segments and their length
+    in cells: pick cell_size near the query radius, not far below it.
+    """
+
+    def __init__(self, segments, cell_size=1.0):
+        self.segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        self.cell_size = cell_size
+        if len(self.segments):
+            self.origin = np.minimum(self.segments[:, :2].min(axis=0), self.segments[:, 2:].min(axis=0))
+            top = np.maximum(self.segments[:, :2].max(axis=0), self.segments[:, 2:].max(axis=0))
+        else:
+            self.origin = top = np.zeros(2)
+        self.shape = (np.floor((top - self.origin) / cell_size).astype(np.int64) + 1)
+
+        # The cells a segment passes through are those of its pieces no longer than a cell, each
+        # of which covers a 1x1 to 2x2 block. The pieces are only needed to find the cells.
+        lengths = np.hypot(self.segments[:, 2] - self.segments[:, 0], self.segments[:, 3] - self.segments[:, 1])
+        pieces = np.maximum(np.ceil(lengths / cell_size), 1).astype(np.int64)
+        parent = np.repeat(np.arange(len(self.segments)), pieces)
+        step = expand_ranges(np.zeros(len(pieces)), pieces) / pieces[parent]
+        start, delta = self.segments[parent, :2], self.segments[parent, 2:] - self.segments[parent, :2]
+        a = start + delta * step[:, None]
+        b = start + delta * (step + 1 / pieces[parent])[:, None]
+        low, high = self._cell(np.minimum(a, b)), self._cell(np.maximum(a, b))
+        del start, delta, a, b
+        entries = []
+        for ox in (0, 1):
+            for oy in (0, 1):
+                mask = (low[:, 0] + ox <= high[:, 0]) & (low[:, 1] + oy <= high[:, 1])
+                entries.append(self._key(low[mask, 0] + ox, low[mask, 1] + oy) * len(self.segments) + parent[mask])
+        # One entry per segment and cell, in cell order
+        entries = np.unique(np.concatenate(entries))
+        self.items = entries % max(len(self.segments), 1)
+        self.keys, self.starts, self.counts = np.unique(entries // max(len(self.segments), 1),
+                                                        return_index=True, return_counts=True)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def _cell(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _key(self, ix, iy):
+        return ix * self.shape[1] + iy
+
+    # Candidate (point, segment) pairs for every segment in a cell within radius of each point.
+    # A segment passing through several of the cells is listed once for each.
+    def _candidates(self, points, radius):
+        low = np.clip(self._cell(points - radius[:, None]), 0, self.shape - 1)
+        high = np.clip(self._cell(points + radius[:, None]), -1, self.shape - 1)
+        span = np.maximum(high - low + 1, 0)
+        cells_per_point = span[:, 0] * span[:, 1]
+        point = np.repeat(np.arange(len(points)), cells_per_point)
+        k = expand_ranges(np.zeros(len(points)), cells_per_point)
+        ix = low[point, 0] + k // np.maximum(span[point, 1], 1)
+        iy = low[point, 1] + k % np.maximum(span[point, 1], 1)
+        keys = self._key(ix, iy)
+        slot = np.clip(np.searchsorted(self.keys, keys), 0, max(len(self.keys) - 1, 0))
+        found = self.keys[slot] == keys if len(self.keys) else np.zeros(len(keys), dtype=bool)
+        point, slot = point[found], slot[found]
+        counts = self.counts[slot]
+        segment = self.items[expand_ranges(self.starts[slot], counts)]
+        return np.repeat(point, counts), segment
+
+    def _distances_squared(self, points, point, segment):
+        s = self.segments[segment]
+        return point_segment_distance_squared(points[point, 0], points[point, 1], s[:, 0], s[:, 1], s[:, 2], s[:, 3])
+
+    # (point index, segment index) pairs with the segment within radius of the point.
+    # radius can be a scalar or one value per point. With unique=False a pair can repeat,
+    # which is cheaper when only the points or segments hit matter.
+    def query_radius(self, points, radius, unique=True):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(points),))
+        point, segment = self._candidates(points, radius)
+        hit = self._distances_squared(points, point, segment) <= radius[point] ** 2
+        if not unique:
+            return point[hit], segment[hit]
+        pairs = np.unique(point[hit] * len(self.segments) + segment[hit])
+        return pairs // max(len(self.segments), 1), pairs % max(len(self.segments), 1)
+
+    # Number of segments within radius of each point
+    def count_within(self, points, radius):
+        point, _ = self.query_radius(points, radius)
+        return np.bincount(point, minlength=len(np.asarray(points).reshape(-1, 2)))
+
+    # Distance to and index of the nearest segment for each point (inf and -1 beyond max_distance)
+    def nearest(self, points, max_distance=np.inf):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        distance = np.full(len(points), np.inf)
+        segment = np.full(len(points), -1, dtype=np.int64)
+        if len(self.segments) == 0:
+            return distance, segment
+        extent = self.cell_size * max(self.shape)
+        pending = np.arange(len(points))
+        radius = np.full(len(points), self.cell_size)
+        while len(pending):
+            point, candidate = self._candidates(points[pending], radius[pending])
+            d = np.sqrt(self._distances_squared(points[pending], point, candidate))
+            # Candidates come grouped by point: take the closest of each group
+            group, starts = np.unique(point, return_index=True)
+            closest = np.zeros(len(points), dtype=np.float64)
+            closest[group] = np.minimum.reduceat(d, starts) if len(d) else []
+            is_closest = d == closest[point]
+            best_point, first = np.unique(point[is_closest], return_index=True)
+            best = np.flatnonzero(is_closest)[first]
+            target = pending[best_point]
+            distance[target] = d[best]
+            segment[target] = candidate[best]
+            # A hit is only certain to be the nearest if it lies inside the searched radius
+            done = np.zeros(len(points), dtype=bool)
+            done[target] = distance[target] <= radius[target]
+            # Points that have searched past max_distance or the whole grid are finished too
+            gone = radius[pending] >= max_distance
+            gone |= radius[pending] > extent + np.abs(points[pending] - self.origin).max(axis=1)
+            done[pending[gone]] = True
+            pending = pending[~done[pending]]
+            radius[pending] *= 2
+        too_far = distance > max_distance
+        distance[too_far] = np.inf
+        segment[too_far] = -1
+        return distance, segment
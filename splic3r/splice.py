@@ -1,97 +1,223 @@
-import matplotlib.pyplot as plt
-from matplotlib.widgets import Slider
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from .planner import hole_columns
+
+
+# Flat (N, 2) XY points and path offsets for a list of (N, 2+) paths: path k is
+# points[offsets[k]:offsets[k + 1]]. Paths of fewer than two points draw nothing and are dropped.
+def flatten_paths(paths):
+    paths = [np.asarray(path, dtype=np.float64) for path in paths]
+    paths = [path[:, :2] for path in paths if len(path) > 1]
+    if not paths:
+        return np.zeros((0, 2)), np.zeros(1, dtype=np.int64)
+    counts = [len(path) for path in paths]
+    return np.concatenate(paths), np.concatenate(([0], np.cumsum(counts)))
+
+
+# Paths thinned to about one point per `tolerance` mm along them, for drawing zoomed out where
+# a pixel is wider than most segments. Every path keeps its first and last points.
+# Returns (points, offsets) like flatten_paths.
+def decimate(points, offsets, tolerance):
+    if tolerance <= 0 or len(points) == 0:
+        return points, offsets
+    step = np.hypot(*np.diff(points, axis=0).T)
+    # Distance along the path each point is at, counted on from one path to the next
+    along = np.concatenate(([0], np.cumsum(step)))
+    bucket = np.floor(along / tolerance)
+    keep = np.diff(bucket, prepend=-1) != 0
+    keep[offsets[:-1]] = True
+    keep[offsets[1:] - 1] = True
+    counts = np.add.reduceat(keep, offsets[:-1])
+    return points[keep], np.concatenate(([0], np.cumsum(counts)))
 
 
 class Splice:
+    """Slice viewer for the extrusion paths of a print, one layer at a time.
+
+    Paths come either from a GCode (set_gcode), whose extrusion_paths are read a layer
+    at a time, or from lists of paths per layer (set_layers).
+
+    Each layer is drawn as a single LineCollection, built the first time the slider
+    reaches it and kept in a cache of the last cache_layers layers and zoom levels
+    shown. Zoomed out, paths are decimated to about one point per pixel, rounded to a
+    power of two so nearby zoom levels share a cached collection. Drill holes, moved
+    by hole_offset, are drawn over every layer.
+    """
+
+    # Layers (at one zoom level each) kept drawn and ready to show
+    cache_layers = 32
+    # Below this many mm per pixel the paths are drawn in full
+    min_tolerance = 0.05
+
     def __init__(self):
         self.layer_num = 1
-        self.last_plotted_layer = 1
-        self.holes = []
+        self.holes = np.zeros((0, 3))
         self.hole_offset = np.array([0, 0])
         self.layers = []
+        self.gcode = None
+        self.types = None
         self.min_path_coords = np.array([np.inf, np.inf, np.inf])
         self.max_path_coords = np.array([-np.inf, -np.inf, -np.inf])
-        self.layer_plots = []
+        self.layer_paths = {}
+        self.layer_plots = OrderedDict()
+        self.shown = None
+        self.hole_plot = None
+        self.slider = None
         self.fig = None
         self.ax = None
 
+    # layers is a list per layer of (N, 3) paths, each from the point its extrusion starts at
     def set_layers(self, layers):
+        self.gcode = None
         self.layers = layers
+        self.layer_paths = {}
+        self.clear_cache()
         self.calculate_path_lims()
-        
-    
+
+    # Show the printed layers of gcode (all but layer 0), keeping only the ;TYPE: names in types if given
+    def set_gcode(self, gcode, types=None):
+        self.gcode = gcode
+        self.types = None if types is None else tuple(types)
+        self.layers = [number for number in gcode.layers.numbers.tolist() if number != 0]
+        self.layer_paths = {}
+        self.clear_cache()
+        bounds = gcode.layer_bounds(self.types)[gcode.layers.numbers != 0]
+        self.min_path_coords = np.nanmin(bounds[:, 0], axis=0, initial=np.inf)
+        self.max_path_coords = np.nanmax(bounds[:, 1], axis=0, initial=-np.inf)
+        self.path_midpoint = (self.min_path_coords + self.max_path_coords) / 2
+
+    # Holes are (N, 3) x, y, diameter or a DrillFile.hole_array(), drawn moved by offset.
+    # For a board that is also turned, pass register.transform_holes(holes, registration) instead.
+    def set_holes(self, holes, offset=(0, 0)):
+        self.holes = hole_columns(holes)
+        self.hole_offset = np.asarray(offset, dtype=np.float64)
+        if self.ax is not None:
+            self.plot_holes()
+
     def calculate_path_lims(self):
+        self.min_path_coords = np.array([np.inf, np.inf, np.inf])
+        self.max_path_coords = np.array([-np.inf, -np.inf, -np.inf])
         for layer in self.layers:
-            for path in layer:
-                for point in path:
-                    self.min_path_coords = np.minimum(self.min_path_coords, point)
-                    self.max_path_coords = np.maximum(self.max_path_coords, point)
+            paths = [np.asarray(path, dtype=np.float64) for path in layer if len(path)]
+            if paths:
+                points = np.concatenate(paths)
+                self.min_path_coords = np.minimum(self.min_path_coords, points.min(axis=0))
+                self.max_path_coords = np.maximum(self.max_path_coords, points.max(axis=0))
         self.path_midpoint = (self.min_path_coords + self.max_path_coords) / 2
 
+    # Flat points and offsets of layer `number` (from 1), worked out once
+    def paths(self, number):
+        if number not in self.layer_paths:
+            if self.gcode is not None:
+                paths = self.gcode.extrusion_paths(self.layers[number - 1], self.types)
+                self.layer_paths[number] = (paths.points[:, :2], paths.offsets)
+            else:
+                self.layer_paths[number] = flatten_paths(self.layers[number - 1])
+        return self.layer_paths[number]
+
+    # Decimation tolerance for the current view: the width of a pixel, as a power of two
+    def tolerance(self):
+        if self.ax is None:
+            return 0.0
+        left, right = self.ax.get_xlim()
+        pixels = max(self.ax.get_window_extent().width, 1)
+        pixel = abs(right - left) / pixels
+        if pixel < self.min_tolerance:
+            return 0.0
+        return 2.0 ** math.ceil(math.log2(pixel))
+
+    # The LineCollection for layer `number` at the given tolerance, from the cache or built now
+    def layer_plot(self, number, tolerance=0.0):
+        from matplotlib.collections import LineCollection
+        key = (number, tolerance)
+        plot = self.layer_plots.get(key)
+        if plot is not None:
+            self.layer_plots.move_to_end(key)
+            return plot
+        points, offsets = decimate(*self.paths(number), tolerance)
+        plot = LineCollection(np.split(points, offsets[1:-1]) if len(points) else [],
+                              colors='blue', linewidths=0.5)
+        plot.set_visible(False)
+        if self.ax is not None:
+            self.ax.add_collection(plot, autolim=False)
+        self.layer_plots[key] = plot
+        while len(self.layer_plots) > self.cache_layers:
+            _, old = self.layer_plots.popitem(last=False)
+            if old is self.shown:
+                self.shown = None
+            if old.axes is not None:
+                old.remove()
+        return plot
+
+    def clear_cache(self):
+        for plot in self.layer_plots.values():
+            if plot.axes is not None:
+                plot.remove()
+        self.layer_plots = OrderedDict()
+        self.shown = None
+
+    def plot_holes(self):
+        from matplotlib.collections import EllipseCollection
+        if self.hole_plot is not None:
+            self.hole_plot.remove()
+            self.hole_plot = None
+        if len(self.holes) == 0:
+            return
+        self.hole_plot = EllipseCollection(
+            self.holes[:, 2], self.holes[:, 2], np.zeros(len(self.holes)), units='xy',
+            offsets=self.holes[:, :2] + self.hole_offset, offset_transform=self.ax.transData,
+            facecolors='none', edgecolors='red', linewidths=0.8, zorder=3)
+        self.ax.add_collection(self.hole_plot, autolim=False)
 
-    def plot(self):
+    # matplotlib is only imported here and in the drawing methods, so the module loads without it
+    def plot(self, show=True):
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Slider
+        self.clear_cache()
         self.fig, self.ax = plt.subplots(figsize=(10, 10))
         self.fig.subplots_adjust(left=0.25, bottom=0.25)
         self.ax.set_aspect('equal', adjustable='box')
-        plt.title('Slice Viewer')
-        plt.xlabel('X (mm)')
-        plt.ylabel('Y (mm)')
+        self.ax.set_title('Slice Viewer')
+        self.ax.set_xlabel('X (mm)')
+        self.ax.set_ylabel('Y (mm)')
 
         # Set the plot area to be +-5 of the min and max path coordinates
-        min_x = self.min_path_coords[0] - 5
-        max_x = self.max_path_coords[0] + 5
-        min_y = self.min_path_coords[1] - 5
-        max_y = self.max_path_coords[1] + 5
-        self.ax.set_xlim(min_x, max_x)
-        self.ax.set_ylim(min_y, max_y)
-
-        ## Pre-plot all the paths, just set them to be invisible
-        for layer in layers:
-            layer_plot = []
-            for path in layer:
-                if len(path) > 0:
-                    path = np.array(path)
-                    plot_lines = self.ax.plot(path[:,0], path[:,1], color='blue', linewidth=0.5, visible=False)
-                layer_plot.append(plot_lines)
-            self.layer_plots.append(layer_plot)
+        if np.isfinite(self.min_path_coords).all():
+            self.ax.set_xlim(self.min_path_coords[0] - 5, self.max_path_coords[0] + 5)
+            self.ax.set_ylim(self.min_path_coords[1] - 5, self.max_path_coords[1] + 5)
+        self.plot_holes()
 
         # Make a vertically oriented slider
         axlayer = self.fig.add_axes([0.1, 0.25, 0.0225, 0.63])
-        layer_slider = Slider(
+        self.slider = Slider(
             ax=axlayer,
             label="Layer",
             valmin=1,
-            valmax=len(self.layers),
+            valmax=max(len(self.layers), 1),
             valinit=self.layer_num,
             valstep=1,  # Set the step size to 1 for discrete integer intervals
             orientation="vertical",
         )
-
-        layer_slider.on_changed(self.update_plot_layer)
+        self.slider.on_changed(self.update_plot_layer)
+        # Zooming or panning redraws the layer at the detail the new view needs
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self.update_plot_layer(self.layer_num))
         self.update_plot_layer(self.layer_num)
-        plt.show()
+        if show:
+            plt.show()
 
     # The function to be called anytime a slider's value changes
     def update_plot_layer(self, val):
-        # last_layer_plot = self.layer_plots[self.last_plotted_layer-1]
-        # for line in last_layer_plot:
-        #     for l in line:
-        #         l.set_visible(False)
-        # layer_plot = self.layer_plots[val-1]
-        # for line in layer_plot:
-        #     for l in line:
-        #         l.set_visible(True)
-        # self.last_plotted_layer = val
-        # self.fig.canvas.draw_idle()
-        pass
-
-
-    
-    
-
-
-hole_offset = path_midpoint[:2] - hole_midpoint
-
-splice = Splice()
-splice.set_layers(layers)
-splice.plot()
\ No newline at end of file
+        self.layer_num = int(val)
+        if not 1 <= self.layer_num <= len(self.layers):
+            return
+        plot = self.layer_plot(self.layer_num, self.tolerance())
+        if plot is not self.shown:
+            if self.shown is not None:
+                self.shown.set_visible(False)
+            plot.set_visible(True)
+            self.shown = plot
+        if self.fig is not None:
+            self.fig.canvas.draw_idle()
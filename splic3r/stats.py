@@ -0,0 +1,74 @@
+from collections import Counter, defaultdict
+
+PHASES = ('read', 'tokenize', 'execute', 'copy')
+
+
+class ParseStats:
+    """Counters and timings collected while parsing, for GCode(..., stats=ParseStats()).
+
+    commands counts lines per command word and command_time sums the time spent in
+    their handlers. unknown_commands and unknown_arguments count what the parser
+    ignored: words with no handler, and (word, letter) arguments a handler doesn't
+    know or that have no value. phases holds the time spent reading lines, tokenizing,
+    executing commands and comments, and copying the state into the columns.
+
+    callback, if given, is called as callback(kind, word, argument) for every
+    'unknown_command' and 'unknown_argument', with argument the (letter, value) pair
+    or None.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.lines = 0
+        self.commands = Counter()
+        self.command_time = defaultdict(float)
+        self.unknown_commands = Counter()
+        self.unknown_arguments = Counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def unknown_command(self, word):
+        self.unknown_commands[word] += 1
+        if self.callback is not None:
+            self.callback('unknown_command', word, None)
+
+    def unknown_argument(self, word, letter, value):
+        self.unknown_arguments[word, letter] += 1
+        if self.callback is not None:
+            self.callback('unknown_argument', word, (letter, value))
+
+    # Add another run's numbers to these, e.g. from a parse worker
+    def merge(self, other):
+        self.lines += other.lines
+        self.commands.update(other.commands)
+        for word, seconds in other.command_time.items():
+            self.command_time[word] += seconds
+        self.unknown_commands.update(other.unknown_commands)
+        self.unknown_arguments.update(other.unknown_arguments)
+        for phase, seconds in other.phases.items():
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        return self
+
+    def as_dict(self):
+        return {
+            'lines': self.lines,
+            'phases': dict(self.phases),
+            'commands': {word: {'count': count, 'seconds': self.command_time[word]}
+                         for word, count in self.commands.most_common()},
+            'unknown_commands': dict(self.unknown_commands),
+            'unknown_arguments': {f'{word} {letter}': count for (word, letter), count in self.unknown_arguments.items()},
+        }
+
+    # Human readable summary, slowest commands first
+    def report(self, top=10):
+        total = sum(self.phases.values())
+        out = [f"{self.lines:,} lines in {total:.3f} s"]
+        out += [f"  {phase:10} {seconds:8.3f} s" for phase, seconds in self.phases.items()]
+        out.append("commands by handler time:")
+        for word, seconds in sorted(self.command_time.items(), key=lambda item: -item[1])[:top]:
+            out.append(f"  {word:10} {self.commands[word]:10,} {seconds:8.3f} s")
+        if self.unknown_commands:
+            out.append("unknown commands: " + ', '.join(f'{word} x{count}' for word, count in self.unknown_commands.most_common()))
+        if self.unknown_arguments:
+            out.append("unknown arguments: " + ', '.join(
+                f'{word} {letter} x{count}' for (word, letter), count in self.unknown_arguments.most_common()))
+        return '\n'.join(out)
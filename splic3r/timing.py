@@ -0,0 +1,181 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from .arcs import arc_geometry, arc_lengths
+from .columns import StateView
+from .gcode import GCode, PrinterState
+from .tokens import tokenize_line
+from .writer import format_number
+
+# Commands that change the motion limits or pause: M201, M203, M204, M205 and G4.
+# Each pattern starts with a literal, which re finds with a fast search instead of trying
+# every position; matches that aren't the command of their line are dropped afterwards.
+LIMIT_PATTERNS = (re.compile(rb'M20[1345](?![\d.])'), re.compile(rb'G4(?![\d.])'))
+
+LIMITS_DTYPE = [
+    ('max_acceleration', 'f8', 4),   # M201 X Y Z E, mm/s^2
+    ('max_feedrate', 'f8', 4),       # M203 X Y Z E, mm/s
+    ('acceleration', 'f8'),          # M204 P, moves that extrude
+    ('retract_acceleration', 'f8'),  # M204 R, moves of E alone
+    ('travel_acceleration', 'f8'),   # M204 T, moves that don't extrude
+    ('jerk', 'f8', 4),               # M205 X Y Z E, mm/s
+]
+
+# lines and layers are seconds spent on each line and in each row of the file's LayerIndex
+TimeEstimate = namedtuple('TimeEstimate', ['lines', 'layers', 'total'])
+
+
+# The most a move along unit (one row per move) can go before some axis reaches its limit
+def axis_limit(limit, unit):
+    unit = np.abs(unit)
+    speeds = np.full(unit.shape, np.inf)
+    np.divide(limit, unit, out=speeds, where=unit > 0)
+    return speeds.min(axis=1)
+
+
+def limits_row(state):
+    row = np.zeros(1, dtype=LIMITS_DTYPE)[0]
+    for name, *_ in LIMITS_DTYPE:
+        row[name] = getattr(state, name)
+    return row
+
+
+# Motion limits in effect from each line that sets them, and the G4 pauses.
+# Returns (limit_lines, limits, dwell_lines, dwells). limits has a leading row holding the
+# defaults, so limits[searchsorted(limit_lines, line, side='right')] is the row for a line.
+def limit_events(gcode):
+    source = gcode.source
+    offsets = sorted(match.start() for pattern in LIMIT_PATTERNS for match in pattern.finditer(source.buffer))
+    lines = np.searchsorted(source.starts, np.array(offsets, dtype=np.int64), side='right') - 1
+    state = PrinterState()
+    rows = [limits_row(state)]
+    limit_lines, dwell_lines, dwells = [], [], []
+    for line, offset in zip(lines.tolist(), offsets):
+        if source.buffer[source.starts[line]:offset].strip(b' \t'):
+            continue
+        command = tokenize_line(source[line].lstrip())
+        state.execute(*command)
+        if command[0] == 'G4':
+            dwell_lines.append(line)
+            dwells.append(state.dwell)
+        else:
+            limit_lines.append(line)
+            rows.append(limits_row(state))
+    return (np.array(limit_lines, dtype=np.int64), np.array(rows, dtype=LIMITS_DTYPE),
+            np.array(dwell_lines, dtype=np.int64), np.array(dwells, dtype=np.float64))
+
+
+# Seconds spent on every line: moves follow a trapezoidal speed profile, G4 waits its time.
+#
+# Each move runs at its F, capped by the per-axis M203 limits, and speeds up and slows down at
+# the M204 acceleration for its kind of move (capped by M201). Where two moves meet the speed
+# may be no higher than lets each axis's speed change by at most its M205 jerk, so the print
+# starts, ends and stops at each G4 at the speed an axis can jump to from rest.
+# The planner's backward and forward passes, entry^2 <= next entry^2 + 2 a L and back again,
+# are min-plus recurrences: with the 2 a L terms summed up they become running minimums,
+# so the whole file is planned with a few array operations and no Python loop.
+#
+# Arcs take the time of their full length, with the direction of their chord at the junctions.
+# Waits for heating (M109, M190) are not counted, so the total is a lower bound for a real print.
+def line_times(gcode, events=None):
+    limit_lines, limits, dwell_lines, dwells = limit_events(gcode) if events is None else events
+    c = gcode.columns
+    times = np.zeros(len(c))
+    lines = np.flatnonzero(c.motion)
+
+    # Move vectors from the state before each line; line 0 starts from the origin
+    delta = np.empty((len(lines), 4))
+    for axis, column in enumerate((c.x, c.y, c.z, c.e)):
+        delta[:, axis] = column[lines] - np.where(lines > 0, column[lines - 1], 0)
+    travel = np.sqrt(np.square(delta[:, :3]).sum(axis=1))
+    # Arcs are as long as the way round, not their chord
+    arcs = arc_geometry(c)
+    travel[np.searchsorted(lines, arcs.lines)] = arc_lengths(arcs)
+    # Moves of E alone are as long as the filament they move
+    length = np.where(travel > 0, travel, np.abs(delta[:, 3]))
+    keep = length > 0
+    lines, delta, travel, length = lines[keep], delta[keep], travel[keep], length[keep]
+    if len(lines) == 0:
+        times[dwell_lines] += dwells
+        return times
+
+    row = np.searchsorted(limit_lines, lines, side='right')
+    limit = {name: limits[name][row] for name, *_ in LIMITS_DTYPE}
+    unit = delta / length[:, None]
+    feedrate = c.feedrate[lines] / 60
+    speed = np.where(feedrate > 0, feedrate, np.inf)
+    speed = np.minimum(speed, axis_limit(limit['max_feedrate'], unit))
+    acceleration = np.where(travel == 0, limit['retract_acceleration'],
+                            np.where(delta[:, 3] > 0, limit['acceleration'], limit['travel_acceleration']))
+    acceleration = np.minimum(acceleration, axis_limit(limit['max_acceleration'], unit))
+
+    # Fastest speed at each junction: moves k - 1 and k meet at junction k, with one more at the end
+    jerk = limit['jerk']
+    safe = np.minimum(speed, axis_limit(jerk, unit))
+    turn = axis_limit(jerk[1:], unit[1:] - unit[:-1])
+    junction = np.empty(len(lines) + 1)
+    junction[0], junction[-1] = safe[0], safe[-1]
+    junction[1:-1] = np.minimum(np.minimum(speed[:-1], speed[1:]), turn)
+    # A G4 between two moves brings the head to a stop
+    paused = np.diff(np.searchsorted(dwell_lines, lines)) > 0
+    junction[1:-1][paused] = np.minimum(safe[:-1], safe[1:])[paused]
+
+    # Backward then forward pass on squared speeds
+    reach = 2 * acceleration * length
+    after = np.append(np.cumsum(reach[::-1])[::-1], 0)
+    entry = after + np.minimum.accumulate((junction ** 2 - after)[::-1])[::-1]
+    before = np.insert(np.cumsum(reach), 0, 0)
+    entry = np.maximum(before + np.minimum.accumulate(entry - before), 0)
+
+    start, end = np.sqrt(entry[:-1]), np.sqrt(entry[1:])
+    speeding_up = (speed ** 2 - entry[:-1]) / (2 * acceleration)
+    slowing_down = (speed ** 2 - entry[1:]) / (2 * acceleration)
+    cruise = length - speeding_up - slowing_down
+    # Moves too short to reach their speed peak where the two ramps meet
+    peak = np.sqrt(np.minimum((reach + entry[:-1] + entry[1:]) / 2, speed ** 2))
+    times[lines] = np.where(
+        cruise >= 0,
+        (2 * speed - start - end) / acceleration + np.maximum(cruise, 0) / speed,
+        (2 * peak - start - end) / acceleration)
+    times[dwell_lines] += dwells
+    return times
+
+
+# Estimated print time of the whole file, per layer and per line
+def estimate_time(gcode):
+    times = line_times(gcode)
+    layers = np.add.reduceat(times, gcode.layers.first_line) if len(times) else np.zeros(0)
+    return TimeEstimate(times, layers, float(times.sum()))
+
+
+def limit_commands(limits):
+    def axes(values):
+        return ' '.join(f'{letter}{format_number(value)}' for letter, value in zip('XYZE', values.tolist()))
+    return (f"M201 {axes(limits['max_acceleration'])}\nM203 {axes(limits['max_feedrate'])}\n"
+            f"M204 P{format_number(float(limits['acceleration']))} R{format_number(float(limits['retract_acceleration']))} "
+            f"T{format_number(float(limits['travel_acceleration']))}\nM205 {axes(limits['jerk'])}\n")
+
+
+# Seconds each inserted block adds to the print: the block on its own, run with the limits in
+# effect at its line, starting from where the head is after that line and travelling back there
+# at the end. insertions are (line number, block) pairs, e.g. from writer.injection_blocks.
+def insertion_times(gcode, insertions):
+    limit_lines, limits, _, _ = limit_events(gcode)
+    times = []
+    for line, block in insertions:
+        x, y, z = (format_number(value) for value in StateView(gcode.columns, line).current_position)
+        text = (limit_commands(limits[np.searchsorted(limit_lines, line, side='right')]) +
+                f'G92 X{x} Y{y} Z{z}\n{block.rstrip()}\nG1 X{x} Y{y} Z{z}\n')
+        times.append(estimate_time(GCode(text)).total)
+    return np.array(times, dtype=np.float64)
+
+
+# Seconds one swap to the conductive tool and back takes at line `line` of gcode, with no holes
+# to fill. Waiting for the tools to heat isn't estimated: heat_time is added for it.
+def swap_time(gcode, injector, line=None, heat_time=0.0):
+    line = len(gcode.columns) - 1 if line is None else line
+    z = StateView(gcode.columns, line).current_position[2]
+    block = injector.render(np.zeros((0, 2)), np.zeros(0), z)
+    return float(insertion_times(gcode, [(line, block)])[0]) + heat_time
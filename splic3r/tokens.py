@@ -0,0 +1,38 @@
+import re
+
+# A G-code word: a letter followed by an optional signed number, e.g. G1, X-58.092, E.0677, M862.3 or a bare Y
+WORD_PATTERN = re.compile(r'([A-Z])(-?\d*\.?\d*)')
+
+
+def to_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        # Bare letters (G28 X, G92 Y) and lone signs or points carry no value
+        return None
+
+
+# Split one line into (word, args): word is the command text ('G1', 'M862.3', 'T3'),
+# args is a list of (letter, value) pairs starting with the command word itself.
+# A leading line number (N10) and a trailing checksum (*71) are left out.
+# Returns None for comments, blank lines and lines with no G-code words.
+def tokenize_line(line):
+    tokens = WORD_PATTERN.findall(line.split(';', 1)[0].split('*', 1)[0])
+    if tokens and tokens[0][0] == 'N':
+        del tokens[0]
+    if not tokens:
+        return None
+    letter, number = tokens[0]
+    return letter + number, [(letter, to_number(number)) for letter, number in tokens]
+
+
+# Tokenize many lines, e.g. a whole file or a chunk of it, one tokenize_line each
+def tokenize(lines):
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    return [tokenize_line(line) for line in lines]
+
+
+# Convert an already split command such as ['G1', 'X135.599', 'E.0677'] to (word, args)
+def parse_words(words):
+    return tokenize_line(' '.join(words))
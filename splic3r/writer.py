@@ -0,0 +1,230 @@
+import re
+
+import numpy as np
+
+from .planner import filament_length, hole_columns
+from .route import route
+
+# Placeholders in toolchange templates look like [TO_TOOL] or [WIPE_X1]
+PLACEHOLDER_PATTERN = re.compile(r'\[([A-Z][A-Z0-9_]*)\]')
+
+
+def format_number(value):
+    if isinstance(value, (int, np.integer)):
+        return str(value)
+    if isinstance(value, (float, np.floating)):
+        text = f'{value:.5f}'.rstrip('0').rstrip('.')
+        return '0' if text in ('', '-0') else text
+    return str(value)
+
+
+class Template:
+    """A G-code template such as gcode_samples/toolchange.gcode, parsed once.
+
+    The text is split into literal chunks and placeholder names, so rendering
+    is a single join with no searching.
+    """
+
+    def __init__(self, text):
+        parts = PLACEHOLDER_PATTERN.split(text)
+        self.literals = parts[0::2]
+        self.fields = parts[1::2]
+
+    @classmethod
+    def from_file(cls, file_path):
+        with open(file_path, 'r') as file:
+            return cls(file.read())
+
+    @property
+    def placeholders(self):
+        return set(self.fields)
+
+    def render(self, values=None, **kwargs):
+        values = {**(values or {}), **kwargs}
+        missing = self.placeholders - values.keys()
+        if missing:
+            raise KeyError(f"No value for template placeholders: {', '.join(sorted(missing))}")
+        parts = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            parts.append(format_number(values[field]))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+# A slicer setting from a parsed file's var_dict as a number, for one tool where the setting has
+# a comma separated value per extruder. None if it is missing or not a number (e.g. nil or 80%).
+def slicer_setting(settings, name, tool=0):
+    values = str(settings.get(name, '')).split(',')
+    try:
+        return float(values[min(max(tool, 0), len(values) - 1)])
+    except ValueError:
+        return None
+
+
+class Injector:
+    """Renders the G-code for one conductive-filament injection.
+
+    A block swaps to the conductive tool with the toolchange template, visits each
+    hole and extrudes its volume, then swaps back to the print tool. Between holes
+    the filament is retracted and the nozzle lifted by lift mm, so it doesn't drag
+    across the print, and after each hole it waits dwell seconds for the filament
+    to settle.
+
+    print_tool is the tool to swap back to; by default the one active where the
+    block goes (see injection_blocks). Temperatures not given are the tool's entry
+    in temperatures, e.g. the slicer's per-extruder temperature setting, or 215 and
+    250. from_settings takes all of these from a parsed file.
+    """
+
+    def __init__(self, template, print_tool=None, conductive_tool=1, print_temperature=None,
+                 conductive_temperature=None, wipe=(0, 0, 0, 0), retract=0.8, lift=0.4, travel_feedrate=6000,
+                 lift_feedrate=600, retract_feedrate=2100, inject_feedrate=300, dwell=1.0, filament_diameter=1.75,
+                 temperatures=()):
+        self.template = template
+        self.print_tool = print_tool
+        self.conductive_tool = conductive_tool
+        self.print_temperature = print_temperature
+        self.conductive_temperature = conductive_temperature
+        self.wipe = wipe
+        self.retract = retract
+        self.lift = lift
+        self.travel_feedrate = travel_feedrate
+        self.lift_feedrate = lift_feedrate
+        self.retract_feedrate = retract_feedrate
+        self.inject_feedrate = inject_feedrate
+        self.dwell = dwell
+        self.filament_diameter = filament_diameter
+        self.temperatures = tuple(temperatures)
+
+    # An injector set up from the slicer settings of a parsed file (gcode.columns.var_dict): each
+    # tool's temperature, the wipe tower's front edge as the wipe, and the conductive tool's
+    # retraction, lift and filament diameter. options are Injector arguments and win over the settings.
+    @classmethod
+    def from_settings(cls, template, settings, **options):
+        tool = options.get('conductive_tool', 1)
+        found = {
+            'retract': slicer_setting(settings, 'retract_length', tool),
+            'filament_diameter': slicer_setting(settings, 'filament_diameter', tool),
+        }
+        # Zero means no lift or the firmware's own speed to the slicer; those keep the defaults here
+        for name, setting, scale in (('lift', 'retract_lift', 1), ('travel_feedrate', 'travel_speed', 60),
+                                     ('lift_feedrate', 'travel_speed_z', 60), ('retract_feedrate', 'retract_speed', 60)):
+            value = slicer_setting(settings, setting, tool)
+            found[name] = value * scale if value is not None and value > 0 else None
+        if 'temperature' in settings:
+            found['temperatures'] = [slicer_setting(settings, 'temperature', number)
+                                     for number in range(str(settings['temperature']).count(',') + 1)]
+        x, y = slicer_setting(settings, 'wipe_tower_x'), slicer_setting(settings, 'wipe_tower_y')
+        if x is not None and y is not None:
+            found['wipe'] = (x, y, x + (slicer_setting(settings, 'wipe_tower_width') or 0), y)
+        return cls(template, **{**{name: value for name, value in found.items() if value is not None}, **options})
+
+    # Temperature for a tool: given if not None, else the tool's entry in temperatures, else default
+    def temperature(self, tool, given, default):
+        if given is not None:
+            return given
+        if 0 <= tool < len(self.temperatures) and self.temperatures[tool] is not None:
+            return self.temperatures[tool]
+        return default
+
+    def toolchange(self, from_tool, to_tool, to_temperature, z):
+        wipe_x1, wipe_y1, wipe_x2, wipe_y2 = self.wipe
+        return self.template.render(
+            FROM_TOOL=from_tool, TO_TOOL=to_tool, TO_TOOL_TEMP=to_temperature,
+            WIPE_X1=wipe_x1, WIPE_Y1=wipe_y1, WIPE_X2=wipe_x2, WIPE_Y2=wipe_y2,
+            RETRACT=self.retract, DE_RETRACT=self.retract, LAYER_HEIGHT=z,
+        )
+
+    # points is an (N, 2) array of hole positions on the bed, volumes the mm^3 to put in each.
+    # active_tool is the tool printing where the block goes, swapped back to unless print_tool is set.
+    def render(self, points, volumes, z, active_tool=None):
+        print_tool = self.print_tool if self.print_tool is not None else active_tool
+        print_tool = 0 if print_tool is None else print_tool
+        lengths = filament_length(volumes, self.filament_diameter)
+        travel, inject = format_number(self.travel_feedrate), format_number(self.inject_feedrate)
+        up, down, lift = format_number(z + self.lift), format_number(z), format_number(self.lift_feedrate)
+        retract = f'G1 E-{format_number(self.retract)} F{format_number(self.retract_feedrate)}\n' if self.retract else ''
+        deretract = retract.replace('E-', 'E', 1)
+        dwell = f'G4 P{format_number(round(self.dwell * 1000))}\n' if self.dwell else ''
+        # Retract and lift, travel above the print, lower, prime, fill and let the filament settle
+        moves = ''.join(
+            f'{retract}G1 Z{up} F{lift}\nG1 X{format_number(x)} Y{format_number(y)} F{travel}\nG1 Z{down} F{lift}\n'
+            f'{deretract}G1 E{format_number(e)} F{inject}\n{dwell}'
+            for (x, y), e in zip(np.asarray(points).tolist(), np.asarray(lengths).tolist())
+        )
+        if moves:
+            # Clear of the last hole before the toolchange moves away
+            moves += f'G1 Z{up} F{lift}\n'
+        conductive_temperature = self.temperature(self.conductive_tool, self.conductive_temperature, 250)
+        print_temperature = self.temperature(print_tool, self.print_temperature, 215)
+        there = self.toolchange(print_tool, self.conductive_tool, conductive_temperature, z)
+        back = self.toolchange(self.conductive_tool, print_tool, print_temperature, z)
+        return f'{there}\n{moves}{back}\n'
+
+
+# (line, block) insertions for an injection schedule, one block per insertion line, rendered lazily.
+# Each block swaps back to the tool the schedule says was active at its line.
+# With ordered set each block visits its holes along a short route from where the toolchange
+# leaves the head (the second wipe point) to where the one back starts (the first), see route.route.
+def injection_blocks(schedule, holes, injector, offset=(0, 0), ordered=True):
+    holes = hole_columns(holes)
+    order = np.argsort(schedule['line'], kind='stable')
+    schedule = schedule[order]
+    lines, starts = np.unique(schedule['line'], return_index=True)
+    wipe_x1, wipe_y1, wipe_x2, wipe_y2 = injector.wipe
+    for line, rows in zip(lines.tolist(), np.split(schedule, starts[1:])):
+        points = holes[rows['hole'], :2] + offset
+        if ordered:
+            rows = rows[route(points, (wipe_x2, wipe_y2), (wipe_x1, wipe_y1))]
+            points = holes[rows['hole'], :2] + offset
+        tool = int(rows['tool'][0])
+        yield line, injector.render(points, rows['volume'], float(rows['z'][0]), tool if tool >= 0 else None)
+
+
+class SpliceWriter:
+    """Buffered line writer: lines are collected and written out in batches."""
+
+    def __init__(self, file, batch_lines=8192):
+        self.file = file
+        self.batch_lines = batch_lines
+        self.pending = []
+
+    @classmethod
+    def open(cls, file_path, batch_lines=8192):
+        return cls(open(file_path, 'w', buffering=1 << 20), batch_lines)
+
+    def write_line(self, line):
+        self.pending.append(line)
+        self.pending.append('\n')
+        if len(self.pending) >= 2 * self.batch_lines:
+            self.flush()
+
+    # A block of G-code that may hold many lines, written as is
+    def write_block(self, block):
+        self.pending.append(block)
+
+    def flush(self):
+        self.file.writelines(self.pending)
+        self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Copy lines to the output, writing each block after the line it belongs to.
+    # insertions are (line number, block) pairs in line order, e.g. from injection_blocks.
+    def splice(self, lines, insertions=()):
+        insertions = iter(insertions)
+        at, block = next(insertions, (None, None))
+        for index, line in enumerate(lines):
+            self.write_line(line)
+            while at == index:
+                self.write_block(block)
+                at, block = next(insertions, (None, None))
+        self.flush()
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from splic3r import GCode
+from splic3r.arcs import arc_geometry, arc_lengths, linearize
+from splic3r.parallel import parse_parallel
+from splic3r.lines import LineStore
+from test_parallel import assert_same_columns
+
+def geometry(text):
+    gcode = GCode(text)
+    return gcode, arc_geometry(gcode.columns)
+
+def test_arc_log():
+    gcode = GCode("G1 X10 Y0\nG3 X0 Y10 I-10 J0 E1\nG2 X10 Y0 R10\nG1 X0")
+    assert gcode.columns.arc_lines.tolist() == [1, 2]
+    values = gcode.columns.arc_values
+    assert values[0, :2].tolist() == [-10, 0] and np.isnan(values[0, 2])
+    assert np.isnan(values[1, :2]).all() and values[1, 2] == 10
+    assert gcode.lines[1].state.current_position == [0, 10, 0]
+
+def test_centre_and_sweep():
+    # A positive R goes the short way round, a negative one the long way
+    _, arcs = geometry("G1 X10 Y0\nG3 X0 Y10 I-10 J0\nG2 X10 Y0 I0 J-10\nG2 X0 Y10 R-10\nG3 X10 Y0 R-10\nG2 X0 Y10 R10")
+    assert arcs.centre == pytest.approx(np.array([[0, 0]] * 4 + [[10, 10]]))
+    assert arcs.sweep == pytest.approx([np.pi / 2, -np.pi / 2, -3 * np.pi / 2, 3 * np.pi / 2, -np.pi / 2])
+    assert arc_lengths(arcs) == pytest.approx(10 * np.abs(arcs.sweep))
+
+def test_full_circle_and_helix():
+    _, arcs = geometry("G1 X10 Y0\nG2 I-10 J0 Z1")
+    assert arcs.sweep == pytest.approx([-2 * np.pi])
+    assert arc_lengths(arcs) == pytest.approx([np.hypot(20 * np.pi, 1)])
+    paths = linearize(arcs, 0.01)
+    assert paths.points[0].tolist() == [10, 0, 0]
+    assert paths.points[-1].tolist() == [10, 0, 1]
+    assert paths.points[:, 0].min() == pytest.approx(-10, abs=0.01)
+    assert np.all(np.diff(paths.points[:, 2]) > 0)
+
+def test_linearize_tolerance():
+    _, arcs = geometry("G1 X10 Y0\nG3 X0 Y10 I-10 J0\nG1 X50 Y50\nG3 X52 Y50 R1")
+    for tolerance in (0.1, 0.01, 0.001):
+        paths = linearize(arcs, tolerance)
+        for k in range(2):
+            points = paths.points[paths.offsets[k]:paths.offsets[k + 1]]
+            radius = np.hypot(*(points[:, :2] - arcs.centre[k]).T)
+            assert radius == pytest.approx(arcs.start_radius[k])
+            # Chord midpoints are within tolerance of the arc
+            middle = (points[1:, :2] + points[:-1, :2]) / 2
+            assert (radius[0] - np.hypot(*(middle - arcs.centre[k]).T)).max() <= tolerance + 1e-12
+    assert np.diff(linearize(arcs, 0.001).offsets)[0] > np.diff(linearize(arcs, 0.1).offsets)[0]
+
+def test_arc_segments_and_cache():
+    gcode = GCode("G1 X10 Y0\n;LAYER_CHANGE\n;Z:.2\nG3 X-10 Y0 I-10 J0 E1\nG1 X-10 Y-5 E1")
+    segments, lines = gcode.extrusion_segments(1)
+    assert len(segments) > 10
+    assert set(lines.tolist()) == {3, 4}
+    assert segments[0, :2].tolist() == [10, 0]
+    assert segments[-2, 2:].tolist() == [-10, 0]
+    assert np.hypot(*(segments[:-1, 2:]).T) == pytest.approx(10)
+    # Cached per layer and tolerance
+    assert gcode.arc_paths(1) is gcode.arc_paths(1)
+    assert gcode.arc_paths(1, 0.1) is not gcode.arc_paths(1)
+    gcode.insert_lines(4, ["G1 X0"])
+    assert gcode.arc_cache == {}
+
+def test_arcs_survive_parallel_parse_and_edits():
+    lines = ['G1 X10 Y0']
+    for layer in range(12):
+        lines += [';LAYER_CHANGE', f';Z:{0.2 * (layer + 1):.1f}']
+        lines += ['G92 E0', 'G1 X10 Y0', f'G3 X-10 Y0 I-10 J0 E{layer + 1}', 'G2 X10 Y0 R10 E1']
+    source = LineStore.from_text('\n'.join(lines))
+    serial = GCode(source=source)
+    parallel = parse_parallel(source, workers=2, chunks=5, checkpoint_lines=3)
+    assert_same_columns(parallel, serial.columns)
+    assert np.array_equal(parallel.arc_lines, serial.columns.arc_lines)
+    assert np.array_equal(parallel.arc_values, serial.columns.arc_values, equal_nan=True)
+    serial.replace_lines(5, 6, ['G2 X-10 Y0 I-10 J0'])
+    fresh = GCode(serial.raw_data)
+    assert np.array_equal(serial.columns.arc_lines, fresh.columns.arc_lines)
+    assert np.array_equal(serial.columns.arc_values, fresh.columns.arc_values, equal_nan=True)
@@ -0,0 +1,111 @@
+import json
+import pytest
+import numpy as np
+from splic3r import GCode
+from splic3r.batch import Job, SharedParse, attach, attached, read_manifest, run_batch, format_report
+from splic3r.columns import COLUMNS
+from splic3r.drl import DrillFile
+from test_planner import layered_gcode
+from test_register import hole_gcode
+
+DRILL = "M48\nMETRIC,TZ\nT1C1.000\n%\nG90\nG05\nT1\nX{x}Y5.0\nT0\nM30\n"
+
+def write_inputs(tmp_path):
+    (tmp_path / 'print.gcode').write_text(layered_gcode().raw_data + '\n')
+    (tmp_path / 'a.drl').write_text(DRILL.format(x=5.0))
+    (tmp_path / 'b.drl').write_text(DRILL.format(x=5.2))
+    (tmp_path / 'toolchange.gcode').write_text("T[TO_TOOL]\nG1 Z[LAYER_HEIGHT]\n")
+
+def manifest_jobs(tmp_path):
+    write_inputs(tmp_path)
+    manifest = {
+        'defaults': {'gcode': 'print.gcode', 'template': 'toolchange.gcode', 'options': {'conductive_tool': 2}},
+        'jobs': [{'drills': 'a.drl', 'output': 'a.gcode'},
+                 {'drills': ['b.drl'], 'output': 'b.gcode', 'options': {'offset': [-0.2, 0]}},
+                 {'drills': ['a.drl', 'b.drl'], 'output': 'ab.gcode'}],
+    }
+    (tmp_path / 'jobs.json').write_text(json.dumps(manifest))
+    return read_manifest(tmp_path / 'jobs.json')
+
+def test_read_manifest(tmp_path):
+    jobs = manifest_jobs(tmp_path)
+    assert len(jobs) == 3
+    assert jobs[0].gcode == str(tmp_path / 'print.gcode')
+    assert jobs[0].drills == (str(tmp_path / 'a.drl'),)
+    assert jobs[1].options == {'conductive_tool': 2, 'offset': [-0.2, 0]}
+    (tmp_path / 'bad.json').write_text(json.dumps([{'gcode': 'print.gcode', 'drills': [], 'template': 't',
+                                                    'output': 'o', 'options': {'offest': [1, 1]}}]))
+    with pytest.raises(ValueError, match='offest'):
+        read_manifest(tmp_path / 'bad.json')
+    (tmp_path / 'bad.json').write_text(json.dumps([{'gcode': 'print.gcode'}]))
+    with pytest.raises(ValueError, match='drills'):
+        read_manifest(tmp_path / 'bad.json')
+
+def test_shared_parse():
+    gcode = layered_gcode()
+    with SharedParse(gcode) as shared:
+        copy = attach(shared.handle)
+        assert copy.line_count == gcode.line_count
+        for name in COLUMNS:
+            assert np.array_equal(getattr(copy.columns, name), getattr(gcode.columns, name))
+        assert copy.columns.move_types == gcode.columns.move_types
+        assert list(copy.layers) == list(gcode.layers)
+        assert copy.lines[40].line == gcode.lines[40].line
+        assert not copy.columns.x.flags.writeable
+        del copy
+        attached.pop(shared.handle[0])
+
+def test_run_batch(tmp_path):
+    jobs = manifest_jobs(tmp_path)
+    report = run_batch(jobs, workers=1)
+    assert [result.error for result in report.results] == [None] * 3
+    # The print and template are read once for all three jobs
+    assert len(report.parse_times) == 5
+    assert [result.holes for result in report.results] == [1, 1, 2]
+    assert [result.injections for result in report.results] == [1, 1, 2]
+    # The two holes are filled in one swap
+    assert report.results[2].toolchanges == 2
+    assert set(report.results[0].timings) == {'load', 'plan', 'write', 'total'}
+    assert report.results[0].residual is None and report.results[0].matched is None
+    # b.drl moved back by its offset lands on the same spot as a.drl
+    assert (tmp_path / 'a.gcode').read_text() == (tmp_path / 'b.gcode').read_text()
+    spliced = GCode.from_file(tmp_path / 'ab.gcode')
+    assert set(spliced.columns.tool[spliced.columns.tool >= 0].tolist()) == {0, 2}
+    assert 'G1 X5.2 Y5 F6000' in spliced.raw_data
+    assert '3 jobs, 0 failed' in format_report(report)
+
+def test_run_batch_in_workers(tmp_path):
+    jobs = manifest_jobs(tmp_path)
+    run_batch(jobs, workers=1)
+    expected = [open(job.output).read() for job in jobs]
+    report = run_batch(jobs, workers=2)
+    assert [result.error for result in report.results] == [None] * 3
+    assert [open(job.output).read() for job in jobs] == expected
+
+def test_failed_job(tmp_path):
+    jobs = manifest_jobs(tmp_path)
+    missing = jobs[0]._replace(drills=(str(tmp_path / 'missing.drl'),))
+    bad_option = jobs[1]._replace(options={'min_layers': 'many'})
+    report = run_batch([missing, bad_option, jobs[2]], workers=1)
+    assert 'missing.drl' in report.results[0].error
+    assert report.results[1].error is not None
+    assert report.results[2].error is None
+    assert '3 jobs, 2 failed' in format_report(report)
+
+def test_registered_jobs(tmp_path):
+    drill = DrillFile.from_file('tests/drl/PTH.drl')
+    (tmp_path / 'print.gcode').write_text(hole_gcode(drill.hole_array(), 0.2, (120, 80)).raw_data)
+    (tmp_path / 'toolchange.gcode').write_text("T[TO_TOOL]\n")
+    job = Job(str(tmp_path / 'print.gcode'), ('tests/drl/PTH.drl',), str(tmp_path / 'toolchange.gcode'),
+              str(tmp_path / 'fitted.gcode'), {'register': True})
+    rejected = job._replace(output=str(tmp_path / 'rejected.gcode'), options={'register': True, 'max_residual': 1e-6})
+    report = run_batch([job, rejected], workers=1)
+    fitted = report.results[0]
+    assert fitted.error is None
+    assert fitted.residual < 0.01 and fitted.matched == 1.0
+    assert (tmp_path / 'fitted.gcode').exists()
+    # A fit worse than asked for fails the job, and nothing is written
+    assert 'residual' in report.results[1].error
+    assert not (tmp_path / 'rejected.gcode').exists()
+    table = format_report(report)
+    assert '100%' in table and '2 jobs, 1 failed' in table
@@ -0,0 +1,50 @@
+import os
+import time
+import numpy as np
+from splic3r import GCode, PrinterState
+from splic3r.cache import ParseCache
+from splic3r.columns import COLUMNS
+
+def test_cache_round_trip(tmp_path):
+    cache = ParseCache(tmp_path)
+    parsed = GCode.from_file('tests/gcode/box.gcode', cache=cache)
+    assert len(cache.entries()) == 1
+    loaded = GCode.from_file('tests/gcode/box.gcode', cache=cache)
+    for name in COLUMNS:
+        assert np.array_equal(getattr(parsed.columns, name), getattr(loaded.columns, name))
+    assert np.array_equal(parsed.columns.offset_values, loaded.columns.offset_values)
+    assert loaded.columns.move_types == parsed.columns.move_types
+    assert loaded.columns.var_dict == parsed.columns.var_dict
+    assert list(loaded.layers) == list(parsed.layers)
+    assert loaded.line_count == parsed.line_count
+    assert loaded.lines[14850].state.print_move_type == parsed.lines[14850].state.print_move_type
+    assert loaded.lines[-1].state == parsed.lines[-1].state
+
+def test_cache_key_depends_on_content_and_handlers(tmp_path):
+    cache = ParseCache(tmp_path)
+    GCode("G1 X1", cache=cache)
+    GCode("G1 X2", cache=cache)
+    assert len(cache.entries()) == 2
+    key = cache.key(GCode("G1 X1").source)
+    PrinterState.register_command('M9999', lambda state, args: None)
+    try:
+        assert cache.key(GCode("G1 X1").source) != key
+    finally:
+        del PrinterState.commands['M9999']
+    assert cache.key(GCode("G1 X1").source) == key
+
+def test_cache_eviction(tmp_path):
+    cache = ParseCache(tmp_path, max_bytes=1 << 30, max_age=3600)
+    for x in range(3):
+        GCode(f"G1 X{x}", cache=cache)
+    entries = cache.entries()
+    # Age the oldest entry past max_age
+    old = time.time() - 7200
+    os.utime(entries[0][2], (old, old))
+    cache.evict()
+    assert len(cache.entries()) == 2
+    cache.max_bytes = cache.entries()[-1][1]
+    cache.evict()
+    assert len(cache.entries()) == 1
+    cache.clear()
+    assert cache.entries() == []
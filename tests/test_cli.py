@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import pytest
+from splic3r.cli import main
+from splic3r.drl import DrillFile
+from test_batch import manifest_jobs, write_inputs
+from test_register import hole_gcode
+
+def splice_args(tmp_path, *extra):
+    return ['--drills', str(tmp_path / 'a.drl'), '--template', str(tmp_path / 'toolchange.gcode'),
+            '--conductive-tool', '2', *extra]
+
+def test_starts_without_numpy():
+    code = "import sys, splic3r.cli; sys.exit('numpy' in sys.modules or 'matplotlib' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+    assert subprocess.run([sys.executable, '-m', 'splic3r', '--help'], capture_output=True).returncode == 0
+
+def test_rewrite_in_place(tmp_path):
+    write_inputs(tmp_path)
+    path = tmp_path / 'print.gcode'
+    original = path.read_text()
+    os.chmod(path, 0o640)
+    assert main(splice_args(tmp_path, str(path))) == 0
+    spliced = path.read_text()
+    assert spliced.startswith(original.split(';LAYER_CHANGE')[0])
+    assert 'T2\n' in spliced and 'G1 X5 Y5 F6000' in spliced
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    # Nothing left behind
+    assert sorted(os.listdir(tmp_path)) == ['a.drl', 'b.drl', 'print.gcode', 'toolchange.gcode']
+
+def test_failure_leaves_file(tmp_path, capsys):
+    write_inputs(tmp_path)
+    path = tmp_path / 'print.gcode'
+    original = path.read_text()
+    assert main(splice_args(tmp_path, '--set', 'min_layers="many"', str(path))) == 1
+    assert path.read_text() == original
+    assert 'splic3r:' in capsys.readouterr().err
+    assert main(splice_args(tmp_path, '--set', 'colour=1', str(path))) == 2
+    assert main(['--drills', str(tmp_path / 'missing.drl'), '--template', 'x', str(path)]) == 1
+    with pytest.raises(SystemExit):
+        main([str(path)])
+
+def test_register(tmp_path, capsys):
+    write_inputs(tmp_path)
+    path = tmp_path / 'print.gcode'
+    path.write_text(hole_gcode(DrillFile.from_file('tests/drl/PTH.drl').hole_array(), 0.2, (120, 80)).raw_data)
+    original = path.read_text()
+    args = ['--drills', 'tests/drl/PTH.drl', '--template', str(tmp_path / 'toolchange.gcode'), '--register']
+    # A fit worse than asked for leaves the file as it was
+    assert main([*args, '--max-residual', '1e-6', str(path)]) == 1
+    assert 'residual' in capsys.readouterr().err
+    assert path.read_text() == original
+    assert main([*args, '--min-matched', '1', str(path)]) == 0
+    assert '100% of holes matched' in capsys.readouterr().err
+
+def test_stdin_to_stdout(tmp_path):
+    write_inputs(tmp_path)
+    path = tmp_path / 'print.gcode'
+    assert main(splice_args(tmp_path, '--output', str(tmp_path / 'out.gcode'), str(path))) == 0
+    with open(path, 'rb') as stdin:
+        piped = subprocess.run([sys.executable, '-m', 'splic3r', *splice_args(tmp_path, '-')],
+                               stdin=stdin, capture_output=True, check=True)
+    assert piped.stdout.decode() == (tmp_path / 'out.gcode').read_text()
+
+def test_batch_manifest(tmp_path, capsys):
+    jobs = manifest_jobs(tmp_path)
+    assert main(['--batch', str(tmp_path / 'jobs.json'), '--workers', '1']) == 0
+    assert '3 jobs, 0 failed' in capsys.readouterr().out
+    assert all(os.path.exists(job.output) for job in jobs)
@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+from splic3r import GCode, PrinterState
+from splic3r.columns import StateColumns, StateView
+
+gcode_str = """G1 Z22 F600
+G1 E.8 F1500
+T1
+;TYPE:Internal infill
+G92 E0
+
+M83
+G1 X10 Y-5 E.5
+"""
+
+def test_columns_match_printer_state():
+    gcode = GCode(gcode_str)
+    state = PrinterState()
+    for line in gcode.lines:
+        gcode.parse_line(line.line, state)
+        assert line.state == state
+
+def test_columns_are_arrays():
+    gcode = GCode(gcode_str)
+    assert isinstance(gcode.columns.x, np.ndarray)
+    assert len(gcode.columns) == gcode.line_count
+    assert gcode.columns.motion.tolist() == [1, 1, 0, 0, 0, 0, 0, 1]
+
+def test_state_view():
+    gcode = GCode(gcode_str)
+    state = gcode.lines[-1].state
+    assert isinstance(state, StateView)
+    assert state.current_position == [10, -5, 22]
+    assert state.amount_extruded == .5
+    assert state.selected_tool == 1
+    assert not state.relative
+    assert state.extruding
+    assert state.print_move_type == "Internal infill"
+    assert state.extrude_offset == .8
+    assert gcode.lines[0].state.extrude_offset == 0
+
+def test_blank_line_state_is_not_live():
+    gcode = GCode(gcode_str)
+    assert gcode.lines[5].state.current_position == [0, 0, 22]
+    assert gcode.lines[5].state.amount_extruded == 0
+
+def test_empty_columns():
+    columns = StateColumns().finalize()
+    assert len(columns) == 0
+    assert columns.nbytes() == 0
@@ -1,17 +1,88 @@
 import pytest
 from splic3r import drl
 
+
 def test_drill():
     drill = drl.DrillFile("")
     assert drill != None
 
+
 def test_file():
     drill = drl.DrillFile.from_file("tests/drl/PTH.drl")
 
+
 def test_tools():
     drill = drl.DrillFile.from_file("tests/drl/PTH.drl")
     assert drill.tools == [('T1', 0.3), ('T2', 0.4), ('T3', 0.6), ('T4', 1.0), ('T5', 2.2)]
 
+
 def test_drills():
     drill = drl.DrillFile.from_file("tests/drl/PTH.drl")
-    assert len(drill.drills['T1']) == 68
\ No newline at end of file
+    assert len(drill.drills['T1']) == 68
+
+
+def test_hole_array_attributes():
+    holes = drl.DrillFile.from_file("tests/drl/PTH.drl").hole_array()
+    assert len(holes) == 133
+    assert set(holes[holes['tool'] == 'T1']['function']) == {'ViaDrill'}
+    assert set(holes[holes['tool'] != 'T1']['function']) == {'ComponentDrill'}
+    assert holes['plated'].all()
+    assert holes[0].tolist() == (29.164, -38.197, 0.3, 'T1', 'ViaDrill', True)
+
+
+def test_routed_slots():
+    drill = drl.DrillFile.from_file("tests/drl/PTH.drl")
+    assert len(drill.slots) == 4
+    assert drill.slots[0].tolist()[:5] == (33.336, -18.685, 33.336, -17.885, 0.6)
+
+
+def test_number_formats():
+    # Trailing zeros kept: read from the right
+    inch = drl.DrillFile("M48\nINCH,TZ\nT1C0.0394\n%\nT1\nX10000Y-5000\nX015\n")
+    assert inch.hole_array()[['x', 'y']].tolist() == [(25.4, -12.7), pytest.approx((0.0381, -12.7))]
+    assert inch.hole_array()['diameter'][0] == pytest.approx(1.00076)
+    # Leading zeros kept: read from the left, here with 3 integer digits
+    metric = drl.DrillFile("M48\nMETRIC,LZ,000.000\nT1C1.0\n%\nT1\nX0125Y-00105\nX12.5\n")
+    assert metric.hole_array()[['x', 'y']].tolist() == [(12.5, -1.05), (12.5, -1.05)]
+    kicad = drl.DrillFile("M48\n; FORMAT={3:3/ absolute / metric / suppress trailing zeros}\nMETRIC\nT1C1.0\n%\nT1\nX0125Y01\n")
+    assert kicad.hole_array()[['x', 'y']].tolist() == [(12.5, 10.0)]
+
+
+def test_modal_coordinates_and_units():
+    drill = drl.DrillFile("M48\nMETRIC\nT1C1.0\nT2C2.0\n%\nT1\nX1.0Y2.0\nY3.0\nX4.0\nT2\nM72\nX1.0\nT0\nX5.0Y5.0\nM30\n")
+    assert drill.hole_array()[['x', 'y', 'tool']].tolist() == [(1, 2, 'T1'), (1, 3, 'T1'), (4, 3, 'T1'), (25.4, 3, 'T2')]
+    assert drill.drills == {'T1': [(1, 2), (1, 3), (4, 3)], 'T2': [(25.4, 3)]}
+
+
+def test_g85_slots():
+    drill = drl.DrillFile("M48\nMETRIC\nT1C0.8\n%\nT1\nX1.0Y1.0G85X3.0Y1.0\nY4.0G85X5.0\nX6.0Y6.0\n")
+    assert drill.slots[['x', 'y', 'x2', 'y2']].tolist() == [(1, 1, 3, 1), (3, 4, 5, 4)]
+    assert drill.hole_array()[['x', 'y']].tolist() == [(6, 6)]
+
+
+def test_non_plated_and_merge():
+    pth = drl.DrillFile.from_file("tests/drl/PTH.drl").hole_array()
+    npth = drl.DrillFile("M48\n; #@! TF.FileFunction,NonPlated,1,4,NPTH\nMETRIC\nT1C3.0\n%\nT1\n"
+                         "X29.1641Y-38.197\nX10.0Y10.0\nX10.0041Y10.0\n").hole_array()
+    assert not npth['plated'].any()
+    merged = drl.merge_holes([pth, npth], tolerance=0.005)
+    # The first hole is also in the PTH file, the last is a repeat of the one before
+    assert len(merged) == len(pth) + 1
+    assert merged[-1].tolist()[:3] == (10.0, 10.0, 3.0)
+    assert merged[0]['plated']
+
+
+def test_incremental_coordinates():
+    # G91 adds each coordinate to the point before, until G90
+    drill = drl.DrillFile("M48\nMETRIC\nT1C1.0\n%\nT1\nX1.0Y1.0\nG91\nX1.0\nY2.0\nX-0.5Y-0.5\nG90\nX10.0\n")
+    assert drill.hole_array()[['x', 'y']].tolist() == [(1, 1), (2, 1), (2, 3), (1.5, 2.5), (10, 2.5)]
+    # ICI,ON in the header makes the whole body incremental, G85 slot ends included
+    drill = drl.DrillFile("M48\nICI,ON\nMETRIC\nT1C1.0\n%\nT1\nX1.0Y1.0\nX1.0Y1.0G85X2.0\n")
+    assert drill.hole_array()[['x', 'y']].tolist() == [(1, 1)]
+    assert drill.slots[['x', 'y', 'x2', 'y2']].tolist() == [(2, 2, 4, 2)]
+
+
+def test_header_after_comments():
+    drill = drl.DrillFile("; made by hand\n\nM48\nINCH\nT1C0.1\n%\nT1\nX1.0Y1.0\n")
+    assert drill.units == 'INCH'
+    assert drill.hole_array()[['x', 'y', 'diameter']].tolist() == [(25.4, 25.4, pytest.approx(2.54))]
@@ -74,6 +74,11 @@ def test_split_command():
     # Negative numbers
     assert gcode.split_command('  G1X135.599Y-58.092E.0677') == ['G1', 'X135.599', 'Y-58.092', 'E.0677']
 
+def test_line_numbers_and_checksums():
+    gcode = GCode("N10 G1 X5 Y5\nN11 G1 X7 Y6*71\n")
+    assert gcode.columns.x.tolist()[:2] == [5, 7]
+    assert gcode.columns.y.tolist()[:2] == [5, 6]
+
 def test_execute_command():
     printer_state = PrinterState()
     expected_state = PrinterState()
@@ -103,6 +108,13 @@ def test_G2_G3():
     assert printer_state.execute_command(['G3', 'X4', 'Y20.05', 'E.304']) == expected_state	
     
 
+def test_G4():
+    printer_state = PrinterState()
+    printer_state.execute_command(['G4', 'P500'])
+    assert printer_state.dwell == 0.5
+    printer_state.execute_command(['G4', 'S2'])
+    assert printer_state.dwell == 2
+
 def test_G28():
     printer_state = PrinterState()
     expected_state = PrinterState()
@@ -229,30 +241,43 @@ def test_M190():
 def test_M201():
     printer_state = PrinterState()
     expected_state = PrinterState()
-    # TODO: Implement M201 command
     printer_state.execute_command(['M201'])
     assert printer_state == expected_state
+    printer_state.execute_command(['M201', 'X5000', 'Y5000', 'Z200', 'E2500'])
+    expected_state.max_acceleration = [5000, 5000, 200, 2500]
+    assert printer_state == expected_state
 
 def test_M203():
     printer_state = PrinterState()
     expected_state = PrinterState()
-    # TODO: Implement M203 command
     printer_state.execute_command(['M203'])
     assert printer_state == expected_state
+    printer_state.execute_command(['M203', 'X400', 'Z12'])
+    expected_state.max_feedrate = [400, 300, 12, 25]
+    assert printer_state == expected_state
 
 def test_M204():
     printer_state = PrinterState()
     expected_state = PrinterState()
-    # TODO: Implement M204 command
     printer_state.execute_command(['M204'])
     assert printer_state == expected_state
+    printer_state.execute_command(['M204', 'P3000', 'R1200', 'T2000'])
+    expected_state.acceleration = 3000
+    expected_state.retract_acceleration = 1200
+    expected_state.travel_acceleration = 2000
+    assert printer_state == expected_state
+    printer_state.execute_command(['M204', 'S800'])
+    expected_state.acceleration = expected_state.travel_acceleration = 800
+    assert printer_state == expected_state
 
 def test_M205():
     printer_state = PrinterState()
     expected_state = PrinterState()
-    # TODO: Implement M205 command
     printer_state.execute_command(['M205'])
     assert printer_state == expected_state
+    printer_state.execute_command(['M205', 'X8.00', 'Y8.00', 'Z2.00', 'E10.00', 'S0', 'T0'])
+    expected_state.jerk = [8, 8, 2, 10]
+    assert printer_state == expected_state
 
 def test_M217():
     printer_state = PrinterState()
@@ -338,12 +363,139 @@ def test_T0():
     expected_state.selected_tool = 3
     assert printer_state == expected_state
 
+def test_G91():
+    printer_state = PrinterState()
+    printer_state.execute_command(['G1', 'X10'])
+    printer_state.execute_command(['G91'])
+    printer_state.execute_command(['G1', 'X10'])
+    assert printer_state.relative
+    assert printer_state.current_position == [20,0,0]
+
+def test_unknown_command():
+    printer_state = PrinterState()
+    expected_state = PrinterState()
+    printer_state.execute_command(['M600'])
+    assert printer_state == expected_state
+    printer_state.strict = True
+    with pytest.raises(NotImplementedError):
+        printer_state.execute_command(['M600'])
+
+def test_register_command():
+    class FilamentChangeState(PrinterState):
+        pass
+
+    @FilamentChangeState.register_command('M600')
+    def M600(state, args):
+        state.var_dict['filament changes'] = state.var_dict.get('filament changes', 0) + 1
+
+    FilamentChangeState.register_command('Q', lambda state, command: setattr(state, 'fan_speed', command[0][1]), prefix=True)
+    printer_state = FilamentChangeState()
+    printer_state.execute_command(['M600'])
+    printer_state.execute_command(['Q7'])
+    assert printer_state.var_dict['filament changes'] == 1
+    assert printer_state.fan_speed == 7
+    assert 'M600' not in PrinterState.commands
+    assert 'Q' not in PrinterState.prefix_commands
+
 def test_multiple_states():
     gcode = GCode(gcode_str)
     assert gcode.lines[0].state.current_position == [0,0,22]
     assert gcode.lines[6].state.current_position == [135.599,58.092,22]
     assert gcode.lines[7].state.current_position == [138.898,61.391,22]
 
+def test_line_overhead():
+    gcode = GCode('G1 X1 Y1 E1 F1800\n' * 10000)
+    assert not hasattr(gcode.lines[0], '__dict__')
+    usage = gcode.memory_usage()
+    assert usage['text'] == 180000
+    assert usage['line_starts'] == 4 * 10001
+    # Besides the text, a line costs its row of state columns and its offset
+    assert (usage['total'] - usage['text']) / gcode.line_count < 70
+
+def test_iter_file():
+    gcode = GCode.from_file('tests/gcode/box.gcode')
+    count = 0
+    for index, (line, state) in enumerate(GCode.iter_file('tests/gcode/box.gcode', chunk_size=100)):
+        assert line == gcode.lines[index].line
+        count += 1
+    assert count == gcode.line_count
+    assert gcode.lines[-1].state == state
+
+def test_iter_lines_single_state():
+    states = [state for _, state in GCode.iter_lines(gcode_str.splitlines())]
+    assert all(state is states[0] for state in states)
+    assert states[-1].current_position == [138.898, 61.391, 22]
+
+def assert_same_states(edited):
+    fresh = GCode(edited.raw_data)
+    assert edited.line_count == fresh.line_count
+    for line in range(edited.line_count):
+        assert edited.lines[line].state == fresh.lines[line].state
+    assert edited.columns.var_dict == fresh.columns.var_dict
+    assert list(edited.layers) == list(fresh.layers)
+
+edit_str = """; nozzle = 0.4
+T0
+G1 Z.2 F600
+G1 X1 Y1 E.1
+;LAYER_CHANGE
+;Z:0.4
+G92 X1 E0
+G1 X2 Y2 E.2
+G1 X3 Y3 E.3
+;LAYER_CHANGE
+;Z:0.6
+G92 E0
+G1 X4 Y4 E.4
+G92
+G1 X5 Y5 E.5"""
+
+def test_insert_lines():
+    gcode = GCode(edit_str)
+    gcode.insert_lines(4, ['T1', 'G1 X9 Y9 E2', 'G92 X0', 'T0'])
+    assert gcode.lines[5].state.selected_tool == 1
+    assert_same_states(gcode)
+    gcode.insert_lines(gcode.line_count, "; nozzle = 0.6\n;LAYER_CHANGE\n")
+    assert gcode.columns.var_dict['nozzle'] == '0.6'
+    assert_same_states(gcode)
+
+def test_replace_and_delete_lines():
+    gcode = GCode(edit_str)
+    gcode.replace_lines(7, 9, ['G91', 'G1 X1 E1'])
+    assert_same_states(gcode)
+    gcode.delete_lines(0, 3)
+    assert_same_states(gcode)
+    with pytest.raises(IndexError):
+        gcode.delete_lines(3, gcode.line_count + 1)
+
+def test_edit_lines_holding_newlines():
+    gcode = GCode(edit_str)
+    gcode.insert_lines(4, ['T1\nG1 X9 Y9 E2', 'G92 X0\nT0'])
+    assert gcode.line_count == len(edit_str.split('\n')) + 4
+    assert gcode.lines[5].line == 'G1 X9 Y9 E2'
+    assert len(gcode.columns) == gcode.line_count
+    assert_same_states(gcode)
+
+def test_failed_edit_leaves_file():
+    gcode = GCode(edit_str)
+    text, e = gcode.raw_data, gcode.columns.e.copy()
+    with pytest.raises(NotImplementedError):
+        gcode.replace_lines(2, 3, ['G1 X1', 'G20'])
+    assert gcode.raw_data == text
+    assert (gcode.columns.e == e).all()
+    assert_same_states(gcode)
+
+def test_edit_stops_when_state_settles():
+    gcode = GCode.from_file('tests/gcode/box.gcode')
+    line_count = gcode.line_count
+    # An extra extrusion changes E until the next G92 E0, a few lines into the next layer
+    parsed = gcode.insert_lines(5000, ['G1 X138 Y60 E1'])
+    assert parsed < 500
+    assert gcode.line_count == line_count + 1
+    fresh = GCode(gcode.raw_data)
+    assert (gcode.columns.e == fresh.columns.e).all()
+    assert gcode.lines[-1].state == fresh.lines[-1].state
+
 def test_full_sanity_check():
     gcode = GCode.from_file('tests/gcode/multi.gcode')
     assert gcode.line_count == 294548
@@ -0,0 +1,52 @@
+import pytest
+from splic3r import GCode
+
+layered_str = """G1 Z5
+;LAYER_CHANGE
+;Z:0.2
+G1 Z.2
+G1 X1 E1
+;LAYER_CHANGE
+;Z:0.4
+G1 Z.4
+;LAYER_CHANGE
+;Z:0.55
+G1 Z.55
+"""
+
+def test_layer_index():
+    gcode = GCode(layered_str)
+    assert len(gcode.layers) == 4
+    assert gcode.layer(0) == (0, 0, 0, 0, 0)
+    assert gcode.layer(1) == (1, 1, 4, 0.2, 0.2)
+    assert gcode.layer(3).first_line == 8
+    assert gcode.layer(3).last_line == 10
+    assert gcode.layer(3).height == pytest.approx(0.15)
+    with pytest.raises(IndexError):
+        gcode.layer(4)
+
+def test_layer_at_z():
+    gcode = GCode(layered_str)
+    assert gcode.layer_at_z(0.1).number == 1
+    assert gcode.layer_at_z(0.2).number == 1
+    assert gcode.layer_at_z(0.3).number == 2
+    assert gcode.layer_at_z(0.5).number == 3
+    assert gcode.layer_at_z(1) is None
+
+def test_layer_of_lines():
+    gcode = GCode(layered_str)
+    assert gcode.layers.layer_of_lines([0, 1, 4, 5, 10]).tolist() == [0, 1, 1, 2, 3]
+
+def test_box_layers():
+    gcode = GCode.from_file('tests/gcode/box.gcode')
+    assert len(gcode.layers) == 181
+    layer = gcode.layer(1)
+    assert layer.first_line == 3139
+    assert layer.z == 0.2
+    assert gcode.lines[layer.last_line + 1].line == ';LAYER_CHANGE'
+    assert gcode.layer_at_z(36).number == 180
+
+def test_empty_layers():
+    gcode = GCode()
+    assert len(gcode.layers) == 0
+    assert gcode.layer_at_z(1) is None
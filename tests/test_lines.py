@@ -0,0 +1,55 @@
+import pytest
+from splic3r import GCode
+from splic3r.drl import DrillFile
+from splic3r.lines import LineStore, line_starts
+
+
+def test_line_starts():
+    assert line_starts(b'G1\nG2\n').tolist() == [0, 3, 6]
+    assert line_starts(b'G1\nG2').tolist() == [0, 3, 6]
+    assert line_starts(b'').tolist() == [0]
+    assert line_starts(b'a\nbb\nccc\n', chunk_size=2).tolist() == [0, 2, 5, 9]
+    assert line_starts(b'G1\n').dtype == 'uint32'
+
+
+def test_line_store_matches_splitlines():
+    text = 'G28\r\nG1 X1\n\n;comment\nG1 Y2'
+    store = LineStore.from_text(text)
+    assert len(store) == 5
+    assert list(store) == text.splitlines()
+    assert [store[i] for i in range(len(store))] == text.splitlines()
+    assert store[-1] == 'G1 Y2'
+    assert list(store.iter_lines(1, 4, chunk_lines=2)) == text.splitlines()[1:4]
+    with pytest.raises(IndexError):
+        store[5]
+
+
+def test_line_store_from_file(tmp_path):
+    path = tmp_path / 'test.gcode'
+    path.write_bytes(b'G1 X1\nG1 X2\n')
+    store = LineStore.from_file(path)
+    assert list(store) == ['G1 X1', 'G1 X2']
+    assert store.text() == 'G1 X1\nG1 X2\n'
+    empty = tmp_path / 'empty.gcode'
+    empty.write_bytes(b'')
+    assert len(LineStore.from_file(empty)) == 0
+
+
+def test_gcode_from_file_matches_text():
+    with open('tests/gcode/box.gcode') as file:
+        text = file.read()
+    mapped = GCode.from_file('tests/gcode/box.gcode')
+    parsed = GCode(text)
+    assert mapped.line_count == parsed.line_count == len(text.splitlines())
+    assert mapped.raw_data == text
+    for name in ('x', 'y', 'z', 'e', 'layer', 'tool', 'flags'):
+        assert (getattr(mapped.columns, name) == getattr(parsed.columns, name)).all()
+    assert [line.line for line in mapped.lines[100:110]] == text.splitlines()[100:110]
+
+
+def test_drill_from_file_matches_text():
+    with open('tests/drl/PTH.drl') as file:
+        text = file.read()
+    mapped = DrillFile.from_file('tests/drl/PTH.drl')
+    assert mapped.tools == DrillFile(text).tools
+    assert mapped.drills == DrillFile(text).drills
@@ -0,0 +1,60 @@
+import numpy as np
+from splic3r import GCode
+from splic3r.columns import COLUMNS
+from splic3r.lines import LineStore
+from splic3r.parallel import parse_parallel, prescan
+
+def assert_same_columns(a, b):
+    for name in COLUMNS:
+        assert getattr(a, name).dtype == getattr(b, name).dtype
+        assert np.array_equal(getattr(a, name), getattr(b, name)), name
+    assert a.move_types == b.move_types
+    assert np.array_equal(a.offset_lines, b.offset_lines)
+    assert np.array_equal(a.offset_values, b.offset_values)
+    assert list(a.var_dict.items()) == list(b.var_dict.items())
+
+# Layers that never reset E, shift the origin with G92 and switch tools and positioning modes
+def awkward_gcode(layers=12):
+    lines = ['; nozzle = 0.4', 'T0', 'G28', 'G1 Z.2 F600']
+    for layer in range(layers):
+        lines += [';LAYER_CHANGE', f';Z:{0.2 * (layer + 1):.1f}', ';TYPE:Perimeter' if layer % 2 else ';TYPE:Infill']
+        if layer % 3 == 0:
+            lines += [f'T{layer % 2}', 'G91', 'G1 X.1 Y.3 E.01', 'G90']
+        if layer % 4 == 1:
+            lines += ['G92 X1 E0', 'G92']
+        lines += [f'G1 X{layer}.5 Y{layer * 2}.25 E.0{layer + 1}' for _ in range(5)]
+        lines += [f'; layer_{layer} = {layer}', '', 'M107']
+    return '\n'.join(lines)
+
+def test_prescan_splits_at_layer_changes():
+    source = LineStore.from_text(awkward_gcode())
+    runs = prescan(source, 4)
+    assert runs[0][0] == 0 and runs[-1][1] == len(source)
+    for (first, last, state), (next_first, _, _) in zip(runs, runs[1:]):
+        assert last == next_first
+        assert source[next_first] == ';LAYER_CHANGE'
+    assert len(runs) == 4
+    # Tool and layer are carried over from before the split
+    first, _, state = runs[2]
+    assert state.layer == GCode(awkward_gcode()).lines[first - 1].state.layer
+    assert state.selected_tool is not None
+
+def test_parallel_matches_serial():
+    text = awkward_gcode()
+    serial = GCode(text)
+    for chunks, checkpoint_lines in ((3, 256), (6, 4), (50, 1)):
+        columns = parse_parallel(LineStore.from_text(text), 2, chunks, checkpoint_lines)
+        assert_same_columns(serial.columns, columns)
+
+def test_parallel_file(tmp_path):
+    path = tmp_path / 'test.gcode'
+    path.write_text(awkward_gcode(30))
+    serial = GCode.from_file(path)
+    parallel = GCode.from_file(path, workers=2)
+    assert_same_columns(serial.columns, parallel.columns)
+    assert parallel.lines[-1].state == serial.lines[-1].state
+    assert len(parallel.layers) == len(serial.layers)
+
+def test_parallel_without_layers():
+    gcode = GCode('G1 X1 E1\nG1 X2 E2', workers=2)
+    assert gcode.lines[-1].state.amount_extruded == 3
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from splic3r import GCode
+from splic3r.paths import split_paths, total_bounds
+
+paths_str = """G1 X0 Y0 Z0.2
+;TYPE:Perimeter
+G1 X10 E1
+G1 Y10 E2
+M106 S255
+G1 X0 E3
+G1 X20 Y20
+G1 X30 E4
+;TYPE:Internal infill
+G1 X30 Y30 E5
+G1 E4
+G1 X20 Y30
+G3 X10 Y30 I-5 J0 E6
+"""
+
+def test_paths_split_at_travels_and_types():
+    gcode = GCode(paths_str)
+    paths = gcode.extrusion_paths()
+    assert paths.lines.tolist() == [2, 7, 9, 12]
+    assert [gcode.columns.move_types[code] for code in paths.types.tolist()] == \
+        ['Perimeter', 'Perimeter', 'Internal infill', 'Internal infill']
+    square, line, infill, arc = split_paths(paths)
+    assert square[:, :2].tolist() == [[0, 0], [10, 0], [10, 10], [0, 10]]
+    assert line[:, :2].tolist() == [[20, 20], [30, 20]]
+    assert infill[:, :2].tolist() == [[30, 20], [30, 30]]
+    assert arc[0, :2].tolist() == [20, 30] and arc[-1, :2].tolist() == [10, 30]
+    assert arc[:, 1].max() == pytest.approx(35, abs=gcode.arc_tolerance)
+    # As many segments as extrusion_segments finds
+    assert len(paths.points) - len(paths.lines) == len(gcode.extrusion_segments()[0])
+
+def test_paths_by_type():
+    gcode = GCode(paths_str)
+    paths = gcode.extrusion_paths(types=['Internal infill'])
+    assert paths.lines.tolist() == [9, 12]
+    assert gcode.extrusion_paths(types=['Bridge infill']).lines.tolist() == []
+    assert np.isnan(gcode.extrusion_bounds(types=['Bridge infill'])).all()
+    assert gcode.extrusion_paths(types=['Internal infill']) is paths
+
+def test_bounds():
+    gcode = GCode(paths_str)
+    assert gcode.extrusion_bounds() == pytest.approx(np.array([[0, 0, 0.2], [30, 35, 0.2]]), abs=0.01)
+    boxes = gcode.type_bounds()
+    assert boxes['Perimeter'][:, :2].tolist() == [[0, 0], [30, 20]]
+    assert boxes['Internal infill'][:, :2] == pytest.approx(np.array([[10, 20], [30, 35]]), abs=0.01)
+    paths = gcode.extrusion_paths()
+    assert total_bounds(paths, [0])[:, :2].tolist() == [[0, 0], [10, 10]]
+
+def test_layer_bounds():
+    gcode = GCode.from_file('tests/gcode/box.gcode')
+    bounds = gcode.layer_bounds()
+    assert bounds.shape == (len(gcode.layers), 2, 3)
+    for layer in list(gcode.layers)[:5]:
+        segments, _ = gcode.extrusion_segments(layer.number)
+        if len(segments):
+            xy = segments.reshape(-1, 2)
+            assert bounds[layer.number - gcode.layers.numbers[0], :, :2] == pytest.approx(np.stack((xy.min(axis=0), xy.max(axis=0))))
+
+def test_paths_after_edit():
+    gcode = GCode(paths_str)
+    gcode.extrusion_paths()
+    gcode.replace_lines(10, 12, [])
+    # With the retract and travel gone the infill carries on into the arc as one path
+    assert gcode.extrusion_paths().lines.tolist() == [2, 7, 9]
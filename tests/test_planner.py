@@ -0,0 +1,96 @@
+import pytest
+import numpy as np
+from splic3r import GCode
+from splic3r.drl import DrillFile
+from splic3r.planner import plan_injections, coverage, filament_length, batch_injections, swap_report
+
+# 10x10 mm raster every layer; layers in open_layers leave a 2x2 mm gap around (5, 5)
+def layered_gcode(layers=6, open_layers=(2, 3, 4), height=0.2):
+    lines = ["G90", "M83"]
+    for layer in range(1, layers + 1):
+        z = round(layer * height, 3)
+        lines += [";LAYER_CHANGE", f";Z:{z}", f"G1 Z{z}"]
+        for y in np.arange(0, 10.5, 0.5):
+            lines.append(f"G1 X0 Y{y}")
+            if layer in open_layers and 4 <= y <= 6:
+                lines += ["G1 X4 E.2", "G1 X6", "G1 X10 E.2"]
+            else:
+                lines.append("G1 X10 E.5")
+    return GCode("\n".join(lines))
+
+def test_coverage():
+    gcode = layered_gcode()
+    covered = coverage(gcode, [[5, 5, 1], [1, 1, 0.4]])
+    assert covered.shape == (2, 7)
+    assert covered[0].tolist() == [False, True, False, False, False, True, True]
+    assert covered[1, 1:].all()
+
+def test_plan_injections():
+    gcode = layered_gcode()
+    schedule = plan_injections(gcode, [[5, 5, 1], [1, 1, 0.4], [50, 50, 1]])
+    assert len(schedule) == 1
+    injection = schedule[0]
+    assert injection['hole'] == 0
+    assert injection['layer'] == 4
+    assert injection['line'] == gcode.layer(4).last_line
+    assert injection['z'] == pytest.approx(0.8)
+    assert injection['depth'] == pytest.approx(0.6)
+    assert injection['volume'] == pytest.approx(np.pi * 0.25 * 0.6)
+
+def test_plan_offset_and_min_layers():
+    gcode = layered_gcode()
+    assert len(plan_injections(gcode, [[0, 0, 1]], offset=(5, 5))) == 1
+    assert len(plan_injections(gcode, [[5, 5, 1]], min_layers=4)) == 0
+
+def test_plan_structured_holes():
+    drill = DrillFile.from_file("tests/drl/PTH.drl")
+    holes = drill.hole_array()
+    assert len(holes) == sum(len(d) for d in drill.drills.values())
+    schedule = plan_injections(layered_gcode(), holes)
+    assert len(schedule) == 0
+
+def test_filament_length():
+    assert filament_length(np.pi * 0.875 ** 2) == pytest.approx(1)
+
+# Like layered_gcode, with a 2x2 mm gap at (x, 5) on the layers listed for each x
+def gapped_gcode(gaps, layers=8, height=0.2):
+    lines = ["G90", "M83"]
+    for layer in range(1, layers + 1):
+        z = round(layer * height, 3)
+        lines += [";LAYER_CHANGE", f";Z:{z}", f"G1 Z{z}"]
+        for y in np.arange(0, 10.5, 0.5):
+            lines.append(f"G1 X0 Y{y}")
+            x = 0
+            for gap_x in sorted(gaps):
+                if layer in gaps[gap_x] and 4 <= y <= 6:
+                    lines += [f"G1 X{gap_x - 1} E.2", f"G1 X{gap_x + 1}"]
+                    x = gap_x + 1
+            lines.append("G1 X10 E.2")
+    return GCode("\n".join(lines))
+
+def test_batch_injections():
+    gcode = gapped_gcode({2: (2, 3, 4), 5: (2, 3, 4, 5), 8: (3, 4, 5, 6)})
+    holes = [[2, 5, 1], [5, 5, 1], [8, 5, 1]]
+    schedule = plan_injections(gcode, holes)
+    assert schedule['layer'].tolist() == [4, 5, 6]
+    # Each is due on its own layer
+    assert np.array_equal(batch_injections(gcode, schedule), schedule)
+    assert swap_report(schedule, 30) == (3, 6, 6, 0)
+
+    # Up to one layer of overfill: holes 0 and 1 share the swap after layer 4, hole 2 waits for layer 6
+    batched = batch_injections(gcode, schedule, max_overfill=0.2)
+    assert batched['hole'].tolist() == [0, 1, 2]
+    assert batched['layer'].tolist() == [4, 4, 6]
+    assert batched['line'].tolist() == [gcode.layer(4).last_line] * 2 + [gcode.layer(6).last_line]
+    assert batched['z'] == pytest.approx([0.8, 0.8, 1.2])
+    assert np.array_equal(batched['volume'], schedule['volume'])
+    assert swap_report(batched, 30) == (3, 4, 6, 30)
+
+    # Two layers: all three in one swap after layer 4
+    batched = batch_injections(gcode, schedule, max_overfill=0.4)
+    assert batched['layer'].tolist() == [4, 4, 4]
+    # Never before the column has started
+    gcode = gapped_gcode({2: (2, 3), 8: (6, 7)})
+    schedule = plan_injections(gcode, [[2, 5, 1], [8, 5, 1]])
+    batched = batch_injections(gcode, schedule, max_overfill=10)
+    assert batched['layer'].tolist() == [3, 7]
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pytest
+from splic3r import GCode
+from splic3r.drl import DrillFile
+from splic3r.register import print_openings, register, transform_holes, transform_points
+
+def drill_holes():
+    return DrillFile.from_file('tests/drl/PTH.drl').hole_array()
+
+# Layers with a loop of 16 moves round every hole, moved by angle and translation, clockwise unless told otherwise
+def hole_gcode(holes, angle, translation, layers=2, clockwise=True):
+    xy = transform_points(np.stack((holes['x'], holes['y']), axis=1), angle, translation)
+    turn = np.linspace(0, 2 * np.pi, 17)[1:] * (-1 if clockwise else 1)
+    lines, e = [], 0
+    for layer in range(1, layers + 1):
+        lines += [';LAYER_CHANGE', f';Z:{0.2 * layer:.1f}', f'G1 Z{0.2 * layer:.1f}']
+        for (x, y), diameter in zip(xy.tolist(), holes['diameter'].tolist()):
+            r = diameter / 2 + 0.2
+            lines.append(f'G1 X{x + r:.3f} Y{y:.3f}')
+            for a in turn.tolist():
+                e += 0.01
+                lines.append(f'G1 X{x + r * math.cos(a):.3f} Y{y + r * math.sin(a):.3f} E{e:.4f}')
+    return GCode('\n'.join(lines) + '\n')
+
+def test_print_openings():
+    holes = drill_holes()
+    openings = print_openings(hole_gcode(holes, 0, (10, 60)))
+    assert len(openings) == len(holes)
+    xy = np.stack((holes['x'] + 10, holes['y'] + 60), axis=1)
+    distance = np.hypot(*(xy[:, None] - openings[None, :, :2]).transpose(2, 0, 1))
+    nearest = distance.argmin(axis=1)
+    assert distance.min(axis=1).max() < 1e-3
+    # A 16-gon has a little less area than its circle
+    assert openings[nearest, 2] == pytest.approx(holes['diameter'] + 0.4, rel=0.03)
+    # Outer contours go counter-clockwise
+    assert len(print_openings(hole_gcode(holes, 0, (0, 0), clockwise=False))) == 0
+    assert len(print_openings(hole_gcode(holes, 0, (0, 0), clockwise=False), clockwise=False)) == len(holes)
+
+def test_register_exact():
+    holes = drill_holes()
+    gcode = hole_gcode(holes, math.radians(37), (120, 80))
+    fit = register(holes, print_openings(gcode), max_residual=0.01, min_matched=1.0)
+    assert math.degrees(fit.angle) == pytest.approx(37, abs=1e-3)
+    assert fit.translation == pytest.approx(np.array([120, 80]), abs=1e-2)
+    assert fit.matched == len(holes)
+    moved = transform_holes(holes, fit)
+    assert moved[fit.pairs[:, 0], :2] == pytest.approx(print_openings(gcode)[fit.pairs[:, 1], :2], abs=0.01)
+
+def test_register_noisy_and_partial():
+    holes = drill_holes()
+    rng = np.random.default_rng(1)
+    xy = transform_points(np.stack((holes['x'], holes['y']), axis=1), math.radians(-121), (30, -12))
+    present = rng.random(len(xy)) < 0.7
+    openings = np.vstack((xy[present] + rng.normal(0, 0.05, (present.sum(), 2)), rng.uniform(-20, 60, (10, 2))))
+    fit = register(holes, openings)
+    assert math.degrees(fit.angle) == pytest.approx(-121, abs=0.1)
+    assert fit.matched == present.sum()
+    assert set(fit.pairs[:, 0].tolist()) == set(np.flatnonzero(present).tolist())
+    assert fit.residual < 0.1
+
+def test_register_bad_fit():
+    holes = drill_holes()
+    openings = np.random.default_rng(2).uniform(0, 100, (len(holes), 2))
+    # Rejected by default
+    with pytest.raises(ValueError):
+        register(holes, openings)
+    fit = register(holes, openings, max_residual=math.inf, min_matched=0)
+    assert fit.residual > 0.5
+    with pytest.raises(ValueError):
+        register(holes, openings, max_residual=0.2)
+    with pytest.raises(ValueError):
+        register(holes, openings, min_matched=0.9)
+    with pytest.raises(ValueError):
+        register(holes, openings[:1])
+
+def test_register_mostly_unmatched():
+    holes = drill_holes()
+    rng = np.random.default_rng(3)
+    xy = transform_points(np.stack((holes['x'], holes['y']), axis=1), 0.3, (40, 40))
+    # Only a fifth of the holes have an opening, e.g. the print was sliced from another revision
+    openings = xy[rng.random(len(xy)) < 0.2]
+    with pytest.raises(ValueError, match='holes matched'):
+        register(holes, openings)
+    fit = register(holes, openings, max_residual=math.inf, min_matched=0)
+    assert fit.matched < len(holes) / 2
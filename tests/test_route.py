@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from splic3r.route import nearest_neighbour, nearest_points, route, route_length
+
+def brute_force_nearest(points, k):
+    distance = np.hypot(*(points[:, None, :] - points[None, :, :]).transpose(2, 0, 1))
+    np.fill_diagonal(distance, np.inf)
+    return np.argsort(distance, axis=1, kind='stable')[:, :k]
+
+def test_nearest_neighbour():
+    points = np.array([[5, 0], [1, 0], [3, 0], [2, 0]])
+    assert nearest_neighbour(points, (0, 0)).tolist() == [1, 3, 2, 0]
+    assert nearest_neighbour(np.zeros((0, 2)), (0, 0)).tolist() == []
+
+def test_nearest_points():
+    points = np.random.default_rng(0).uniform(0, 50, (300, 2))
+    assert np.array_equal(nearest_points(points, 6, block_rows=64), brute_force_nearest(points, 6))
+
+def test_route_visits_every_point_once():
+    points = np.random.default_rng(1).uniform(0, 100, (500, 2))
+    order = route(points, (0, 0), (100, 100))
+    assert sorted(order.tolist()) == list(range(500))
+    greedy = route_length(points, nearest_neighbour(points, (0, 0)), (0, 0), (100, 100))
+    assert route_length(points, order, (0, 0), (100, 100)) < 0.9 * greedy
+
+def test_route_undoes_crossings():
+    # Corners of a square visited from one corner: the best route goes round the outside
+    points = np.array([[10, 10], [0, 10], [10, 0]])
+    order = route(points, (0, 0))
+    assert route_length(points, order, (0, 0)) == pytest.approx(40)
+    # A line of points is walked straight along and back
+    line = np.column_stack((np.random.default_rng(2).permutation(20), np.zeros(20)))
+    order = route(line, (-1, 0), (20, 0))
+    assert line[order, 0].tolist() == list(range(20))
+
+def test_small_routes():
+    assert route(np.zeros((0, 2)), (0, 0)).tolist() == []
+    assert route([[1, 1]], (0, 0)).tolist() == [0]
+    assert sorted(route([[1, 1], [2, 2]], (0, 0)).tolist()) == [0, 1]
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+from splic3r import GCode
+from splic3r.spatial import SegmentGrid, point_segment_distance
+
+def brute_force(segments, points):
+    return point_segment_distance(points[:, None, 0], points[:, None, 1],
+                                  segments[None, :, 0], segments[None, :, 1], segments[None, :, 2], segments[None, :, 3])
+
+def random_segments(count, seed=0):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 50, (count, 2))
+    end = start + rng.normal(0, 5, (count, 2))
+    return np.hstack((start, end))
+
+def test_point_segment_distance():
+    assert point_segment_distance(0, 1, -1, 0, 1, 0) == 1
+    assert point_segment_distance(3, 4, 0, 0, 0, 0) == 5
+    assert point_segment_distance(2, 0, -1, 0, 1, 0) == 1
+
+def test_query_radius_matches_brute_force():
+    segments = random_segments(500)
+    points = np.random.default_rng(1).uniform(-5, 55, (200, 2))
+    expected = np.argwhere(brute_force(segments, points) <= 0.8)
+    for cell_size in (0.3, 1.0, 1.6, 7.0):
+        grid = SegmentGrid(segments, cell_size)
+        point, segment = grid.query_radius(points, 0.8)
+        assert sorted(zip(point.tolist(), segment.tolist())) == sorted(map(tuple, expected.tolist()))
+    assert grid.count_within(points, 0.8).tolist() == (brute_force(segments, points) <= 0.8).sum(axis=1).tolist()
+
+def test_diagonal_segment_cells():
+    # A 100 mm diagonal is listed in the cells along it, not the 10,000 of its bounding box
+    grid = SegmentGrid([[0, 0, 100, 100]], cell_size=1.0)
+    assert 100 <= len(grid.items) <= 400
+    assert grid.count_within([[50.2, 50.2], [20, 80]], 0.5).tolist() == [1, 0]
+
+def test_nearest_matches_brute_force():
+    segments = random_segments(300, seed=2)
+    points = np.random.default_rng(3).uniform(-20, 70, (100, 2))
+    grid = SegmentGrid(segments, cell_size=1.0)
+    distance, segment = grid.nearest(points)
+    expected = brute_force(segments, points)
+    assert np.allclose(distance, expected.min(axis=1))
+    assert np.allclose(expected[np.arange(len(points)), segment], distance)
+
+def test_nearest_max_distance():
+    grid = SegmentGrid([[0, 0, 1, 0]])
+    distance, segment = grid.nearest([[0.5, 0.2], [0.5, 10]], max_distance=1)
+    assert distance[0] == pytest.approx(0.2)
+    assert segment.tolist() == [0, -1]
+    assert distance[1] == np.inf
+
+def test_empty_grid():
+    grid = SegmentGrid(np.zeros((0, 4)))
+    assert grid.count_within([[0, 0]], 1).tolist() == [0]
+    assert grid.nearest([[0, 0]])[1].tolist() == [-1]
+
+def test_layer_segment_index():
+    gcode = GCode.from_file('tests/gcode/box.gcode')
+    segments, lines = gcode.extrusion_segments(10)
+    assert len(segments) == len(lines) > 0
+    layer = gcode.layer(10)
+    assert np.all((lines >= layer.first_line) & (lines <= layer.last_line))
+    grid = gcode.segment_index(10)
+    assert grid is gcode.segment_index(10)
+    assert gcode.segment_index(10, cell_size=2.0).cell_size == 2.0
+    with pytest.raises(ValueError):
+        gcode.segment_index(None)
+    distance, _ = grid.nearest(segments[:, :2])
+    assert np.allclose(distance, 0)
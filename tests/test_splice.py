@@ -0,0 +1,88 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pytest
+from splic3r.splice import Splice, decimate, flatten_paths
+
+
+def square_layers(count):
+    square = np.array([[0, 0, 0], [10, 0, 0], [10, 10, 0], [0, 10, 0], [0, 0, 0]], dtype=float)
+    return [[square + [0, 0, layer], square[:2] + [0, 0, layer], square[:1]] for layer in range(count)]
+
+
+def test_flatten_paths():
+    points, offsets = flatten_paths(square_layers(1)[0])
+    # The one-point path draws nothing
+    assert offsets.tolist() == [0, 5, 7]
+    assert points.shape == (7, 2)
+    points, offsets = flatten_paths([])
+    assert points.shape == (0, 2) and offsets.tolist() == [0]
+
+
+def test_decimate():
+    line = np.stack((np.linspace(0, 10, 101), np.zeros(101)), axis=1)
+    points, offsets = decimate(line, np.array([0, 101]), 1.0)
+    assert offsets.tolist() == [0, len(points)]
+    assert len(points) == 11
+    assert points[0].tolist() == [0, 0] and points[-1].tolist() == [10, 0]
+    assert np.all(np.diff(points[:, 0]) <= 1.0 + 1e-9)
+    # Short paths keep both their ends
+    points, offsets = decimate(line[:3], np.array([0, 2, 3]), 1.0)
+    assert offsets.tolist() == [0, 2, 3]
+    assert decimate(line, np.array([0, 101]), 0)[0] is line
+
+
+def test_splice_limits():
+    splice = Splice()
+    splice.set_layers(square_layers(3))
+    assert splice.min_path_coords.tolist() == [0, 0, 0]
+    assert splice.max_path_coords.tolist() == [10, 10, 2]
+
+
+def test_layer_plot_cache():
+    splice = Splice()
+    splice.cache_layers = 2
+    splice.set_layers(square_layers(4))
+    first = splice.layer_plot(1)
+    assert len(first.get_segments()) == 2
+    assert splice.layer_plot(1) is first
+    splice.layer_plot(2)
+    splice.layer_plot(1)
+    splice.layer_plot(3)
+    # Layer 2 was the least recently used
+    assert list(splice.layer_plots) == [(1, 0.0), (3, 0.0)]
+
+
+def test_plot_layers():
+    splice = Splice()
+    splice.cache_layers = 3
+    splice.set_layers(square_layers(5))
+    splice.set_holes(np.array([[5, 5, 1.0]]), offset=(1, 2))
+    splice.plot(show=False)
+    assert splice.hole_plot.get_offsets().tolist() == [[6, 7]]
+    for number in range(1, 6):
+        splice.update_plot_layer(number)
+        visible = [plot for plot in splice.layer_plots.values() if plot.get_visible()]
+        assert visible == [splice.shown]
+    assert len(splice.layer_plots) == 3
+    assert sum(plot.axes is not None for plot in splice.layer_plots.values()) == 3
+    assert len(splice.ax.collections) == 4
+    # Zoomed out, a pixel is wider than the squares' sides
+    splice.ax.set_xlim(-5000, 5000)
+    assert splice.shown is splice.layer_plots[5, splice.tolerance()]
+    assert splice.tolerance() > 10
+    assert len(splice.shown.get_segments()[0]) < 5
+
+
+def test_splice_from_gcode():
+    from splic3r import GCode
+    gcode = GCode.from_file('tests/gcode/box.gcode')
+    splice = Splice()
+    splice.set_gcode(gcode, types=['External perimeter'])
+    assert len(splice.layers) == len(gcode.layers) - 1
+    assert splice.min_path_coords[:2] == pytest.approx(gcode.extrusion_bounds(types=['External perimeter'])[0, :2])
+    splice.plot(show=False)
+    splice.update_plot_layer(10)
+    paths = gcode.extrusion_paths(splice.layers[9], ['External perimeter'])
+    assert len(splice.shown.get_segments()) == len(paths.lines)
@@ -0,0 +1,40 @@
+from splic3r import GCode
+from splic3r.gcode import PrinterState
+from splic3r.stats import PHASES, ParseStats
+from tests.test_parallel import awkward_gcode
+
+def test_unknown_words_are_counted_not_printed(capsys):
+    stats = ParseStats()
+    GCode('G1 X1 Q2\nG4 Z1\nM9999\nM9999 S1\nG28 Q', stats=stats)
+    assert capsys.readouterr().out == ''
+    assert stats.unknown_commands == {'M9999': 2}
+    assert stats.unknown_arguments == {('G1', 'Q'): 1, ('G4', 'Z'): 1, ('G28', 'Q'): 1}
+
+def test_callback_sees_every_unknown_word():
+    seen = []
+    GCode('G1 X1 Q2\nM9999', stats=ParseStats(lambda *event: seen.append(event)))
+    assert seen == [('unknown_argument', 'G1', ('Q', 2.0)), ('unknown_command', 'M9999', None)]
+
+def test_commands_and_phases_are_counted():
+    stats = ParseStats()
+    gcode = GCode.from_file('tests/gcode/box.gcode', stats=stats)
+    assert stats.lines == len(gcode.columns)
+    expected = sum(1 for line in gcode.lines if line.line.split(';')[0].split()[:1] == ['G1'])
+    assert stats.commands['G1'] == expected
+    assert set(stats.phases) == set(PHASES)
+    assert all(seconds > 0 for seconds in stats.phases.values())
+    assert 'G1' in stats.report()
+    assert stats.as_dict()['commands']['G1']['count'] == expected
+
+def test_workers_merge_their_stats():
+    text = awkward_gcode(40)
+    serial, parallel = ParseStats(), ParseStats()
+    GCode(text, stats=serial)
+    GCode(text, workers=2, stats=parallel)
+    assert parallel.lines == serial.lines
+    assert parallel.commands == serial.commands
+
+def test_stats_are_not_part_of_the_state():
+    a, b = PrinterState(), PrinterState()
+    a.stats = ParseStats()
+    assert a == b
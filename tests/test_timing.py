@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from splic3r import GCode
+from splic3r.timing import estimate_time, insertion_times, limit_events, swap_time
+from splic3r.writer import Injector, Template
+
+# 1000 mm/s^2 everywhere, 100 mm/s top speed and no jerk, so every corner is a full stop
+LIMITS = "M201 X1000 Y1000 Z1000 E1000\nM203 X100 Y100 Z100 E100\nM204 P1000 R1000 T1000\nM205 X0 Y0 Z0 E0\n"
+
+def total(body):
+    return estimate_time(GCode(LIMITS + body)).total
+
+def test_trapezoid():
+    # 5 mm up to 100 mm/s, 90 mm at speed, 5 mm back down
+    assert total("G1 X100 F6000") == pytest.approx(1.1)
+    # Too short to reach full speed
+    assert total("G1 X4 F6000") == pytest.approx(2 * np.sqrt(4000) / 1000)
+    # M203 caps F
+    assert total("G1 X100 F60000") == pytest.approx(1.1)
+
+def test_junctions():
+    # Moves in a straight line don't slow down where they meet
+    assert total("G1 X50 F6000\nG1 X100") == pytest.approx(1.1)
+    # With no jerk a corner is a stop
+    assert total("G1 X100 F6000\nG1 Y100") == pytest.approx(2.2)
+    # Jerk lets each move start, turn and stop at 10 mm/s: 0.09 s speeding up and slowing down, 90.1 mm at speed
+    with_jerk = estimate_time(GCode(LIMITS + "M205 X10 Y10\nG1 X100 F6000\nG1 Y100")).total
+    assert with_jerk == pytest.approx(2 * (0.18 + 0.901))
+
+def test_dwell():
+    assert total("G1 X50 F6000\nG4 P500\nG1 X100") == pytest.approx(2 * 0.6 + 0.5)
+    assert total("G4 S2") == pytest.approx(2)
+
+def test_limit_events_ignore_comments():
+    gcode = GCode(LIMITS + "; end_gcode = G4 ; wait\nM204 P500 ; M204 P1\nG4")
+    limit_lines, limits, dwell_lines, dwells = limit_events(gcode)
+    assert limit_lines.tolist() == [0, 1, 2, 3, 5]
+    assert limits['acceleration'].tolist() == [3000, 3000, 3000, 1000, 1000, 500]
+    assert dwell_lines.tolist() == [6]
+
+def test_layers_add_up():
+    estimate = estimate_time(GCode.from_file('tests/gcode/box.gcode'))
+    assert len(estimate.layers) == 181
+    assert estimate.layers.sum() == pytest.approx(estimate.total)
+    # The slicer's own estimate is 45m 15s
+    assert estimate.total / 60 == pytest.approx(45.25, rel=0.05)
+
+def test_insertion_times():
+    gcode = GCode(LIMITS + "G1 X10 Y10 F6000\nG1 X20")
+    times = insertion_times(gcode, [(5, "G1 X30 F6000"), (5, "G4 S1")])
+    # 10 mm there and 10 mm back, each from rest to 100 mm/s and back
+    assert times[0] == pytest.approx(0.4)
+    assert times[1] == pytest.approx(1)
+
+def test_swap_time():
+    gcode = GCode(LIMITS + "G1 X10 Y10 F6000")
+    injector = Injector(Template("G1 X[WIPE_X1] Y[WIPE_Y1] F6000\nT[TO_TOOL]"), wipe=(20, 10, 0, 0))
+    # 10 mm to the wipe position, where both toolchanges happen, and 10 mm back
+    assert swap_time(gcode, injector) == pytest.approx(2 * 0.2)
+    assert swap_time(gcode, injector, heat_time=30) == pytest.approx(30.4)
+
+def test_arcs_take_their_length():
+    # Half a circle of radius 10 is 31.4 mm: 5 mm speeding up, 21.4 mm at speed, 5 mm slowing down
+    assert total("G92 X10 Y0\nG3 X-10 Y0 I-10 J0 F6000") == pytest.approx(0.2 + (10 * np.pi - 10) / 100)
@@ -0,0 +1,27 @@
+import pytest
+from splic3r.tokens import tokenize_line, tokenize, parse_words
+
+def test_tokenize_line():
+    assert tokenize_line('G1 X135.599 Y-58.092 E.0677') == ('G1', [('G', 1), ('X', 135.599), ('Y', -58.092), ('E', .0677)])
+    assert tokenize_line('G1X135.599Y58.092E.0677 ; comment X1') == ('G1', [('G', 1), ('X', 135.599), ('Y', 58.092), ('E', .0677)])
+    assert tokenize_line('M862.3 P "XL"')[0] == 'M862.3'
+    assert tokenize_line('T3 S1 L0 D0') == ('T3', [('T', 3), ('S', 1), ('L', 0), ('D', 0)])
+
+def test_tokenize_bare_letters():
+    assert tokenize_line('G28 XY') == ('G28', [('G', 28), ('X', None), ('Y', None)])
+    assert tokenize_line('G92 E-') == ('G92', [('G', 92), ('E', None)])
+
+def test_tokenize_no_command():
+    assert tokenize_line('; just a comment') is None
+    assert tokenize_line('   ') is None
+
+def test_tokenize_line_numbers_and_checksums():
+    assert tokenize_line('N10 G1 X5 Y5') == ('G1', [('G', 1), ('X', 5), ('Y', 5)])
+    assert tokenize_line('N123 G1 X5 Y5*71 ; move') == ('G1', [('G', 1), ('X', 5), ('Y', 5)])
+    assert tokenize_line('N11') is None
+
+def test_tokenize_buffer():
+    assert tokenize("G1 X1\n;comment\n\nG92 E0") == [('G1', [('G', 1), ('X', 1)]), None, None, ('G92', [('G', 92), ('E', 0)])]
+
+def test_parse_words():
+    assert parse_words(['G1', 'X135.599', 'Y58.092', 'E.0677']) == tokenize_line('G1 X135.599 Y58.092 E.0677')
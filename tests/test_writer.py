@@ -0,0 +1,101 @@
+import io
+import pytest
+import numpy as np
+from splic3r import GCode
+from splic3r.planner import INJECTION_DTYPE, filament_length, plan_injections
+from splic3r.writer import Template, Injector, SpliceWriter, injection_blocks, format_number
+from test_planner import layered_gcode
+
+def test_format_number():
+    assert format_number(3) == '3'
+    assert format_number(0.200001) == '0.2'
+    assert format_number(-0.000001) == '0'
+    assert format_number(12.5) == '12.5'
+
+def test_template():
+    template = Template.from_file('gcode_samples/toolchange.gcode')
+    assert template.placeholders == {'FROM_TOOL', 'TO_TOOL', 'TO_TOOL_TEMP', 'WIPE_X1', 'WIPE_Y1',
+                                     'WIPE_X2', 'WIPE_Y2', 'RETRACT', 'DE_RETRACT', 'LAYER_HEIGHT'}
+    template = Template("P[FROM_TOOL] S1\nT[TO_TOOL]\nG1 Z[LAYER_HEIGHT]")
+    assert template.render(FROM_TOOL=0, TO_TOOL=2, LAYER_HEIGHT=0.6) == "P0 S1\nT2\nG1 Z0.6"
+    with pytest.raises(KeyError):
+        template.render(FROM_TOOL=0)
+
+def test_splice_writer():
+    out = io.StringIO()
+    writer = SpliceWriter(out, batch_lines=2)
+    writer.splice(['a', 'b', 'c'], [(0, 'X\n'), (2, 'Y\nZ\n'), (2, 'W\n')])
+    assert out.getvalue() == 'a\nX\nb\nc\nY\nZ\nW\n'
+
+def test_injection_splice():
+    gcode = layered_gcode()
+    holes = np.array([[5, 5, 1], [5.1, 5.1, 0.4]])
+    schedule = plan_injections(gcode, holes)
+    injector = Injector(Template.from_file('gcode_samples/toolchange.gcode'), print_tool=0, conductive_tool=2)
+    out = io.StringIO()
+    SpliceWriter(out).splice((line.line for line in gcode.lines), injection_blocks(schedule, holes, injector))
+    spliced = GCode(out.getvalue())
+    assert spliced.line_count > gcode.line_count
+    tools = spliced.columns.tool[spliced.columns.tool >= 0]
+    assert set(tools.tolist()) == {0, 2}
+    assert spliced.lines[-1].state.selected_tool == 0
+    inserted = out.getvalue().split('\n')
+    assert 'G1 X5 Y5 F6000' in inserted
+    assert 'G1 X5.1 Y5.1 F6000' in inserted
+
+def test_injection_blocks_route_holes():
+    schedule = np.zeros(4, dtype=INJECTION_DTYPE)
+    schedule['hole'] = [0, 1, 2, 3]
+    schedule['volume'] = [1, 2, 3, 4]
+    holes = np.array([[30, 0, 1], [10, 0, 1], [40, 0, 1], [20, 0, 1]])
+    injector = Injector(Template("T[TO_TOOL]"), wipe=(50, 0, 0, 0))
+    (_, block), = injection_blocks(schedule, holes, injector)
+    visits = [line.split(' F')[0] for line in block.split('\n') if line.startswith('G1 X')]
+    assert visits == ['G1 X10 Y0', 'G1 X20 Y0', 'G1 X30 Y0', 'G1 X40 Y0']
+    # Each hole keeps its own volume
+    volumes = [line for line in block.split('\n') if line.startswith('G1 E') and line.endswith(' F300')]
+    assert volumes[0] == block_volume(injector, 2)
+    (_, unordered), = injection_blocks(schedule, holes, injector, ordered=False)
+    assert [line.split(' F')[0] for line in unordered.split('\n') if line.startswith('G1 X')][0] == 'G1 X30 Y0'
+
+def test_injector_lifts_between_holes():
+    injector = Injector(Template("T[TO_TOOL]"), retract=0.5, lift=0.4, dwell=0.5)
+    block = injector.render([[1, 2], [3, 4]], [1, 1], 0.6)
+    lines = block.split('\n')
+    first = lines.index('G1 X1 Y2 F6000')
+    assert lines[first - 2:first] == ['G1 E-0.5 F2100', 'G1 Z1 F600']
+    assert lines[first + 1:first + 3] == ['G1 Z0.6 F600', 'G1 E0.5 F2100']
+    assert lines[first + 4] == 'G4 P500'
+    # Lifted again before the toolchange back
+    assert lines[-3:] == ['G1 Z1 F600', 'T0', '']
+
+def test_injector_from_settings():
+    gcode = GCode.from_file('tests/gcode/box.gcode')
+    template = Template.from_file('gcode_samples/toolchange.gcode')
+    injector = Injector.from_settings(template, gcode.columns.var_dict, conductive_tool=2)
+    assert injector.wipe == (190.747, 296.1, 250.747, 296.1)
+    assert injector.travel_feedrate == 24000
+    assert injector.lift == 0.3
+    block = injector.render([[5, 5]], [1], 0.4, active_tool=1)
+    # The conductive tool heats to its own temperature, the print tool goes back to its own
+    assert 'M109 S245 T2' in block and 'M109 S210 T1' in block
+    assert 'G1 X190.747 Y296.1 F24000' in block
+    assert 'T1 S1 L0 D0' in block
+    assert Injector.from_settings(template, {}, wipe=(1, 2, 3, 4)).wipe == (1, 2, 3, 4)
+
+def test_blocks_return_to_active_tool():
+    gcode = layered_gcode()
+    gcode.insert_lines(2, ['T3'])
+    schedule = plan_injections(gcode, [[5, 5, 1]])
+    assert schedule['tool'].tolist() == [3]
+    injector = Injector(Template("P[FROM_TOOL]\nT[TO_TOOL] S[TO_TOOL_TEMP]"), conductive_tool=1)
+    (_, block), = injection_blocks(schedule, [[5, 5, 1]], injector)
+    assert block.startswith('P3\nT1 S250\n')
+    assert block.endswith('P1\nT3 S215\n')
+    # A print tool given to the injector wins
+    injector.print_tool = 0
+    (_, block), = injection_blocks(schedule, [[5, 5, 1]], injector)
+    assert block.endswith('P1\nT0 S215\n')
+
+def block_volume(injector, volume):
+    return f"G1 E{format_number(float(filament_length(volume, injector.filament_diameter)))} F{injector.inject_feedrate}"